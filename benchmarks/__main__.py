@@ -0,0 +1,55 @@
+"""Runs every benchmarks.bench_* module.
+
+Usage:
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --baseline results.json --max-regression 20
+
+Exits with non-zero status when any benchmark got slower than the baseline
+by more than --max-regression percent.
+"""
+
+import importlib
+import pkgutil
+from pathlib import Path
+import typer
+
+import benchmarks
+from benchmarks._runner import Result, load, regressions, report, save
+
+
+def main(
+    output: Path | None = typer.Option(None, help="Where to write JSON results"),
+    baseline: Path | None = typer.Option(None, help="JSON results to compare to"),
+    max_regression: float = typer.Option(
+        20.0, help="Allowed slowdown against baseline, in percent"
+    ),
+    only: str = typer.Option("", help="Run only modules with this in their name"),
+) -> None:
+    results: list[Result] = []
+    for module_info in pkgutil.iter_modules(benchmarks.__path__):
+        if not module_info.name.startswith("bench_") or only not in module_info.name:
+            continue
+
+        module = importlib.import_module(f"benchmarks.{module_info.name}")
+        print(f"# {module_info.name}")
+        module_results = module.benchmarks()
+        report(module_results)
+        results.extend(module_results)
+
+    if output is not None:
+        save(results, output)
+
+    if baseline is not None:
+        found = regressions(results, load(baseline), max_regression)
+        for regression in found:
+            print(
+                f"REGRESSION {regression.name}: {regression.baseline_ns_per_op:.1f}"
+                f" -> {regression.ns_per_op:.1f} ns/op (+{regression.percent:.1f}%)"
+            )
+        if found:
+            raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    typer.run(main)
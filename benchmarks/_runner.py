@@ -0,0 +1,79 @@
+"""Tiny timing helpers shared by the benchmark scripts."""
+
+import json
+import platform
+import timeit
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+
+@dataclass(frozen=True)
+class Result:
+    name: str
+    ns_per_op: float
+
+
+@dataclass(frozen=True)
+class Regression:
+    name: str
+    baseline_ns_per_op: float
+    ns_per_op: float
+
+    @property
+    def percent(self) -> float:
+        return (self.ns_per_op / self.baseline_ns_per_op - 1) * 100
+
+
+def measure(
+    name: str, func: Callable[[], object], number: int = 10_000, repeat: int = 5
+) -> Result:
+    """Best of `repeat` runs, so a noisy neighbour does not skew the numbers."""
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    return Result(name=name, ns_per_op=best / number * 1e9)
+
+
+def report(results: list[Result]) -> None:
+    for result in results:
+        print(f"{result.name:<50} {result.ns_per_op:>12.1f} ns/op")
+
+
+def save(results: list[Result], path: Path) -> None:
+    path.write_text(
+        json.dumps(
+            {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": {result.name: result.ns_per_op for result in results},
+            },
+            indent=2,
+        )
+    )
+
+
+def load(path: Path) -> list[Result]:
+    raw = json.loads(path.read_text())
+    return [
+        Result(name=name, ns_per_op=ns_per_op)
+        for name, ns_per_op in raw["results"].items()
+    ]
+
+
+def regressions(
+    results: list[Result], baseline: list[Result], max_regression_percent: float
+) -> list[Regression]:
+    """Results slower than baseline by more than the allowed percentage.
+
+    Benchmarks missing from the baseline are new and never count as regressions.
+    """
+    baseline_by_name = {result.name: result.ns_per_op for result in baseline}
+    found = []
+    for result in results:
+        baseline_ns_per_op = baseline_by_name.get(result.name)
+        if baseline_ns_per_op is None:
+            continue
+
+        regression = Regression(result.name, baseline_ns_per_op, result.ns_per_op)
+        if regression.percent > max_regression_percent:
+            found.append(regression)
+    return found
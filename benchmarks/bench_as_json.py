@@ -0,0 +1,60 @@
+"""Bind and result costs of AsJSON compared to going through Python dicts.
+
+The dict path is what AsJSON did before: dump to JSON-compatible dicts, then
+let the driver encode them to text (and decode text to dicts on the way back).
+
+Run with: python -m benchmarks.bench_as_json
+"""
+
+import json
+from decimal import Decimal
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+
+from benchmarks._runner import Result, measure, report
+from subscriptions.plans._domain._add_ons._flat_price_add_on import FlatPriceAddOn
+from subscriptions.plans._domain._add_ons._tiered_add_on import TieredAddOn
+from subscriptions.plans._domain._add_ons._unit_price_add_on import UnitPriceAddOn
+from subscriptions.shared.money import Money
+from subscriptions.shared.sqlalchemy import AsJSON
+
+AddOns = list[UnitPriceAddOn | FlatPriceAddOn | TieredAddOn]
+
+
+def benchmarks() -> list[Result]:
+    add_ons: AddOns = [
+        TieredAddOn(
+            name=f"tiered_{n}",
+            tiers={tier: Money(Decimal("9.99") * tier, "USD") for tier in range(1, 11)},
+        )
+        for n in range(50)
+    ]
+    dialect = create_engine("postgresql+psycopg2://").dialect
+    column_type = AsJSON[AddOns]()
+    bind = column_type.bind_processor(dialect)
+    result = column_type.result_processor(dialect, None)
+    as_text = bind(add_ons)
+    assert as_text is not None
+
+    type_adapter = TypeAdapter(AddOns)
+
+    def bind_via_dicts() -> str:
+        return json.dumps(type_adapter.dump_python(add_ons, mode="json"))
+
+    def result_via_dicts() -> AddOns:
+        return type_adapter.validate_python(json.loads(as_text))
+
+    return [
+        measure("AsJSON[int] lookup", lambda: AsJSON[int], number=100_000),
+        measure("bind 50 tiered add-ons via dicts", bind_via_dicts, number=200),
+        measure("bind 50 tiered add-ons (AsJSON)", lambda: bind(add_ons), number=200),
+        measure("result 50 tiered add-ons via dicts", result_via_dicts, number=200),
+        measure(
+            "result 50 tiered add-ons (AsJSON)", lambda: result(as_text), number=200
+        ),
+    ]
+
+
+if __name__ == "__main__":
+    report(benchmarks())
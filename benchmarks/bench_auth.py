@@ -0,0 +1,46 @@
+"""Overhead of requires_role dispatch.
+
+Run with: python -m benchmarks.bench_auth
+"""
+
+from benchmarks._runner import Result, measure, report
+from subscriptions.auth import Role, Subject, requires_role
+from subscriptions.shared.tenant_id import TenantId
+
+
+class Viewer(Role):
+    pass
+
+
+class Admin(Role):
+    pass
+
+
+class Service:
+    def plain(self, subject: Subject, value: int) -> int:
+        return value
+
+    @requires_role(Viewer)
+    def guarded(self, subject: Subject, value: int) -> int:
+        return value
+
+
+def benchmarks() -> list[Result]:
+    service = Service()
+    subject = Subject(TenantId(1), [Viewer(), Admin()])
+
+    return [
+        measure("undecorated method call", lambda: service.plain(subject, 1)),
+        measure(
+            "requires_role (positional subject)",
+            lambda: service.guarded(subject, 1),
+        ),
+        measure(
+            "requires_role (keyword subject)",
+            lambda: service.guarded(value=1, subject=subject),
+        ),
+    ]
+
+
+if __name__ == "__main__":
+    report(benchmarks())
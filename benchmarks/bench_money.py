@@ -0,0 +1,86 @@
+"""Microbenchmark of Money construction, arithmetic and MoneyType.
+
+Run with: python -m benchmarks.bench_money
+"""
+
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+
+from benchmarks._runner import Result, measure, report
+from subscriptions.shared.money import Money, MoneyType, MoneyVector
+
+
+def benchmarks() -> list[Result]:
+    usd = Money(Decimal("15.99"), "USD")
+    eth = Money(Decimal("0.000000000000000001"), "ETH")
+    prices = [Money(Decimal("9.99"), "USD")] * 50
+
+    payments = [Money.from_minor_units(n % 10_000, "USD") for n in range(10_000)]
+    payments_vector = MoneyVector.from_money(payments)
+    tenants = [n % 20 for n in range(10_000)]
+
+    def sum_payments_one_by_one() -> Money:
+        total = Money(0, "USD")
+        for payment in payments:
+            total += payment
+        return total
+
+    def sum_payments_by_tenant_one_by_one() -> dict[int, Money]:
+        totals: dict[int, Money] = {}
+        for tenant, payment in zip(tenants, payments):
+            totals[tenant] = totals.get(tenant, Money(0, "USD")) + payment
+        return totals
+
+    dialect = create_engine("postgresql+psycopg2://").dialect
+    money_type = MoneyType()
+    bind = money_type.bind_processor(dialect)
+    result = money_type.result_processor(dialect, None)
+    assert bind is not None and result is not None
+    as_json = bind(usd)
+
+    def sum_prices() -> Money:
+        total = usd
+        for price in prices:
+            total += price
+        return total * 12
+
+    return [
+        measure("Money(int, USD)", lambda: Money(10, "USD")),
+        measure("Money(float, USD)", lambda: Money(10.99, "USD")),
+        measure("Money(Decimal, USD)", lambda: Money(Decimal("10.99"), "USD")),
+        measure("Money(Decimal, ETH)", lambda: Money(Decimal("0.5"), "ETH")),
+        measure(
+            "Money.from_minor_units(USD)", lambda: Money.from_minor_units(1099, "USD")
+        ),
+        measure("Money + Money (USD)", lambda: usd + usd),
+        measure("Money + Money (ETH)", lambda: eth + eth),
+        measure("Money * int (USD)", lambda: usd * 12),
+        measure("Money <= Money (USD)", lambda: usd <= usd),
+        measure("Money.amount (USD)", lambda: usd.amount),
+        measure("MoneyType bind", lambda: bind(usd)),
+        measure("MoneyType result", lambda: result(as_json)),
+        measure("sum of 50 prices * 12 (USD)", sum_prices, number=1_000),
+        measure("10k Money summed one by one", sum_payments_one_by_one, number=20),
+        measure("10k MoneyVector.sum()", payments_vector.sum, number=20),
+        measure(
+            "10k Money summed by tenant one by one",
+            sum_payments_by_tenant_one_by_one,
+            number=20,
+        ),
+        measure(
+            "10k MoneyVector.grouped_sum()",
+            lambda: payments_vector.grouped_sum(tenants),
+            number=20,
+        ),
+        measure("10k MoneyVector * int", lambda: payments_vector * 12, number=20),
+        measure(
+            "10k MoneyVector + MoneyVector",
+            lambda: payments_vector + payments_vector,
+            number=20,
+        ),
+    ]
+
+
+if __name__ == "__main__":
+    report(benchmarks())
@@ -0,0 +1,88 @@
+"""Pricing of plans and add-ons.
+
+Run with: python -m benchmarks.bench_plan
+"""
+
+from decimal import Decimal
+
+from benchmarks._runner import Result, measure, report
+from subscriptions.plans import RequestedAddOn
+from subscriptions.plans._domain._add_ons._flat_price_add_on import FlatPriceAddOn
+from subscriptions.plans._domain._add_ons._tiered_add_on import (
+    TieredAddOn,
+    TierPricing,
+)
+from subscriptions.plans._domain._add_ons._unit_price_add_on import UnitPriceAddOn
+from subscriptions.plans._domain._plan import Plan
+from subscriptions.shared.money import Money
+from subscriptions.shared.term import Term
+
+
+def plan_with_add_ons(count: int) -> Plan:
+    add_ons: list[UnitPriceAddOn | FlatPriceAddOn | TieredAddOn] = []
+    for n in range(count):
+        match n % 3:
+            case 0:
+                add_ons.append(
+                    UnitPriceAddOn(f"unit_{n}", Money(Decimal("1.99"), "USD"))
+                )
+            case 1:
+                add_ons.append(
+                    FlatPriceAddOn(f"flat_{n}", Money(Decimal("4.99"), "USD"))
+                )
+            case _:
+                tiers = {tier: Money(tier, "USD") for tier in range(1, 11)}
+                add_ons.append(TieredAddOn(f"tiered_{n}", tiers))
+
+    return Plan(
+        tenant_id=1,
+        name="plan",
+        price=Money(Decimal("15.99"), "USD"),
+        description="",
+        add_ons=add_ons,
+    )
+
+
+def benchmarks() -> list[Result]:
+    results = []
+    for count in [1, 50, 500, 5_000]:
+        plan = plan_with_add_ons(count)
+        requested = [RequestedAddOn(add_on.name, 5) for add_on in plan.add_ons]
+        results.append(
+            measure(
+                f"Plan.calculate_cost ({count} add-ons)",
+                lambda: plan.calculate_cost(Term.YEARLY, requested),
+                number=max(10, 100_000 // count),
+            )
+        )
+        results.append(
+            measure(
+                f"Plan.calculate_cost (1 of {count} add-ons)",
+                lambda: plan.calculate_cost(Term.YEARLY, requested[-1:]),
+            )
+        )
+
+    tiered = TieredAddOn("tiered", {tier: Money(tier, "USD") for tier in range(1, 101)})
+    results.append(
+        measure("TieredAddOn.calculate_price", lambda: tiered.calculate_price(50))
+    )
+    for pricing in [TierPricing.VOLUME, TierPricing.GRADUATED]:
+        ranged = TieredAddOn(
+            "ranged",
+            {
+                start: Money(Decimal(10_000 - start) / 100, "USD")
+                for start in range(1, 10_000, 10)
+            },
+            pricing,
+        )
+        results.append(
+            measure(
+                f"TieredAddOn.calculate_price ({pricing}, 1000 tiers)",
+                lambda: ranged.calculate_price(7_777),
+            )
+        )
+    return results
+
+
+if __name__ == "__main__":
+    report(benchmarks())
@@ -0,0 +1,54 @@
+"""Validation and serialization of PlanDto.
+
+Run with: python -m benchmarks.bench_plan_dto
+"""
+
+from decimal import Decimal
+
+from benchmarks._runner import Result, measure, report
+from benchmarks.bench_plan import plan_with_add_ons
+from subscriptions.plans import PlanDto
+from subscriptions.plans._domain._add_ons._tiered_add_on import TieredAddOn
+from subscriptions.shared.money import Money
+
+
+def benchmarks() -> list[Result]:
+    plan = PlanDto(
+        id=1,
+        name="plan",
+        price=Money(Decimal("15.99"), "USD"),
+        description="",
+        add_ons=[
+            TieredAddOn(
+                name=f"tiered_{n}",
+                tiers={
+                    tier: Money(Decimal("9.99") * tier, "USD") for tier in range(1, 11)
+                },
+            )
+            for n in range(200)
+        ],
+    )
+    as_json = plan.model_dump_json()
+    plan_entity = plan_with_add_ons(50)
+    plan_entity.id = 1
+
+    return [
+        measure(
+            "PlanDto.model_dump_json (200 tiered)", plan.model_dump_json, number=20
+        ),
+        measure("PlanDto.model_dump (200 tiered)", plan.model_dump, number=20),
+        measure(
+            "PlanDto.model_validate_json (200 tiered)",
+            lambda: PlanDto.model_validate_json(as_json),
+            number=20,
+        ),
+        measure(
+            "PlanDto.model_validate from Plan (50 add-ons)",
+            lambda: PlanDto.model_validate(plan_entity),
+            number=200,
+        ),
+    ]
+
+
+if __name__ == "__main__":
+    report(benchmarks())
@@ -0,0 +1,62 @@
+"""Publisher throughput: single messages and outbox-sized batches.
+
+Uses kombu's in-memory transport as a stand-in for the broker, so it measures
+client-side overhead only - against RabbitMQ every one-by-one publish also
+waits a round trip for its confirm, while a batch waits for all of them once.
+Likewise, declaring a queue (done only once per channel) costs a round trip.
+
+Run with: python -m benchmarks.bench_publisher
+"""
+
+from typing import Any
+
+from kombu import Queue  # type: ignore[import-untyped]
+
+from benchmarks._runner import Result, measure, report
+from subscriptions.shared.mqlib import BrokerUrl, Envelope, PoolFactory, Publisher
+from subscriptions.shared.mqlib.testing import purge
+
+BATCH_SIZE = 100
+QUEUE = "bench-publisher"
+
+
+def payment_made(number: int) -> dict[str, Any]:
+    return {
+        "type": "payments.payment_made",
+        "source": "subscriptions.payments",
+        "message": {
+            "payment_id": number,
+            "amount": {"amount": "9.99", "currency": "USD"},
+        },
+    }
+
+
+def benchmarks() -> list[Result]:
+    pool_factory = PoolFactory(BrokerUrl("memory://"))
+    publisher = Publisher(pool_factory)
+    envelopes = [Envelope(QUEUE, payment_made(n)) for n in range(BATCH_SIZE)]
+
+    def one_by_one() -> None:
+        for envelope in envelopes:
+            publisher.publish(envelope.queue, envelope.message)
+
+    def batch() -> None:
+        publisher.publish_batch(envelopes)
+
+    message = payment_made(0)
+
+    results = [
+        measure(
+            "publish single message",
+            lambda: publisher.publish(QUEUE, message),
+            number=2_000,
+        ),
+        measure(f"publish x{BATCH_SIZE}", one_by_one, number=20),
+        measure(f"publish_batch of {BATCH_SIZE}", batch, number=20),
+    ]
+    purge(pool_factory, Queue(QUEUE))
+    return results
+
+
+if __name__ == "__main__":
+    report(benchmarks())
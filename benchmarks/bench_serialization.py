@@ -0,0 +1,79 @@
+"""Message serialization: encode/decode cost and payload size per format.
+
+Uses the payments.payment_made message, as single events are what is mostly
+published. Compression is forced for it (compress_above=0) to show what it
+costs - with the default threshold such small bodies stay uncompressed. The
+same is measured for a fan-out sized body, where compression pays off.
+Formats needing libraries which are not installed (msgpack, zstandard) are
+skipped. Sizes are in bytes, part of benchmark names.
+
+Run with: python -m benchmarks.bench_serialization
+"""
+
+from typing import Any
+
+from kombu.exceptions import SerializerNotInstalled  # type: ignore[import-untyped]
+
+from benchmarks._runner import Result, measure, report
+from benchmarks.bench_publisher import payment_made
+from subscriptions.shared.mqlib import Serialization, decode
+
+FAN_OUT = 100
+
+FORMATS = [
+    ("json", None),
+    ("json", "zlib"),
+    ("json", "zstd"),
+    ("msgpack", None),
+    ("msgpack", "zlib"),
+    ("msgpack", "zstd"),
+]
+
+
+def available_formats() -> list[Serialization]:
+    formats = []
+    for serializer, compression in FORMATS:
+        try:
+            formats.append(Serialization(serializer, compression, compress_above=0))
+        except (SerializerNotInstalled, KeyError):
+            continue
+    return formats
+
+
+def benchmarks() -> list[Result]:
+    messages: list[tuple[str, dict[str, Any]]] = [
+        ("payment_made", payment_made(1234)),
+        (
+            f"{FAN_OUT} payment_made",
+            {"messages": [payment_made(n) for n in range(FAN_OUT)]},
+        ),
+    ]
+    results = []
+    for serialization in available_formats():
+        name = serialization.serializer
+        if serialization.compression is not None:
+            name += f"+{serialization.compression}"
+
+        for label, message in messages:
+            encoded = serialization.encode(message)
+            number = 20_000 if len(encoded.body) < 1024 else 500
+            suffix = f"{label} {name} ({len(encoded.body)} B)"
+            results.append(
+                measure(
+                    f"encode {suffix}",
+                    lambda s=serialization, m=message: s.encode(m),  # type: ignore[misc]
+                    number=number,
+                )
+            )
+            results.append(
+                measure(
+                    f"decode {suffix}",
+                    lambda e=encoded: decode(e),  # type: ignore[misc]
+                    number=number,
+                )
+            )
+    return results
+
+
+if __name__ == "__main__":
+    report(benchmarks())
@@ -0,0 +1,61 @@
+"""Renewal date calculation, load leveling and SubscriptionDto validation.
+
+Run with: python -m benchmarks.bench_subscriptions
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from benchmarks._runner import Result, measure, report
+from subscriptions.plans import PlanId, RequestedAddOn
+from subscriptions.shared.account_id import AccountId
+from subscriptions.shared.tenant_id import TenantId
+from subscriptions.shared.term import Term
+from subscriptions.subscriptions._app._subscription_dto import SubscriptionDto
+from subscriptions.subscriptions._domain._renewal_calculation import (
+    LoadLeveling,
+    calculate_next_renewal,
+)
+from subscriptions.subscriptions._domain._subscription import PendingChange
+from subscriptions.subscriptions._domain._subscription_factory import build_new
+
+
+def benchmarks() -> list[Result]:
+    now = datetime(2024, 1, 31, 12, tzinfo=timezone.utc)
+    anchor = datetime(2019, 3, 31, 9, tzinfo=timezone.utc)
+    leveling = LoadLeveling(timedelta(hours=24))
+    subscription = build_new(
+        AccountId(1),
+        TenantId(1),
+        PlanId(1),
+        Term.MONTHLY,
+        [RequestedAddOn("extra_screens", 2)],
+    )
+    subscription.id = 1
+    subscription.pending_change = PendingChange(new_plan_id=2)
+
+    return [
+        measure(
+            "calculate_next_renewal (monthly)",
+            lambda: calculate_next_renewal(now, Term.MONTHLY),
+        ),
+        measure(
+            "calculate_next_renewal (yearly)",
+            lambda: calculate_next_renewal(now, Term.YEARLY),
+        ),
+        measure(
+            "calculate_next_renewal (monthly, 5 years from anchor)",
+            lambda: calculate_next_renewal(now, Term.MONTHLY, anchor),
+        ),
+        measure(
+            "LoadLeveling.level",
+            lambda: leveling.level(now, 123_456),
+        ),
+        measure(
+            "SubscriptionDto.model_validate",
+            lambda: SubscriptionDto.model_validate(subscription),
+        ),
+    ]
+
+
+if __name__ == "__main__":
+    report(benchmarks())
@@ -1,3 +1,12 @@
+import math
+import os
+import signal
+import socket
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
 import typer
 from sqlalchemy import Engine
 from sqlalchemy.orm import Session
@@ -5,17 +14,60 @@ from sqlalchemy.orm import Session
 from subscriptions.accounts import AccountsFacade
 from subscriptions.payments import PaymentsFacade
 from subscriptions.shared.account_id import AccountId
+from subscriptions.shared.metrics import Metrics, serve as serve_metrics
+from subscriptions.shared.money import migrate_json_money_column
+from subscriptions.shared.outbox import (
+    OutboxDeadLetters,
+    OutboxListener,
+    OutboxProcessor,
+    OutboxWorker,
+    migrate_outbox_tables,
+)
 from subscriptions.shared.sqlalchemy import Base
-from subscriptions.main import container
+from subscriptions.shared.tenant_id import TenantId
+from subscriptions.subscriptions import (
+    ConcurrentCharger,
+    FairShare,
+    LoadLeveling,
+    RenewalProgress,
+    SubscriptionId,
+    SubscriptionsFacade,
+)
+from subscriptions.main import SessionFactory, container
+from subscriptions.settings import RenewalSettings
 
 app = typer.Typer()
 
+# Tenants with the most due subscriptions, shown in renewal progress
+QUEUE_DEPTHS_SHOWN = 5
+# Characters of the longest bar of renewal histogram
+HISTOGRAM_WIDTH = 60
+
 
 @app.command()
 def init_db() -> None:
     Base.metadata.create_all(container[Engine])
 
 
+@app.command()
+def migrate_money_columns() -> None:
+    """Moves Money of plans and payments from JSON to native numeric columns."""
+    with container[Engine].begin() as connection:
+        for table, column in [("plans", "price"), ("payments", "amount")]:
+            migrated = migrate_json_money_column(connection, table, column)
+            typer.echo(f"{table}.{column}: {migrated} rows migrated")
+
+
+@app.command()
+def migrate_outbox() -> None:
+    """Adds partitions, retries and dead letters to outbox tables of an old schema."""
+    with container[Engine].begin() as connection:
+        moved = migrate_outbox_tables(connection)
+        typer.echo(
+            f"outbox_entries: {moved} entries out of retries moved to dead letters"
+        )
+
+
 @app.command()
 def create_new_account(tenant_id: int = 1) -> None:
     session = container[Session]
@@ -30,5 +82,147 @@ def charge(account_id: int, amount: float = 10.99) -> None:
     payments_facade.charge(AccountId(account_id), amount)
 
 
+@app.command()
+def renew_subscriptions(
+    chunk_size: int = SubscriptionsFacade.RENEWAL_CHUNK_SIZE,
+    concurrency: int = 1,
+    per_tenant: int = 2,
+) -> None:
+    """Renews all due subscriptions, committing every chunk of them.
+
+    With concurrency above 1, up to that many charges are made at once, at most
+    per_tenant of them for any single tenant. Chunks are shared between tenants
+    by weights and caps from RENEWAL_TENANT_WEIGHTS and RENEWAL_TENANT_CAPS.
+    """
+    settings = RenewalSettings.model_validate({})
+    fair_share = FairShare(
+        {TenantId(k): v for k, v in settings.TENANT_WEIGHTS.items()},
+        {TenantId(k): v for k, v in settings.TENANT_CAPS.items()},
+    )
+
+    @contextmanager
+    def payments_facade() -> Iterator[PaymentsFacade]:
+        # Each worker thread gets its own session
+        try:
+            yield container.resolve(PaymentsFacade)
+        finally:
+            SessionFactory.remove()
+
+    charger = None
+    if concurrency > 1:
+        charger = ConcurrentCharger(payments_facade, concurrency, per_tenant)
+
+    def report(progress: RenewalProgress) -> None:
+        typer.echo(
+            f"{progress.processed} processed: {progress.renewed} renewed,"
+            f" {progress.failed} failed, {progress.skipped} skipped,"
+            f" {progress.uncertain} to reconcile;"
+            f" {progress.charges_per_second:.1f} charges/s,"
+            f" p50 {progress.p50_charge_seconds * 1000:.0f} ms,"
+            f" p99 {progress.p99_charge_seconds * 1000:.0f} ms"
+        )
+        deepest = sorted(progress.queue_depths.items(), key=lambda item: -item[1])
+        for tenant_id, depth in deepest[:QUEUE_DEPTHS_SHOWN]:
+            typer.echo(f"  tenant {tenant_id}: {depth} due")
+
+    container.resolve(SubscriptionsFacade).renew_subscriptions(
+        chunk_size, report, charger=charger, fair_share=fair_share
+    )
+
+
+@app.command()
+def list_to_reconcile(limit: int = 20) -> None:
+    """Shows subscriptions whose renewal charge raised, so may have been made."""
+    facade = container.resolve(SubscriptionsFacade)
+    for subscription in facade.subscriptions_to_reconcile(limit):
+        typer.echo(
+            f"#{subscription.id} plan {subscription.plan_id} "
+            f"(due {subscription.next_renewal_at:%Y-%m-%d %H:%M:%S})"
+        )
+
+
+@app.command()
+def reconcile(subscription_id: int, charged: bool = typer.Option(...)) -> None:
+    """Renews the subscription if its charge was made, else makes it due again.
+
+    Check payments of the account with the payment provider first.
+    """
+    facade = container.resolve(SubscriptionsFacade)
+    subscription = facade.reconcile(SubscriptionId(subscription_id), charged)
+    typer.echo(f"#{subscription.id} {subscription.status}")
+
+
+@app.command()
+def renewal_histogram(days: int = 1, leveling_window_hours: int | None = None) -> None:
+    """Shows how many renewals are due in each hour of the next days (UTC).
+
+    With leveling_window_hours given, as they would be with that load leveling.
+    """
+    start = datetime.now(timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    leveling = None
+    if leveling_window_hours is not None:
+        leveling = LoadLeveling(timedelta(hours=leveling_window_hours))
+
+    histogram = container.resolve(SubscriptionsFacade).renewal_histogram(
+        start, start + timedelta(days=days), leveling
+    )
+    scale = max(1, math.ceil(max(histogram.values(), default=0) / HISTOGRAM_WIDTH))
+    for hour, count in histogram.items():
+        typer.echo(f"{hour:%Y-%m-%d %H:00} {count:>8} {'#' * (count // scale)}")
+
+
+@app.command()
+def process_outbox(worker_name: str = "", metrics_port: int = 0) -> None:
+    """Publishes outbox entries as soon as they are committed, until SIGINT/SIGTERM.
+
+    Many processes can run it at once - partitions of the outbox are divided
+    between them, keeping the order of entries with the same ordering key.
+    With metrics_port given, serves outbox metrics on it.
+    """
+    if metrics_port:
+        serve_metrics(container[Metrics], metrics_port)
+
+    stop_event = threading.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda _signal_number, _frame: stop_event.set())
+
+    processor = container.resolve(OutboxProcessor)
+    worker = OutboxWorker(
+        container[Session], worker_name or f"{socket.gethostname()}-{os.getpid()}"
+    )
+    with OutboxListener(container[Engine]) as listener:
+        processor.run_continuously(listener, stop_event, worker)
+
+
+@app.command()
+def list_dead_letters(limit: int = 20) -> None:
+    """Shows the most recent outbox entries that ran out of retries."""
+    for dead_letter in container.resolve(OutboxDeadLetters).recent(limit):
+        typer.echo(
+            f"#{dead_letter.id} {dead_letter.queue} "
+            f"(failed {dead_letter.when_failed:%Y-%m-%d %H:%M:%S}): "
+            f"{dead_letter.last_error}"
+        )
+
+
+@app.command()
+def replay_dead_letters(ids: list[int] = typer.Argument(None)) -> None:
+    """Puts dead letters (all, unless ids given) back to the outbox."""
+    session = container[Session]
+    replayed = container.resolve(OutboxDeadLetters).replay(ids or None)
+    session.commit()
+    typer.echo(f"{replayed} dead letters replayed")
+
+
+@app.command()
+def purge_dead_letters(older_than_days: int = 30) -> None:
+    session = container[Session]
+    purged = container.resolve(OutboxDeadLetters).purge(timedelta(days=older_than_days))
+    session.commit()
+    typer.echo(f"{purged} dead letters purged")
+
+
 if __name__ == "__main__":
     app()
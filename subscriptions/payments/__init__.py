@@ -1,4 +1,4 @@
 from subscriptions.payments._web._views import router as payments_router
-from subscriptions.payments._app._facade import PaymentsFacade
+from subscriptions.payments._app._facade import MissingPaymentMethod, PaymentsFacade
 
-__all__ = ["payments_router", "PaymentsFacade"]
+__all__ = ["payments_router", "PaymentsFacade", "MissingPaymentMethod"]
@@ -21,6 +21,10 @@ class InternalError(Exception):
     pass
 
 
+class MissingPaymentMethod(Exception):
+    """The account has nothing to charge, so nothing was charged."""
+
+
 class PaymentsFacade:
     def __init__(
         self,
@@ -96,6 +100,6 @@ class PaymentsFacade:
                 pass  # no handling YET
                 return False
             case NoPaymentMethods():
-                raise Exception("No payment methods!")
+                raise MissingPaymentMethod("No payment methods!")
             case _:
                 assert_never(result)
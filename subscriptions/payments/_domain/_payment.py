@@ -1,6 +1,6 @@
-from sqlalchemy.orm import mapped_column, Mapped
+from sqlalchemy.orm import composite, mapped_column, Mapped
 
-from subscriptions.shared.money import Money, MoneyType
+from subscriptions.shared.money import Money, money_columns
 from subscriptions.shared.sqlalchemy import Base
 
 
@@ -10,6 +10,6 @@ class Payment(Base):
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     tenant_id: Mapped[int]
     account_id: Mapped[int]
-    amount: Mapped[Money] = mapped_column(MoneyType)
+    amount: Mapped[Money] = composite(Money.from_minor_units, *money_columns("amount"))
     status: Mapped[str]
     stripe_payment_id: Mapped[str]
@@ -1,16 +1,26 @@
+from lagom import Singleton
+
+from subscriptions.main import container
 from subscriptions.plans._domain._add_ons._requested_add_on import RequestedAddOn
 from subscriptions.plans._app._role_objects import PlansAdmin, PlansViewer
 from subscriptions.plans._web._views import router as plans_router
 from subscriptions.plans._app._facade import PlansFacade
 from subscriptions.plans._app._plan_dto import PlanDto
 from subscriptions.plans._domain._plan_id import PlanId
+from subscriptions.plans._app._cost_request import CostRequest
+from subscriptions.plans._app._catalog import PlanCatalog
+
+# One for the process, it is what makes it a cache
+container[PlanCatalog] = Singleton(PlanCatalog)
 
 __all__ = [
     "PlansFacade",
+    "CostRequest",
     "PlanDto",
     "PlanId",
     "plans_router",
     "RequestedAddOn",
     "PlansViewer",
     "PlansAdmin",
+    "PlanCatalog",
 ]
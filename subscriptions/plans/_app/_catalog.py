@@ -0,0 +1,153 @@
+import logging
+import select as io_select
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Mapping, Sequence
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import Engine, func, select
+from sqlalchemy.orm import Session
+
+from subscriptions.plans._domain._plan import Plan
+from subscriptions.plans._domain._plan_id import PlanId
+from subscriptions.shared.tenant_id import TenantId
+
+
+class PlanCatalog:
+    """Plans of recently used tenants, kept in memory of the process.
+
+    Plans change rarely, while every subscription and renewal is priced with
+    them - so they are loaded once per tenant and kept for TTL seconds, for at
+    most MAX_TENANTS tenants, evicting the least recently used ones.
+
+    Changes are announced with NOTIFY on NOTIFY_CHANNEL, which every process
+    listens on to drop plans of the changed tenant. TTL limits how long plans
+    stay stale when a notification is missed, e.g. while reconnecting.
+    """
+
+    MAX_TENANTS = 1024
+    TTL = 60.0
+    NOTIFY_CHANNEL = "plans_changed"
+    RECONNECT_DELAY = 5.0
+
+    def __init__(self, engine: Engine) -> None:
+        self._engine = engine
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[TenantId, _Entry] = OrderedDict()
+        # Threads asking for a tenant that is being loaded wait for that load,
+        # instead of all of them querying the database at once
+        self._loading: dict[TenantId, Future[dict[PlanId, Plan]]] = {}
+        # Loads that started before an invalidation must not be cached
+        self._invalidations = 0
+        self._listener: threading.Thread | None = None
+
+    def plans(
+        self, tenant_id: TenantId, load: Callable[[], Sequence[Plan]]
+    ) -> Mapping[PlanId, Plan]:
+        """Plans of the tenant by id, from load when they are not cached.
+
+        Plans are shared between threads, so they must not be bound to a
+        session nor modified.
+        """
+        self._ensure_listening()
+        with self._lock:
+            entry = self._entries.get(tenant_id)
+            if entry is not None and time.monotonic() < entry.expires_at:
+                self._entries.move_to_end(tenant_id)
+                return entry.plans
+
+            future = self._loading.get(tenant_id)
+            loading = future is None
+            if future is None:
+                future = self._loading[tenant_id] = Future()
+            invalidations = self._invalidations
+
+        if not loading:
+            return future.result()
+
+        try:
+            plans = {PlanId(plan.id): plan for plan in load()}
+        except BaseException as exc:
+            with self._lock:
+                if self._loading.get(tenant_id) is future:
+                    del self._loading[tenant_id]
+            future.set_exception(exc)
+            raise
+
+        with self._lock:
+            if self._loading.get(tenant_id) is future:
+                del self._loading[tenant_id]
+            if self._invalidations == invalidations:
+                self._entries[tenant_id] = _Entry(plans, time.monotonic() + self.TTL)
+                self._entries.move_to_end(tenant_id)
+                while len(self._entries) > self.MAX_TENANTS:
+                    self._entries.popitem(last=False)
+        future.set_result(plans)
+        return plans
+
+    def invalidate(self, tenant_id: TenantId | None = None) -> None:
+        """Drops plans of the tenant, or of all tenants when None."""
+        with self._lock:
+            self._invalidations += 1
+            if tenant_id is None:
+                self._entries.clear()
+                self._loading.clear()
+            else:
+                self._entries.pop(tenant_id, None)
+                self._loading.pop(tenant_id, None)
+
+    def announce_change(self, session: Session, tenant_id: TenantId) -> None:
+        """Tells all processes to drop plans of the tenant, once session commits."""
+        session.execute(select(func.pg_notify(self.NOTIFY_CHANNEL, str(tenant_id))))
+
+    def _ensure_listening(self) -> None:
+        # LISTEN/NOTIFY is PostgreSQL only, elsewhere plans expire after TTL
+        if self._listener is not None or self._engine.dialect.name != "postgresql":
+            return
+
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self._listen, name="PlanCatalog", daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                connection = self._engine.raw_connection()
+                # LISTEN is bound to the connection, it must not go back to the pool
+                connection.detach()
+                try:
+                    # Detached, it has no driver_connection any more
+                    driver_connection = connection.dbapi_connection
+                    driver_connection.autocommit = True  # type: ignore[union-attr]
+                    cursor = connection.cursor()
+                    cursor.execute(f"LISTEN {self.NOTIFY_CHANNEL}")
+                    cursor.close()
+                    # Whatever changed while not listening is unknown
+                    self.invalidate()
+                    self._receive(driver_connection)
+                finally:
+                    connection.close()
+            except Exception:
+                logging.exception("Error while listening for plan changes")
+                time.sleep(self.RECONNECT_DELAY)
+
+    def _receive(self, driver_connection: Any) -> None:
+        notifies = driver_connection.notifies
+        while True:
+            io_select.select([driver_connection], [], [])
+            driver_connection.poll()
+            for notify in notifies:
+                self.invalidate(TenantId(int(notify.payload)))
+            notifies.clear()
+
+
+@dataclass(frozen=True)
+class _Entry:
+    plans: dict[PlanId, Plan]
+    expires_at: float
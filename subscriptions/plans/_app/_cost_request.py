@@ -0,0 +1,13 @@
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from subscriptions.plans._domain._add_ons._requested_add_on import RequestedAddOn
+from subscriptions.plans._domain._plan_id import PlanId
+from subscriptions.shared.term import Term
+
+
+@dataclass(frozen=True)
+class CostRequest:
+    plan_id: PlanId
+    term: Term
+    add_ons: Sequence[RequestedAddOn]
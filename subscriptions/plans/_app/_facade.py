@@ -1,4 +1,7 @@
-from sqlalchemy import select, delete
+from collections.abc import Iterable, Mapping, Sequence
+
+from sqlalchemy import delete
+from sqlalchemy.exc import NoResultFound
 from sqlalchemy.orm import Session
 
 from subscriptions.auth import Subject, requires_role
@@ -10,6 +13,8 @@ from subscriptions.plans._domain._plan_id import PlanId
 from subscriptions.plans._app._plan_dto import PlanDto
 from subscriptions.plans._domain._plan import Plan
 from subscriptions.plans._app._repository import PlansRepository
+from subscriptions.plans._app._catalog import PlanCatalog
+from subscriptions.plans._app._cost_request import CostRequest
 from subscriptions.plans._app._role_objects import PlansAdmin, PlansViewer
 from subscriptions.shared.money import Money
 from subscriptions.shared.tenant_id import TenantId
@@ -17,9 +22,12 @@ from subscriptions.shared.term import Term
 
 
 class PlansFacade:
-    def __init__(self, session: Session, repository: PlansRepository) -> None:
+    def __init__(
+        self, session: Session, repository: PlansRepository, catalog: PlanCatalog
+    ) -> None:
         self._session = session
         self._repository = repository
+        self._catalog = catalog
 
     @requires_role(PlansAdmin)
     def add(
@@ -38,13 +46,15 @@ class PlansFacade:
             add_ons=add_ons,
         )
         self._repository.add(plan)
+        self._catalog.announce_change(self._session, subject.tenant_id)
         self._session.commit()
+        self._catalog.invalidate(subject.tenant_id)
         return PlanDto.model_validate(plan)
 
     @requires_role(PlansViewer)
     def get_all(self, subject: Subject) -> list[PlanDto]:
-        plans = self._repository.get_all(subject.tenant_id)
-        return [PlanDto.model_validate(plan) for plan in plans]
+        plans = self._plans(subject.tenant_id)
+        return [PlanDto.model_validate(plan) for plan in plans.values()]
 
     @requires_role(PlansAdmin)
     def delete(self, subject: Subject, plan_id: int) -> None:
@@ -52,7 +62,9 @@ class PlansFacade:
             Plan.tenant_id == subject.tenant_id, Plan.id == plan_id
         )
         self._session.execute(stmt)
+        self._catalog.announce_change(self._session, subject.tenant_id)
         self._session.commit()
+        self._catalog.invalidate(subject.tenant_id)
 
     def calculate_cost(
         self,
@@ -61,6 +73,58 @@ class PlansFacade:
         term: Term,
         add_ons: list[RequestedAddOn],
     ) -> Money:
-        stmt = select(Plan).filter(Plan.id == plan_id, Plan.tenant_id == tenant_id)
-        plan = self._session.execute(stmt).scalars().one()
-        return plan.calculate_cost(term, add_ons)
+        return _cost(self._plans(tenant_id, [plan_id]), plan_id, term, add_ons)
+
+    def calculate_costs(
+        self, tenant_id: TenantId, requests: Sequence[CostRequest]
+    ) -> list[Money | Exception]:
+        """Costs in order of requests, or errors of requests that failed.
+
+        Plans are read once for the whole batch and identical requests are
+        priced once, so e.g. renewals of many subscriptions to the same plan
+        cost a single query at most.
+        """
+        plans = self._plans(tenant_id, [request.plan_id for request in requests])
+        costs: dict[object, Money | Exception] = {}
+        results: list[Money | Exception] = []
+        for request in requests:
+            key = (request.plan_id, request.term, tuple(request.add_ons))
+            if key not in costs:
+                try:
+                    costs[key] = _cost(
+                        plans, request.plan_id, request.term, list(request.add_ons)
+                    )
+                except Exception as e:
+                    costs[key] = e
+            results.append(costs[key])
+        return results
+
+    def _plans(
+        self, tenant_id: TenantId, plan_ids: Iterable[PlanId] = ()
+    ) -> Mapping[PlanId, Plan]:
+        """Plans of the tenant, loaded again once if some of plan_ids are missing.
+
+        Those may have been added by another process, whose notification has
+        not arrived yet.
+        """
+        plans = self._catalog.plans(
+            tenant_id, lambda: self._repository.get_all(tenant_id)
+        )
+        if any(plan_id not in plans for plan_id in plan_ids):
+            self._catalog.invalidate(tenant_id)
+            plans = self._catalog.plans(
+                tenant_id, lambda: self._repository.get_all(tenant_id)
+            )
+        return plans
+
+
+def _cost(
+    plans: Mapping[PlanId, Plan],
+    plan_id: PlanId,
+    term: Term,
+    add_ons: list[RequestedAddOn],
+) -> Money:
+    plan = plans.get(plan_id)
+    if plan is None:
+        raise NoResultFound(f"Plan {plan_id} not found")
+    return plan.calculate_cost(term, add_ons)
@@ -15,5 +15,10 @@ class PlansRepository:
         self._session.add(plan)
 
     def get_all(self, tenant_id: TenantId) -> Sequence[Plan]:
-        stmt = select(Plan).filter(Plan.tenant_id == tenant_id)
-        return self._session.execute(stmt).scalars().all()
+        """Plans detached from any session, so they can be cached and shared.
+
+        Loaded in a session of their own - one that commits would expire them.
+        """
+        stmt = select(Plan).filter(Plan.tenant_id == tenant_id).order_by(Plan.id)
+        with Session(self._session.get_bind()) as session:
+            return session.execute(stmt).scalars().all()
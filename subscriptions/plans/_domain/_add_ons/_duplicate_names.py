@@ -0,0 +1,3 @@
+class DuplicateAddOnNames(Exception):
+    def __init__(self, names: list[str]) -> None:
+        super().__init__(f"Add-on names must be unique, repeated: {names}")
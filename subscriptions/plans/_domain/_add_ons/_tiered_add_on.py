@@ -1,4 +1,6 @@
-from dataclasses import dataclass
+import bisect
+from dataclasses import dataclass, field
+from enum import StrEnum
 from typing import Annotated
 
 from subscriptions.plans._domain._add_ons._invalid_tier_requested import (
@@ -7,13 +9,69 @@ from subscriptions.plans._domain._add_ons._invalid_tier_requested import (
 from subscriptions.shared.money import Money, MoneyAnnotation
 
 
+class TierPricing(StrEnum):
+    # Price of the tier with exactly the requested quantity
+    EXACT = "exact"
+    # Whole quantity at unit price of the tier it falls into
+    VOLUME = "volume"
+    # Units of each tier at unit price of that tier
+    GRADUATED = "graduated"
+
+
 @dataclass(frozen=True)
 class TieredAddOn:
+    """Priced by tiers - quantity to price, or to unit price for ranges.
+
+    With VOLUME and GRADUATED pricing a tier starts at its quantity and ends
+    right before the next one, the last has no end. E.g. {1: $10, 11: $8}
+    prices 15 units at 15 * $8 by volume, or 10 * $10 + 5 * $8 graduated.
+    """
+
     name: str
     tiers: dict[int, Annotated[Money, MoneyAnnotation]]
+    pricing: TierPricing = TierPricing.EXACT
+    # Derived from tiers for O(log n) lookups, see __post_init__
+    _starts: list[int] = field(init=False, repr=False, compare=False)
+    _unit_prices: list[Money] = field(init=False, repr=False, compare=False)
+    # Price of all units of tiers before a given one, for GRADUATED pricing
+    _preceding_prices: list[Money] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        starts = sorted(self.tiers)
+        unit_prices = [self.tiers[start] for start in starts]
+        if self.pricing != TierPricing.EXACT and (not starts or starts[0] != 1):
+            raise ValueError(f"First tier of {self.name} must start at quantity 1")
+        if self.pricing != TierPricing.EXACT and (
+            len({price.currency for price in unit_prices}) > 1
+        ):
+            raise ValueError(f"Tiers of {self.name} must be in one currency")
+
+        preceding_prices = []
+        if self.pricing == TierPricing.GRADUATED:
+            total = Money(0, unit_prices[0].currency)
+            for index, unit_price in enumerate(unit_prices):
+                preceding_prices.append(total)
+                if index + 1 < len(starts):
+                    total += unit_price * (starts[index + 1] - starts[index])
+
+        object.__setattr__(self, "_starts", starts)
+        object.__setattr__(self, "_unit_prices", unit_prices)
+        object.__setattr__(self, "_preceding_prices", preceding_prices)
 
     def calculate_price(self, quantity: int) -> Money:
-        try:
-            return self.tiers[quantity]
-        except KeyError:
-            raise InvalidTierRequested(self.name, quantity, list(self.tiers.keys()))
+        if self.pricing == TierPricing.EXACT:
+            try:
+                return self.tiers[quantity]
+            except KeyError:
+                raise InvalidTierRequested(self.name, quantity, list(self.tiers.keys()))
+
+        if quantity < 1:
+            raise InvalidTierRequested(self.name, quantity, self._starts)
+
+        index = bisect.bisect_right(self._starts, quantity) - 1
+        unit_price = self._unit_prices[index]
+        if self.pricing == TierPricing.VOLUME:
+            return unit_price * quantity
+
+        units_in_tier = quantity - self._starts[index] + 1
+        return self._preceding_prices[index] + unit_price * units_in_tier
@@ -1,16 +1,39 @@
+import operator
+
 from sqlalchemy import UniqueConstraint
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.orm import Mapped, composite, mapped_column
 
 
+from subscriptions.plans._domain._add_ons._duplicate_names import DuplicateAddOnNames
 from subscriptions.plans._domain._add_ons._flat_price_add_on import FlatPriceAddOn
 from subscriptions.plans._domain._add_ons._not_found import RequestedAddOnNotFound
 from subscriptions.plans._domain._add_ons._requested_add_on import RequestedAddOn
 from subscriptions.plans._domain._add_ons._tiered_add_on import TieredAddOn
 from subscriptions.plans._domain._add_ons._unit_price_add_on import UnitPriceAddOn
-from subscriptions.shared.money import MoneyType, Money
+from subscriptions.shared.money import Money, money_columns
 from subscriptions.shared.sqlalchemy import Base, AsJSON
 from subscriptions.shared.term import Term
 
+_AddOn = UnitPriceAddOn | FlatPriceAddOn | TieredAddOn
+
+
+class _AddOnIndex:
+    def __init__(self, add_ons: list[_AddOn]) -> None:
+        self._add_ons = add_ons
+        # Add-ons are frozen, so the same objects mean the same names
+        self._snapshot = tuple(add_ons)
+        self.by_name: dict[str, _AddOn] = {}
+        for add_on in add_ons:
+            # Plans saved before names had to be unique priced the first one
+            self.by_name.setdefault(add_on.name, add_on)
+
+    def is_of(self, add_ons: list[_AddOn]) -> bool:
+        return (
+            add_ons is self._add_ons
+            and len(add_ons) == len(self._snapshot)
+            and all(map(operator.is_, add_ons, self._snapshot))
+        )
+
 
 class Plan(Base):
     __tablename__ = "plans"
@@ -19,25 +42,44 @@ class Plan(Base):
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     tenant_id: Mapped[int]
     name: Mapped[str]
-    price: Mapped[Money] = mapped_column(MoneyType)
+    price: Mapped[Money] = composite(Money.from_minor_units, *money_columns("price"))
     description: Mapped[str]
     add_ons: Mapped[list[UnitPriceAddOn | FlatPriceAddOn | TieredAddOn]] = (
         mapped_column(AsJSON[list[UnitPriceAddOn | FlatPriceAddOn | TieredAddOn]])
     )
 
+    def __post_init__(self) -> None:
+        if len(self._add_ons_by_name()) < len(self.add_ons):
+            names = [add_on.name for add_on in self.add_ons]
+            raise DuplicateAddOnNames(
+                sorted({name for name in names if names.count(name) > 1})
+            )
+
+    def _add_ons_by_name(self) -> dict[str, _AddOn]:
+        """Indexed again whenever add_ons, or any add-on in it, is replaced.
+
+        Loaded plans do not run __init__, so it is built on first use.
+        """
+        index: _AddOnIndex | None = getattr(self, "_add_on_index", None)
+        if index is None or not index.is_of(self.add_ons):
+            index = _AddOnIndex(self.add_ons)
+            self._add_on_index = index
+        return index.by_name
+
     def calculate_cost(self, term: Term, add_ons: list[RequestedAddOn]) -> Money:
-        price = self.price
+        add_ons_by_name = self._add_ons_by_name()
+        not_found = [
+            requested_add_on.name
+            for requested_add_on in add_ons
+            if requested_add_on.name not in add_ons_by_name
+        ]
+        if not_found:
+            raise RequestedAddOnNotFound(", ".join(not_found))
 
+        price = self.price
         for requested_add_on in add_ons:
-            corresponding_add_on = self._add_on_named(requested_add_on.name)
-            if corresponding_add_on is None:
-                raise RequestedAddOnNotFound(requested_add_on.name)
-            price += corresponding_add_on.calculate_price(requested_add_on.quantity)
+            add_on = add_ons_by_name[requested_add_on.name]
+            price += add_on.calculate_price(requested_add_on.quantity)
 
         multiplier = 1 if term == Term.MONTHLY else 12
         return price * multiplier
-
-    def _add_on_named(
-        self, name: str
-    ) -> UnitPriceAddOn | FlatPriceAddOn | TieredAddOn | None:
-        return next((add_on for add_on in self.add_ons if add_on.name == name), None)
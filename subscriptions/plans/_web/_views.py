@@ -1,11 +1,12 @@
 from typing import Annotated
 
-from fastapi import Depends, APIRouter, Response
+from fastapi import Depends, APIRouter, HTTPException, Response
 from pydantic import BaseModel, Field
 
 from subscriptions.api import subject
 from subscriptions.auth import Subject
 from subscriptions.main import deps
+from subscriptions.plans._domain._add_ons._duplicate_names import DuplicateAddOnNames
 from subscriptions.plans._domain._add_ons._flat_price_add_on import FlatPriceAddOn
 from subscriptions.plans._domain._add_ons._tiered_add_on import TieredAddOn
 from subscriptions.plans._domain._add_ons._unit_price_add_on import UnitPriceAddOn
@@ -31,13 +32,16 @@ def add_plan(
     subject: Subject = Depends(subject),
     plans: PlansFacade = deps.depends(PlansFacade),
 ) -> PlanDto:
-    return plans.add(
-        subject,
-        name=payload.name,
-        price=payload.price,
-        description=payload.description,
-        add_ons=payload.add_ons,
-    )
+    try:
+        return plans.add(
+            subject,
+            name=payload.name,
+            price=payload.price,
+            description=payload.description,
+            add_ons=payload.add_ons,
+        )
+    except DuplicateAddOnNames as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
 
 
 @router.get("/plans")
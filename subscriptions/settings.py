@@ -7,3 +7,16 @@ class PaymentsSettings(BaseSettings):
 
     class Config:
         env_prefix = "PAYMENTS_"
+
+
+class RenewalSettings(BaseSettings):
+    # Tenant id to its share of renewal chunks, relative to the default of 1
+    TENANT_WEIGHTS: dict[int, int] = {}
+    # Tenant id to the most of its subscriptions renewed per chunk
+    TENANT_CAPS: dict[int, int] = {}
+    # Hours of the billing day renewals are spread over, 0 to renew them at
+    # the time of day they were subscribed at
+    LEVELING_WINDOW_HOURS: int = 0
+
+    class Config:
+        env_prefix = "RENEWAL_"
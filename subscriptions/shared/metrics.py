@@ -0,0 +1,136 @@
+"""Minimal metrics: counters, gauges & histograms exposed in Prometheus text format."""
+
+import bisect
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds - from sub-millisecond database round trips up to minutes of lag
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Metrics:
+    """Interface of metrics backends - records nothing by itself."""
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        pass
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        pass
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        pass
+
+    def expose(self) -> str:
+        """Everything recorded so far, in Prometheus text exposition format."""
+        return ""
+
+
+class InProcessMetrics(Metrics):
+    """Keeps metrics in memory of the process that records them."""
+
+    BUCKETS = DEFAULT_BUCKETS
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[Labels, float]] = defaultdict(dict)
+        self._gauges: dict[str, dict[Labels, float]] = defaultdict(dict)
+        # Per labels: count in each bucket (last one is +Inf), sum of values
+        self._histograms: dict[str, dict[Labels, tuple[list[int], float]]] = (
+            defaultdict(dict)
+        )
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            self._gauges[name][_labels(labels)] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = _labels(labels)
+        bucket = bisect.bisect_left(self.BUCKETS, value)
+        with self._lock:
+            series = self._histograms[name]
+            counts, total = series.get(key) or ([0] * (len(self.BUCKETS) + 1), 0.0)
+            counts[bucket] += 1
+            series[key] = (counts, total + value)
+
+    def expose(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            for kind, metrics in [("counter", self._counters), ("gauge", self._gauges)]:
+                for name, series in sorted(metrics.items()):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in sorted(series.items()):
+                        lines.append(f"{name}{_format(key)} {value}")
+
+            for name, histogram in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, (counts, total) in sorted(histogram.items()):
+                    cumulative = 0
+                    bounds = [*map(str, self.BUCKETS), "+Inf"]
+                    for bound, count in zip(bounds, counts):
+                        cumulative += count
+                        bucket_key = (*key, ("le", bound))
+                        lines.append(f"{name}_bucket{_format(bucket_key)} {cumulative}")
+                    lines.append(f"{name}_sum{_format(key)} {total}")
+                    lines.append(f"{name}_count{_format(key)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def serve(metrics: Metrics, port: int) -> ThreadingHTTPServer:
+    """Serves metrics over HTTP from a background thread.
+
+    For processes without the web app, e.g. workers started from the CLI.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            body = metrics.expose().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _labels(labels: dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def _format(labels: Labels) -> str:
+    if not labels:
+        return ""
+    formatted = ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return f"{{{formatted}}}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
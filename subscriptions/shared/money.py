@@ -1,19 +1,46 @@
 import functools
-from decimal import Decimal
-from typing import Any, TypedDict, Type, ClassVar
+import itertools
+import operator
+from array import array
+from collections.abc import Hashable, Iterable, Iterator, Sequence
+from decimal import Context, Decimal, MAX_EMAX, MAX_PREC, MIN_EMIN
+from typing import Any, NamedTuple, TypedDict, Type, ClassVar
 
 from pydantic import GetCoreSchemaHandler
 from pydantic_core import core_schema
-from sqlalchemy import types, JSON, Dialect
+from sqlalchemy import types, JSON, Dialect, Connection, Numeric, String, text
+from sqlalchemy.orm import MappedColumn, mapped_column
+
+
+# Scaling a Decimal by a power of ten must never round, whatever the amount.
+_EXACT = Context(prec=MAX_PREC, Emax=MAX_EMAX, Emin=MIN_EMIN)
+
+
+class _Scale(NamedTuple):
+    minor_units_per_unit: int
+    quantum: Decimal
+    # %-template for (units, minor units), e.g. "%d.%02d" for two decimal places
+    amount_template: str
+
+
+# Filled in once per currency, when Currency subclass is defined
+_SCALES: dict[str, _Scale] = {}
 
 
 class Currency:
     iso_code: ClassVar[str]
     decimal_places: ClassVar[int]
+    minor_units_per_unit: ClassVar[int]
     __iso_code_to_type: dict[str, Type["Currency"]] = {}
 
     def __init_subclass__(cls) -> None:
+        cls.minor_units_per_unit = 10**cls.decimal_places
         cls.__iso_code_to_type[cls.iso_code] = cls
+        _SCALES[cls.iso_code] = _Scale(
+            cls.minor_units_per_unit,
+            Decimal(1).scaleb(-cls.decimal_places),
+            f"%d.%0{cls.decimal_places}d" if cls.decimal_places else "%d%.0s",
+        )
 
     @classmethod
     def supported_currencies(cls) -> set[str]:
@@ -41,28 +68,69 @@ class ETH(Currency):
 
 @functools.total_ordering
 class Money:
-    def __init__(self, amount: float | int | Decimal, currency: str) -> None:
-        a_currency = Currency.from_iso_code(currency)
+    """Non-negative amount of money in a given currency.
 
-        if amount < 0:
-            raise ValueError(f"Invalid amount: {amount}")
+    Internally the amount is kept as an integer count of the currency's minor
+    units (e.g. cents for USD), so arithmetic never has to re-quantize.
+    """
 
-        if isinstance(amount, float):
-            amount = Decimal(str(amount))
-        elif isinstance(amount, int):
-            amount = Decimal(amount)
+    __slots__ = ("_minor_units", "_currency")
 
-        min_unit = Decimal(str(10**-a_currency.decimal_places))
-        normalized = amount.quantize(min_unit)
-        if normalized != amount:
+    _minor_units: int
+    _currency: str
+
+    def __init__(self, amount: float | int | Decimal, currency: str) -> None:
+        minor_units_per_unit = _SCALES[currency].minor_units_per_unit
+
+        if isinstance(amount, int):
+            minor_units = amount * minor_units_per_unit
+        else:
+            if isinstance(amount, float):
+                amount = Decimal(str(amount))
+
+            numerator, denominator = amount.as_integer_ratio()
+            minor_units, remainder = divmod(
+                numerator * minor_units_per_unit, denominator
+            )
+            if remainder:
+                raise ValueError(f"Invalid amount: {amount}")
+
+        # Checked after conversion, comparing ints is cheaper than comparing Decimals
+        if minor_units < 0:
             raise ValueError(f"Invalid amount: {amount}")
 
-        self._amount = normalized
+        self._minor_units = minor_units
         self._currency = currency
 
+    @classmethod
+    def from_minor_units(cls, minor_units: int, currency: str) -> "Money":
+        if currency not in _SCALES:
+            raise KeyError(currency)
+
+        if minor_units < 0:
+            raise ValueError(f"Invalid amount: {minor_units} minor units")
+
+        return cls._trusted(minor_units, currency)
+
+    @classmethod
+    def _trusted(cls, minor_units: int, currency: str) -> "Money":
+        """Skips validation - only for values that are already known to be valid."""
+        money = object.__new__(cls)
+        money._minor_units = minor_units
+        money._currency = currency
+        return money
+
+    def to_minor_units(self) -> int:
+        return self._minor_units
+
+    def __composite_values__(self) -> tuple[int, str]:
+        """Values of columns created by money_columns."""
+        return self._minor_units, self._currency
+
     @property
     def amount(self) -> Decimal:
-        return self._amount
+        quantum = _SCALES[self._currency].quantum
+        return _EXACT.multiply(Decimal(self._minor_units), quantum)
 
     @property
     def currency(self) -> str:
@@ -70,7 +138,9 @@ class Money:
 
     def __mul__(self, other: Any) -> "Money":
         if isinstance(other, int):
-            return Money(amount=self.amount * other, currency=self.currency)
+            if other < 0:
+                raise ValueError(f"Invalid multiplier: {other}")
+            return Money._trusted(self._minor_units * other, self._currency)
 
         raise TypeError(f"Multiplication of Money by {type(other)} is not supported")
 
@@ -78,30 +148,186 @@ class Money:
         if not isinstance(other, Money):
             raise TypeError(f"Cannot add {type(other)} to Money")
 
-        if other.currency != self.currency:
+        if other._currency != self._currency:
             raise ValueError("Cannot add monet in different currencies!")
 
-        return Money(self.amount + other.amount, self.currency)
+        return Money._trusted(self._minor_units + other._minor_units, self._currency)
 
     def __le__(self, other: Any) -> bool:
         if not isinstance(other, Money):
             raise TypeError(f"Comparison of Money with {type(other)} is not supported")
 
-        if self.currency != other.currency:
+        if self._currency != other._currency:
             raise ValueError("Cannot compare money in different currencies")
 
-        return self.amount <= other.amount
+        return self._minor_units <= other._minor_units
 
     def __eq__(self, other: Any) -> bool:
         if not isinstance(other, Money):
             return False
 
-        return (other.amount, other.currency) == (self.amount, other.currency)
+        return (other._minor_units, other._currency) == (
+            self._minor_units,
+            self._currency,
+        )
 
     def __repr__(self) -> str:
         return f"Money({repr(self.amount)}, {repr(self.currency)})"
 
 
+class MoneyVector:
+    """Many amounts in a single currency, stored as a contiguous array of minor units.
+
+    Amounts are kept in an int64 array; when they do not fit (e.g. ETH with its
+    24 decimal places) the vector falls back to a list of Python ints.
+
+    Example usage:
+
+        ```python
+        prices = MoneyVector.from_money([Money(1, "USD"), Money(2, "USD")])
+        totals = (prices * 12).grouped_sum(["tenant_a", "tenant_b"])
+        ```
+    """
+
+    __slots__ = ("_minor_units", "_currency")
+
+    def __init__(self, minor_units: Iterable[int], currency: str) -> None:
+        if currency not in _SCALES:
+            raise KeyError(currency)
+
+        values = list(minor_units)
+        if values and min(values) < 0:
+            raise ValueError("Invalid amount: negative minor units")
+
+        self._minor_units = _pack(values)
+        self._currency = currency
+
+    @classmethod
+    def from_money(
+        cls, amounts: Sequence[Money], currency: str | None = None
+    ) -> "MoneyVector":
+        if currency is None:
+            if not amounts:
+                raise ValueError("Currency is required for an empty vector")
+            currency = amounts[0].currency
+
+        if any(money.currency != currency for money in amounts):
+            raise ValueError("Cannot put money in different currencies in one vector")
+
+        return cls._trusted(
+            _pack([money.to_minor_units() for money in amounts]), currency
+        )
+
+    @classmethod
+    def _trusted(
+        cls, minor_units: "array[int] | list[int]", currency: str
+    ) -> "MoneyVector":
+        vector = object.__new__(cls)
+        vector._minor_units = minor_units
+        vector._currency = currency
+        return vector
+
+    @property
+    def currency(self) -> str:
+        return self._currency
+
+    def to_money(self) -> list[Money]:
+        currency = self._currency
+        return [Money._trusted(value, currency) for value in self._minor_units]
+
+    def to_minor_units(self) -> list[int]:
+        return list(self._minor_units)
+
+    def sum(self) -> Money:
+        return Money._trusted(sum(self._minor_units), self._currency)
+
+    def grouped_sum[K: Hashable](self, keys: Sequence[K]) -> dict[K, Money]:
+        self._check_length(len(keys))
+        totals: dict[K, int] = {}
+        for key, value in zip(keys, self._minor_units):
+            totals[key] = totals.get(key, 0) + value
+
+        currency = self._currency
+        return {key: Money._trusted(total, currency) for key, total in totals.items()}
+
+    def __len__(self) -> int:
+        return len(self._minor_units)
+
+    def __getitem__(self, index: int) -> Money:
+        return Money._trusted(self._minor_units[index], self._currency)
+
+    def __iter__(self) -> Iterator[Money]:
+        return iter(self.to_money())
+
+    def __add__(self, other: Any) -> "MoneyVector":
+        other_values = self._operand(other)
+        return MoneyVector._trusted(
+            _pack(list(map(operator.add, self._minor_units, other_values))),
+            self._currency,
+        )
+
+    def __mul__(self, other: Any) -> "MoneyVector":
+        if not isinstance(other, int):
+            raise TypeError(
+                f"Multiplication of MoneyVector by {type(other)} is not supported"
+            )
+
+        if other < 0:
+            raise ValueError(f"Invalid multiplier: {other}")
+
+        multiplied = map(operator.mul, self._minor_units, itertools.repeat(other))
+        return MoneyVector._trusted(_pack(list(multiplied)), self._currency)
+
+    def __lt__(self, other: Any) -> list[bool]:
+        return list(map(operator.lt, self._minor_units, self._operand(other)))
+
+    def __le__(self, other: Any) -> list[bool]:
+        return list(map(operator.le, self._minor_units, self._operand(other)))
+
+    def __gt__(self, other: Any) -> list[bool]:
+        return list(map(operator.gt, self._minor_units, self._operand(other)))
+
+    def __ge__(self, other: Any) -> list[bool]:
+        return list(map(operator.ge, self._minor_units, self._operand(other)))
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, MoneyVector):
+            return False
+
+        return self._currency == other._currency and list(self._minor_units) == list(
+            other._minor_units
+        )
+
+    def __repr__(self) -> str:
+        return f"MoneyVector({self.to_minor_units()!r}, {self._currency!r})"
+
+    def _operand(self, other: Any) -> Iterable[int]:
+        """Minor units to combine element-wise with this vector - Money is broadcast."""
+        if isinstance(other, Money):
+            if other.currency != self._currency:
+                raise ValueError("Cannot combine money in different currencies")
+            return itertools.repeat(other.to_minor_units(), len(self))
+
+        if isinstance(other, MoneyVector):
+            if other._currency != self._currency:
+                raise ValueError("Cannot combine money in different currencies")
+            self._check_length(len(other))
+            return other._minor_units
+
+        raise TypeError(f"Cannot combine MoneyVector with {type(other)}")
+
+    def _check_length(self, length: int) -> None:
+        if length != len(self):
+            raise ValueError(f"Length mismatch: {len(self)} != {length}")
+
+
+def _pack(values: list[int]) -> "array[int] | list[int]":
+    try:
+        return array("q", values)
+    except OverflowError:
+        return values
+
+
 class MoneyType(types.TypeDecorator[Money]):
     """Adapter for SQLAlchemy that enables storing Money instances in JSON column.
 
@@ -135,9 +361,112 @@ class MoneyType(types.TypeDecorator[Money]):
         return Money(amount=as_decimal, currency=value["currency"])
 
 
+class MinorUnitsType(types.TypeDecorator[int]):
+    """Stores an exact count of minor units in NUMERIC column.
+
+    NUMERIC rather than BIGINT, because ETH amounts do not fit in 64 bits.
+    """
+
+    impl = Numeric
+    cache_ok = True
+
+    def process_result_value(
+        self, value: Decimal | None, dialect: Dialect
+    ) -> int | None:
+        if value is None:
+            return None
+
+        return int(value)
+
+
+def money_columns(name: str) -> tuple[MappedColumn[int], MappedColumn[str]]:
+    """Native columns for Money: `<name>_minor_units` and `<name>_currency`.
+
+    Unlike MoneyType, the database can index, range-filter and aggregate these.
+    Money implements `__composite_values__`, so the pair is mapped with `composite`.
+
+    Example usage:
+
+            ```python
+            class Order(Base):
+                __tablename__ = "orders"
+
+                id: Mapped[int] = mapped_column(init=False, primary_key=True)
+                amount: Mapped[Money] = composite(
+                    Money.from_minor_units, *money_columns("amount")
+                )
+
+
+            columns = Order.__table__.c
+            stmt = select(
+                columns.amount_currency, func.sum(columns.amount_minor_units)
+            ).group_by(columns.amount_currency)
+            ```
+    """
+    return (
+        mapped_column(f"{name}_minor_units", MinorUnitsType, nullable=False),
+        mapped_column(f"{name}_currency", String(3), nullable=False),
+    )
+
+
+def migrate_json_money_column(connection: Connection, table: str, column: str) -> int:
+    """Converts Money stored with MoneyType into columns created by money_columns.
+
+    Safe to run multiple times - does nothing once the JSON column is gone.
+    Returns the number of migrated rows.
+    """
+    exists_stmt = text(
+        "SELECT 1 FROM information_schema.columns "
+        "WHERE table_schema = current_schema() "
+        "AND table_name = :table AND column_name = :column"
+    )
+    if (
+        connection.execute(exists_stmt, {"table": table, "column": column}).first()
+        is None
+    ):
+        return 0
+
+    quote = connection.dialect.identifier_preparer.quote
+    table_name, json_column = quote(table), quote(column)
+    minor_units_column = quote(f"{column}_minor_units")
+    currency_column = quote(f"{column}_currency")
+    minor_units_per_unit = " ".join(
+        f"WHEN '{iso_code}' THEN {scale.minor_units_per_unit}"
+        for iso_code, scale in _SCALES.items()
+    )
+
+    connection.execute(
+        text(
+            f"ALTER TABLE {table_name} "
+            f"ADD COLUMN IF NOT EXISTS {minor_units_column} NUMERIC, "
+            f"ADD COLUMN IF NOT EXISTS {currency_column} VARCHAR(3)"
+        )
+    )
+    result = connection.execute(
+        text(
+            f"UPDATE {table_name} SET "
+            f"{minor_units_column} = ({json_column}->>'amount')::numeric "
+            f"* CASE {json_column}->>'currency' {minor_units_per_unit} END, "
+            f"{currency_column} = {json_column}->>'currency'"
+        )
+    )
+    connection.execute(
+        text(
+            f"ALTER TABLE {table_name} "
+            f"ALTER COLUMN {minor_units_column} SET NOT NULL, "
+            f"ALTER COLUMN {currency_column} SET NOT NULL, "
+            f"DROP COLUMN {json_column}"
+        )
+    )
+    return result.rowcount
+
+
 class MoneyAnnotation:
     """Pydantic annotation that enables support for Money class.
 
+    Amount is accepted as decimal string, int or float and serialized
+    to JSON as decimal string, e.g. {"amount": "10.99", "currency": "USD"}.
+
     Example usage:
 
         ```python
@@ -152,42 +481,57 @@ class MoneyAnnotation:
         _source_type: Any,
         _handler: GetCoreSchemaHandler,
     ) -> core_schema.CoreSchema:
-        def _validate_from_dict(v: dict[str, Any]) -> Money:
-            return Money(**v)
+        return _money_schema()
 
-        class _MoneyAsTypedDict(TypedDict):
-            amount: float
-            currency: str
 
-        from_dict_schema = core_schema.chain_schema(
-            [
-                core_schema.typed_dict_schema(
-                    {
-                        "amount": core_schema.typed_dict_field(
-                            core_schema.float_schema()
-                        ),
-                        "currency": core_schema.typed_dict_field(
-                            core_schema.str_schema(max_length=3)
-                        ),
-                    },
-                    cls=_MoneyAsTypedDict,
+class _MoneyAsTypedDict(TypedDict):
+    amount: Decimal
+    currency: str
+
+
+def _money_from_dict(value: _MoneyAsTypedDict) -> Money:
+    return Money(value["amount"], value["currency"])
+
+
+def _money_to_dict(
+    money: Money, info: core_schema.SerializationInfo
+) -> dict[str, Decimal | str]:
+    if not info.mode_is_json():
+        return {"amount": money.amount, "currency": money.currency}
+
+    # Formatting minor units is cheaper than building a Decimal and dumping it
+    scale = _SCALES[money.currency]
+    amount = scale.amount_template % divmod(
+        money.to_minor_units(), scale.minor_units_per_unit
+    )
+    return {"amount": amount, "currency": money.currency}
+
+
+@functools.cache
+def _money_schema() -> core_schema.CoreSchema:
+    """Built once and shared by every field annotated with MoneyAnnotation."""
+    from_dict_schema = core_schema.no_info_after_validator_function(
+        _money_from_dict,
+        core_schema.typed_dict_schema(
+            {
+                "amount": core_schema.typed_dict_field(core_schema.decimal_schema()),
+                "currency": core_schema.typed_dict_field(
+                    core_schema.str_schema(max_length=3)
                 ),
-                core_schema.no_info_plain_validator_function(_validate_from_dict),
+            },
+            cls=_MoneyAsTypedDict,
+        ),
+    )
+
+    return core_schema.json_or_python_schema(
+        json_schema=from_dict_schema,
+        python_schema=core_schema.union_schema(
+            [
+                core_schema.is_instance_schema(Money),
+                from_dict_schema,
             ]
-        )
-
-        return core_schema.json_or_python_schema(
-            json_schema=from_dict_schema,
-            python_schema=core_schema.union_schema(
-                [
-                    core_schema.is_instance_schema(Money),
-                    from_dict_schema,
-                ]
-            ),
-            serialization=core_schema.plain_serializer_function_ser_schema(
-                lambda instance: {
-                    "amount": instance.amount,
-                    "currency": instance.currency,
-                }
-            ),
-        )
+        ),
+        serialization=core_schema.plain_serializer_function_ser_schema(
+            _money_to_dict, info_arg=True
+        ),
+    )
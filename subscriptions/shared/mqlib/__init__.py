@@ -1,10 +1,36 @@
 """Mini-library wrapping kombu to provide simple API for sending messages."""
 
+from subscriptions.shared.mqlib._async import AsyncPublisher
+from subscriptions.shared.mqlib._consumer import Consumer, Handler
 from subscriptions.shared.mqlib._mqlib import (
     Publisher,
+    Envelope,
+    PublishError,
+    PublishFailure,
     Message,
     BrokerUrl,
     PoolFactory,
 )
+from subscriptions.shared.mqlib._serialization import (
+    Encoded,
+    Serialization,
+    decode,
+    register_serializer,
+)
 
-__all__ = ["Publisher", "Message", "BrokerUrl", "PoolFactory"]
+__all__ = [
+    "AsyncPublisher",
+    "Consumer",
+    "Handler",
+    "Publisher",
+    "Envelope",
+    "PublishError",
+    "PublishFailure",
+    "Message",
+    "BrokerUrl",
+    "PoolFactory",
+    "Encoded",
+    "Serialization",
+    "decode",
+    "register_serializer",
+]
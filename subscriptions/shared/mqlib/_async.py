@@ -0,0 +1,137 @@
+"""Publishing from asyncio code without blocking the event loop."""
+
+import asyncio
+import logging
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any
+
+from kombu import Queue  # type: ignore[import-untyped]
+
+from subscriptions.shared.mqlib._mqlib import (
+    ANONYMOUS_EXCHANGE,
+    Envelope,
+    PoolFactory,
+    PublishError,
+    PublishFailure,
+    Publisher,
+)
+from subscriptions.shared.mqlib._serialization import Serialization
+
+
+class AsyncPublisher:
+    """Same as Publisher, but awaiting confirms instead of blocking on them.
+
+    Messages are handed over to a background thread, which publishes
+    everything that was awaited in the meantime as one batch - so many
+    coroutines publishing at once share a channel and a single wait for
+    confirms, while each of them awaits only its own.
+    """
+
+    MAX_BATCH_SIZE = 100
+
+    def __init__(
+        self, pool_factory: PoolFactory, serialization: Serialization | None = None
+    ) -> None:
+        self._publisher = Publisher(pool_factory, serialization)
+        self._pending: queue.SimpleQueue[_Pending] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    async def publish(
+        self,
+        queue_name_or_queue: str | Queue,
+        message: dict[str, Any],
+        headers: dict[str, str] | None = None,
+        exchange: str = ANONYMOUS_EXCHANGE,
+    ) -> None:
+        queue = _queue_name(queue_name_or_queue)
+        failure = await self._submit(Envelope(queue, message, headers), exchange)
+        if failure is not None:
+            raise PublishError(f"Message to {queue!r}: {failure}")
+
+    async def publish_many(
+        self,
+        queue_name_or_queue: str | Queue,
+        messages: list[dict[str, Any]],
+        headers: dict[str, str] | None = None,
+        exchange: str = ANONYMOUS_EXCHANGE,
+    ) -> list[PublishFailure]:
+        queue = _queue_name(queue_name_or_queue)
+        reasons = await asyncio.gather(
+            *[
+                self._submit(Envelope(queue, message, headers), exchange)
+                for message in messages
+            ]
+        )
+        return [
+            PublishFailure(index, reason)
+            for index, reason in enumerate(reasons)
+            if reason is not None
+        ]
+
+    def _submit(
+        self, envelope: Envelope, exchange: str
+    ) -> "asyncio.Future[str | None]":
+        """Resolves with reason of failure, or None once confirmed."""
+        self._ensure_thread()
+        future: asyncio.Future[str | None] = asyncio.get_running_loop().create_future()
+        self._pending.put(_Pending(envelope, exchange, future))
+        return future
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="AsyncPublisher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._pending.get()]
+            while len(batch) < self.MAX_BATCH_SIZE:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            for exchange in dict.fromkeys(pending.exchange for pending in batch):
+                self._publish([p for p in batch if p.exchange == exchange], exchange)
+
+    def _publish(self, batch: list["_Pending"], exchange: str) -> None:
+        reasons: list[str | None] = [None] * len(batch)
+        try:
+            failures = self._publisher.publish_batch(
+                [pending.envelope for pending in batch], exchange
+            )
+        except Exception as exc:
+            logging.exception("Error while publishing batch of %d", len(batch))
+            reasons = [repr(exc)] * len(batch)
+        else:
+            for failure in failures:
+                reasons[failure.index] = failure.reason
+
+        for pending, reason in zip(batch, reasons):
+            loop = pending.future.get_loop()
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_resolve, pending.future, reason)
+
+
+@dataclass(frozen=True)
+class _Pending:
+    envelope: Envelope
+    exchange: str
+    future: "asyncio.Future[str | None]"
+
+
+def _resolve(future: "asyncio.Future[str | None]", reason: str | None) -> None:
+    if not future.done():  # e.g. cancelled while waiting
+        future.set_result(reason)
+
+
+def _queue_name(queue_name_or_queue: str | Queue) -> str:
+    if isinstance(queue_name_or_queue, Queue):
+        return str(queue_name_or_queue.name)
+    return queue_name_or_queue
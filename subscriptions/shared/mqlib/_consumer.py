@@ -0,0 +1,261 @@
+"""Consuming messages with handlers run by a pool of worker threads."""
+
+import heapq
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable
+
+from kombu import Connection, Consumer as KombuConsumer, Queue  # type: ignore[import-untyped]
+from kombu.transport import virtual  # type: ignore[import-untyped]
+
+from subscriptions.shared.mqlib._mqlib import (
+    Message,
+    PoolFactory,
+    PublishError,
+    Publisher,
+)
+from subscriptions.shared.mqlib._serialization import ACCEPTED_CONTENT_TYPES
+
+Handler = Callable[[dict[str, Any]], None]
+
+REDELIVERIES_HEADER = "x-redeliveries"
+
+
+class Consumer:
+    """Calls handlers registered per queue for messages from that queue.
+
+    A message is acked once its handler returns. When the handler raises, the
+    message is published again to the end of its queue with a redelivery
+    count in headers. After max_redeliveries it is rejected instead, so it
+    goes to the dead-letter exchange of the queue, if there is one.
+
+    Handlers run in a pool of worker threads. The channel is only used by the
+    thread calling run - it receives up to prefetch_count unacked messages per
+    queue and acks them in batches.
+    """
+
+    # Longest time an ack waits for the rest of its batch
+    ACK_INTERVAL = 0.1
+    RECONNECT_DELAY = 1.0
+
+    def __init__(
+        self,
+        pool_factory: PoolFactory,
+        prefetch_count: int = 100,
+        workers: int = 8,
+        max_redeliveries: int = 3,
+    ) -> None:
+        self._pool_factory = pool_factory
+        self._publisher = Publisher(pool_factory)
+        self._prefetch_count = prefetch_count
+        self._workers = workers
+        self._max_redeliveries = max_redeliveries
+        self._handlers: dict[str, Handler] = {}
+
+    def register(self, queue_name: str, handler: Handler) -> None:
+        self._handlers[queue_name] = handler
+
+    def run(self, stop_event: threading.Event) -> None:
+        """Consumes until stop_event is set.
+
+        Then stops receiving, waits for handlers already running or waiting for
+        a worker and acks what they handled, so no message is handled twice.
+        """
+        with ThreadPoolExecutor(self._workers) as executor:
+            while not stop_event.is_set():
+                with self._pool_factory.get().acquire(block=True) as conn:
+                    try:
+                        self._consume(conn, executor, stop_event)
+                    except conn.connection_errors + conn.channel_errors:
+                        logging.exception("Lost connection to broker, reconnecting")
+                        # Unacked messages will be delivered again anyway
+                        conn.collect()
+                        stop_event.wait(self.RECONNECT_DELAY)
+
+    def _consume(
+        self,
+        conn: Connection,
+        executor: ThreadPoolExecutor,
+        stop_event: threading.Event,
+    ) -> None:
+        channel = conn.channel()
+        acks = _Acks(channel, max(1, self._prefetch_count // 4))
+        handled: queue.SimpleQueue[_Handled] = queue.SimpleQueue()
+
+        def on_message(
+            queue_name: str, handler: Handler, body: dict[str, Any], message: Message
+        ) -> None:
+            acks.received(message.delivery_tag)
+            executor.submit(self._handle, queue_name, handler, body, message, handled)
+
+        consumers = [
+            KombuConsumer(
+                channel,
+                queues=[Queue(queue_name)],
+                callbacks=[partial(on_message, queue_name, handler)],
+                accept=ACCEPTED_CONTENT_TYPES,
+                prefetch_count=self._prefetch_count,
+            )
+            for queue_name, handler in self._handlers.items()
+        ]
+        try:
+            for consumer in consumers:
+                consumer.consume()
+
+            while not stop_event.is_set():
+                try:
+                    conn.drain_events(timeout=self.ACK_INTERVAL)
+                except TimeoutError:
+                    pass
+                self._settle_handled(handled, acks)
+                acks.flush_if_due(self.ACK_INTERVAL)
+
+            for consumer in consumers:
+                consumer.cancel()
+            while acks.in_flight:
+                self._settle(handled.get(), acks)
+            acks.flush()
+        finally:
+            channel.close()
+
+    def _handle(
+        self,
+        queue_name: str,
+        handler: Handler,
+        body: dict[str, Any],
+        message: Message,
+        handled: "queue.SimpleQueue[_Handled]",
+    ) -> None:
+        try:
+            handler(body)
+        except Exception:
+            logging.exception("Error while handling message from %s", queue_name)
+            handled.put(_Handled(queue_name, body, message, failed=True))
+        else:
+            handled.put(_Handled(queue_name, body, message, failed=False))
+
+    def _settle_handled(
+        self, handled: "queue.SimpleQueue[_Handled]", acks: "_Acks"
+    ) -> None:
+        while True:
+            try:
+                self._settle(handled.get_nowait(), acks)
+            except queue.Empty:
+                return
+
+    def _settle(self, handled: "_Handled", acks: "_Acks") -> None:
+        delivery_tag = handled.message.delivery_tag
+        if not handled.failed:
+            acks.ack(delivery_tag)
+            return
+
+        headers = dict(handled.message.headers or {})
+        redeliveries = int(headers.get(REDELIVERIES_HEADER, 0))
+        if redeliveries >= self._max_redeliveries:
+            logging.error(
+                "Message from %s failed %d times, rejecting",
+                handled.queue_name,
+                redeliveries + 1,
+            )
+            acks.reject(delivery_tag, requeue=False)
+            return
+
+        headers[REDELIVERIES_HEADER] = str(redeliveries + 1)
+        try:
+            self._publisher.publish(handled.queue_name, handled.body, headers)
+        except (PublishError, OSError):
+            logging.exception("Could not redeliver message, requeueing")
+            acks.reject(delivery_tag, requeue=True)
+        else:
+            acks.ack(delivery_tag)
+
+
+@dataclass(frozen=True)
+class _Handled:
+    queue_name: str
+    body: dict[str, Any]
+    message: Message
+    failed: bool
+
+
+class _Acks:
+    """Acks delivered messages in batches, in the order they were delivered.
+
+    Handlers finish out of order, so a batch ends right before the first
+    message which is still being handled - an ack with `multiple` flag covers
+    all messages up to its delivery tag.
+    """
+
+    def __init__(self, channel: Any, batch_size: int) -> None:
+        self._channel = channel
+        self._batch_size = batch_size
+        # Virtual transports (e.g. in-memory) have no ordered delivery tags
+        # and ignore `multiple`, so messages are acked one by one there
+        self._multiple = not isinstance(channel, virtual.Channel)
+        self._unsettled: set[Any] = set()
+        self._delivered: list[Any] = []
+        self._acked: set[Any] = set()
+        self._ackable: list[Any] = []
+        self._oldest_ackable_at: float | None = None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._unsettled)
+
+    def received(self, delivery_tag: Any) -> None:
+        self._unsettled.add(delivery_tag)
+        if self._multiple:
+            heapq.heappush(self._delivered, delivery_tag)
+
+    def ack(self, delivery_tag: Any) -> None:
+        self._unsettled.remove(delivery_tag)
+        if self._multiple:
+            self._acked.add(delivery_tag)
+            self._advance()
+        else:
+            self._add_ackable(delivery_tag)
+
+        if len(self._ackable) >= self._batch_size:
+            self.flush()
+
+    def reject(self, delivery_tag: Any, requeue: bool) -> None:
+        self._unsettled.remove(delivery_tag)
+        self._channel.basic_reject(delivery_tag, requeue=requeue)
+        if self._multiple:
+            self._advance()
+
+    def flush_if_due(self, interval: float) -> None:
+        if (
+            self._oldest_ackable_at is not None
+            and time.monotonic() - self._oldest_ackable_at >= interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._ackable:
+            return
+
+        if self._multiple:
+            self._channel.basic_ack(self._ackable[-1], multiple=True)
+        else:
+            for delivery_tag in self._ackable:
+                self._channel.basic_ack(delivery_tag)
+        self._ackable.clear()
+        self._oldest_ackable_at = None
+
+    def _advance(self) -> None:
+        while self._delivered and self._delivered[0] not in self._unsettled:
+            delivery_tag = heapq.heappop(self._delivered)
+            if delivery_tag in self._acked:
+                self._acked.remove(delivery_tag)
+                self._add_ackable(delivery_tag)
+
+    def _add_ackable(self, delivery_tag: Any) -> None:
+        self._ackable.append(delivery_tag)
+        if self._oldest_ackable_at is None:
+            self._oldest_ackable_at = time.monotonic()
@@ -1,11 +1,17 @@
 """Mini-library wrapping kombu to provide simple API for sending messages."""
 
 import threading
-from typing import Protocol, TypedDict, NewType, Any
+import time
+import weakref
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from typing import NamedTuple, Protocol, TypedDict, NewType, Any
 
 from kombu import Connection, Queue  # type: ignore[import-untyped]
 from kombu.connection import ConnectionPool  # type: ignore[import-untyped]
-from kombu.pools import connections  # type: ignore[import-untyped]
+from kombu.pools import ProducerPool, connections, producers  # type: ignore[import-untyped]
+
+from subscriptions.shared.mqlib._serialization import Serialization
 
 
 BrokerUrl = NewType("BrokerUrl", str)
@@ -13,28 +19,53 @@ BrokerUrl = NewType("BrokerUrl", str)
 
 class PoolFactory:
     def __init__(self, broker_url: BrokerUrl) -> None:
-        self._pool: ConnectionPool | None = None
+        self._connection: Connection | None = None
         self._lock = threading.Lock()
         self._broker_url = broker_url
 
     def get(self) -> ConnectionPool:
-        with self._lock:
-            if self._pool is not None:
-                return self._pool
+        return connections[self._get_connection()]
 
-            connection = Connection(
-                self._broker_url, transport_options={"confirm_publish": True}
-            )
-            self._pool = connections[connection]
-            return self._pool
+    def get_producers(self) -> ProducerPool:
+        """Producers stay bound to default channels of pooled connections."""
+        return producers[self._get_connection()]
+
+    def _get_connection(self) -> Connection:
+        with self._lock:
+            if self._connection is None:
+                # Publisher confirms are handled by Publisher itself, so that
+                # they can be awaited for a batch instead of message by message
+                self._connection = Connection(self._broker_url)
+            return self._connection
 
 
 ANONYMOUS_EXCHANGE = ""
 
 
+class PublishError(Exception):
+    pass
+
+
+class Envelope(NamedTuple):
+    queue: str
+    message: dict[str, Any]
+    headers: dict[str, str] | None = None
+
+
+@dataclass(frozen=True, order=True)
+class PublishFailure:
+    index: int
+    reason: str
+
+
 class Publisher:
-    def __init__(self, pool_factory: PoolFactory) -> None:
+    CONFIRM_TIMEOUT = 30.0
+
+    def __init__(
+        self, pool_factory: PoolFactory, serialization: Serialization | None = None
+    ) -> None:
         self._pool_factory = pool_factory
+        self._serialization = serialization or Serialization()
 
     def publish(
         self,
@@ -43,21 +74,201 @@ class Publisher:
         headers: dict[str, str] | None = None,
         exchange: str = ANONYMOUS_EXCHANGE,
     ) -> None:
-        headers = headers or {}
         if isinstance(queue_name_or_queue, Queue):
             queue = queue_name_or_queue.name
         else:
             queue = queue_name_or_queue
 
-        with self._pool_factory.get().acquire(block=True) as conn:
-            Queue(name=queue)(conn).declare()
-            producer = conn.Producer(serializer="json", auto_declare=True)
-            producer.publish(
-                message,
-                exchange=exchange,
-                routing_key=queue,
-                headers=headers,
-            )
+        failures = self.publish_batch([Envelope(queue, message, headers)], exchange)
+        if failures:
+            raise PublishError(f"Message to {queue!r}: {failures[0].reason}")
+
+    def publish_many(
+        self,
+        queue_name_or_queue: str | Queue,
+        messages: Sequence[dict[str, Any]],
+        headers: dict[str, str] | None = None,
+        exchange: str = ANONYMOUS_EXCHANGE,
+    ) -> list[PublishFailure]:
+        """Publishes messages to one queue, see publish_batch.
+
+        Indexes of failures point to messages, so only those can be retried.
+        """
+        if isinstance(queue_name_or_queue, Queue):
+            queue = queue_name_or_queue.name
+        else:
+            queue = queue_name_or_queue
+
+        return self.publish_batch(
+            [Envelope(queue, message, headers) for message in messages], exchange
+        )
+
+    def publish_batch(
+        self, envelopes: Sequence[Envelope], exchange: str = ANONYMOUS_EXCHANGE
+    ) -> list[PublishFailure]:
+        """Publishes all envelopes over a single channel.
+
+        Confirms are awaited together once everything was sent. Returns
+        failures of envelopes that were rejected by the broker or not confirmed
+        in time, ordered by index. Connection errors are raised, as then it is
+        not known which envelopes made it.
+        """
+        if not envelopes:
+            return []
+
+        with self._pool_factory.get_producers().acquire(block=True) as producer:
+            channel = producer.channel
+            state = _channel_state(channel)
+            for queue in dict.fromkeys(envelope.queue for envelope in envelopes):
+                if queue not in state.declared_queues:
+                    Queue(name=queue)(channel).declare()
+                    state.declared_queues.add(queue)
+
+            with _Confirms(channel, state) as confirms:
+                for envelope in envelopes:
+                    encoded = self._serialization.encode(envelope.message)
+                    headers = dict(envelope.headers or {})
+                    # Could be left from a message received and republished
+                    headers.pop("compression", None)
+                    if encoded.compression is not None:
+                        headers["compression"] = encoded.compression
+                    producer.publish(
+                        encoded.body,
+                        exchange=exchange,
+                        routing_key=envelope.queue,
+                        headers=headers,
+                        content_type=encoded.content_type,
+                        content_encoding=encoded.content_encoding,
+                    )
+                    confirms.sent()
+                return confirms.wait(producer.connection, self.CONFIRM_TIMEOUT)
+
+
+@dataclass
+class _ChannelState:
+    """What has been done on a channel, so it does not have to be repeated.
+
+    Kept per channel object - a reconnect opens a new channel, which starts
+    with no queues declared and confirm mode not enabled. Errors publishing
+    leave it as it is, as the broker goes on numbering messages of the channel.
+    """
+
+    declared_queues: set[str] = field(default_factory=set)
+    # None until confirm mode is enabled. Then delivery tag of the last message
+    # published on the channel by anyone, as the broker numbers them - so
+    # confirms can be matched with messages of a batch.
+    last_tag: int | None = None
+
+
+_channel_states: "weakref.WeakKeyDictionary[Any, _ChannelState]" = (
+    weakref.WeakKeyDictionary()
+)
+_channel_states_lock = threading.Lock()
+
+
+def _channel_state(channel: Any) -> _ChannelState:
+    with _channel_states_lock:
+        state = _channel_states.get(channel)
+        if state is None:
+            state = _channel_states[channel] = _ChannelState()
+        return state
+
+
+class _Confirms:
+    """Collects publisher confirms (acks & nacks) for a batch of messages."""
+
+    def __init__(self, channel: Any, state: _ChannelState) -> None:
+        self._channel = channel
+        self._state = state
+        self._supported = hasattr(channel, "confirm_select")
+        # Delivery tag of each sent message to its index in the batch
+        self._indexes: dict[int, int] = {}
+        self._pending: set[int] = set()
+        self._nacked: set[int] = set()
+
+    def __enter__(self) -> "_Confirms":
+        if not self._supported:
+            # e.g. in-memory transport, where publishing never fails silently
+            return self
+
+        if self._state.last_tag is None:
+            self._channel.confirm_select()
+            _count_publishes(self._channel, self._state)
+        self._channel.events["basic_ack"].add(self._on_ack)
+        self._channel.events["basic_nack"].add(self._on_nack)
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        if not self._supported:
+            return
+
+        self._channel.events["basic_ack"].discard(self._on_ack)
+        self._channel.events["basic_nack"].discard(self._on_nack)
+
+    def sent(self) -> None:
+        """Call right after publishing each message of the batch, in order."""
+        if not self._supported:
+            return
+
+        assert self._state.last_tag is not None
+        self._indexes[self._state.last_tag] = len(self._indexes)
+        self._pending.add(self._state.last_tag)
+
+    def wait(self, conn: Connection, timeout: float) -> list[PublishFailure]:
+        """Returns failures of messages which were nacked or not confirmed."""
+        if not self._supported:
+            return []
+
+        deadline = time.monotonic() + timeout
+        while self._pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                conn.drain_events(timeout=remaining)
+            except TimeoutError:
+                break
+
+        failures = [
+            PublishFailure(self._indexes[tag], "Nacked by broker")
+            for tag in self._nacked
+        ] + [
+            PublishFailure(self._indexes[tag], f"Not confirmed within {timeout}s")
+            for tag in self._pending
+        ]
+        return sorted(failures)
+
+    def _on_ack(self, delivery_tag: int, multiple: bool) -> None:
+        self._confirm(delivery_tag, multiple)
+
+    def _on_nack(self, delivery_tag: int, multiple: bool) -> None:
+        self._nacked |= self._confirm(delivery_tag, multiple)
+
+    def _confirm(self, delivery_tag: int, multiple: bool) -> set[int]:
+        if multiple:
+            confirmed = {tag for tag in self._pending if tag <= delivery_tag}
+        else:
+            confirmed = {delivery_tag} & self._pending
+        self._pending -= confirmed
+        return confirmed
+
+
+def _count_publishes(channel: Any, state: _ChannelState) -> None:
+    """Counts messages published on the channel from now on, as the broker does.
+
+    Wraps basic_publish of the channel itself, so messages published on it
+    outside of Publisher are counted too and do not shift delivery tags.
+    """
+    state.last_tag = 0
+    basic_publish = channel.basic_publish
+
+    def counting_basic_publish(*args: Any, **kwargs: Any) -> Any:
+        result = basic_publish(*args, **kwargs)
+        assert state.last_tag is not None
+        state.last_tag += 1
+        return result
+
+    channel.basic_publish = counting_basic_publish
 
 
 class DeliveryInfo(TypedDict):
@@ -72,6 +283,7 @@ class Message(Protocol):
     headers: dict[str, str]
     properties: dict[str, str]
     delivery_info: DeliveryInfo
+    delivery_tag: Any
     acknowledged: bool
 
     def ack(self) -> None: ...
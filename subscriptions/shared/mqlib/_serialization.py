@@ -0,0 +1,81 @@
+"""Encoding of message bodies, named in headers so consumers can decode them.
+
+Builds on registries of kombu: serializers from kombu.serialization (json,
+msgpack when it is installed) and compression methods from kombu.compression
+(zlib, zstd when zstandard is installed). kombu consumers decompress and
+decode messages by their content-type and compression headers, so publishers
+may switch formats without consumers being changed first.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, NamedTuple
+
+from kombu import compression as kombu_compression, serialization  # type: ignore[import-untyped]
+
+# Content types consumers decode - never pickle or yaml, which can run code
+ACCEPTED_CONTENT_TYPES = {"application/json", "application/x-msgpack"}
+
+
+def register_serializer(
+    name: str,
+    encoder: Callable[[Any], bytes],
+    decoder: Callable[[bytes], Any],
+    content_type: str,
+) -> None:
+    """Makes a serializer available to Serialization and accepted by consumers."""
+    serialization.register(
+        name, encoder, decoder, content_type, content_encoding="binary"
+    )
+    ACCEPTED_CONTENT_TYPES.add(content_type)
+
+
+class Encoded(NamedTuple):
+    body: bytes
+    content_type: str
+    content_encoding: str
+    # Value of the compression header, None when body is not compressed
+    compression: str | None
+
+
+@dataclass(frozen=True)
+class Serialization:
+    """How Publisher encodes messages.
+
+    Bodies longer than compress_above bytes are compressed - shorter ones would
+    barely shrink, while still paying for compressing and decompressing.
+    """
+
+    serializer: str = "json"
+    compression: str | None = None
+    compress_above: int = 1024
+
+    def __post_init__(self) -> None:
+        # Fails on unknown names or missing libraries before anything is sent
+        serialization.dumps({}, self.serializer)
+        if self.compression is not None:
+            kombu_compression.get_encoder(self.compression)
+
+    def encode(self, message: dict[str, Any]) -> Encoded:
+        content_type, content_encoding, body = serialization.dumps(
+            message, self.serializer
+        )
+        if isinstance(body, str):
+            body = body.encode(content_encoding)
+
+        compression = None
+        if self.compression is not None and len(body) > self.compress_above:
+            body, compression = kombu_compression.compress(body, self.compression)
+        return Encoded(body, content_type, content_encoding, compression)
+
+
+def decode(encoded: Encoded) -> Any:
+    """What consumers do to a message, for code reading bodies without them."""
+    body = encoded.body
+    if encoded.compression is not None:
+        body = kombu_compression.decompress(body, encoded.compression)
+    return serialization.loads(
+        body,
+        encoded.content_type,
+        encoded.content_encoding,
+        accept=ACCEPTED_CONTENT_TYPES,
+    )
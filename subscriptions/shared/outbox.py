@@ -1,60 +1,676 @@
 import logging
-from datetime import datetime, timezone
+import random
+import select as io_select
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from types import TracebackType
+from collections.abc import Iterable
 from typing import Any
 
-from sqlalchemy import DateTime, select
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import mapped_column, Mapped, Session
+from sqlalchemy import (
+    DDL,
+    Connection,
+    DateTime,
+    Engine,
+    Index,
+    Integer,
+    PoolProxiedConnection,
+    any_,
+    bindparam,
+    delete,
+    event,
+    exists,
+    func,
+    insert,
+    literal,
+    select,
+    Select,
+    text,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, insert as pg_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import aliased, mapped_column, Mapped, Session
 
-from subscriptions.shared.mqlib import Publisher
+from subscriptions.shared.metrics import Metrics
+from subscriptions.shared.mqlib import Envelope, Publisher, PublishFailure
 from subscriptions.shared.sqlalchemy import Base
 
 
+# Entries are spread over a fixed number of partitions, which are divided
+# between workers. All entries with the same ordering key land in the same one.
+PARTITIONS = 256
+
+
+def partition_for(ordering_key: str | None) -> int:
+    if ordering_key is None:
+        return random.randrange(PARTITIONS)
+    return zlib.crc32(ordering_key.encode()) % PARTITIONS
+
+
 class Outbox:
+    RETRIES = 3
+
     def __init__(self, session: Session) -> None:
         self._session = session
 
-    def put(self, queue_name: str, message: dict[str, Any]) -> None:
+    def put(
+        self,
+        queue_name: str,
+        message: dict[str, Any],
+        ordering_key: str | None = None,
+    ) -> None:
+        """Entries with the same ordering_key are published in order of putting."""
+        now = datetime.now(timezone.utc)
         self._session.add(
             OutboxEntry(
                 queue=queue_name,
                 data=message,
-                retries_left=3,
-                when_created=datetime.now(timezone.utc),
+                retries_left=self.RETRIES,
+                when_created=now,
+                next_attempt_at=now,
+                ordering_key=ordering_key,
+                partition=partition_for(ordering_key),
+            )
+        )
+
+    def put_many(
+        self,
+        queue_name: str,
+        messages: Iterable[dict[str, Any]],
+        ordering_key: str | None = None,
+    ) -> None:
+        """Inserts all messages with a single INSERT statement."""
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                "queue": queue_name,
+                "data": message,
+                "retries_left": self.RETRIES,
+                "when_created": now,
+                "next_attempt_at": now,
+                "ordering_key": ordering_key,
+                "partition": partition_for(ordering_key),
+            }
+            for message in messages
+        ]
+        if rows:
+            self._session.execute(insert(OutboxEntry), rows)
+
+
+class OutboxDeadLetters:
+    """Entries that ran out of retries, kept aside until replayed or purged."""
+
+    def __init__(self, session: Session) -> None:
+        self._session = session
+
+    def recent(self, limit: int = 100) -> list["OutboxDeadLetter"]:
+        stmt = (
+            select(OutboxDeadLetter).order_by(OutboxDeadLetter.id.desc()).limit(limit)
+        )
+        return list(self._session.execute(stmt).scalars())
+
+    def replay(self, ids: list[int] | None = None) -> int:
+        """Puts dead letters (all of them, unless ids given) back to the outbox.
+
+        Returns number of replayed entries.
+        """
+        stmt = delete(OutboxDeadLetter).returning(
+            OutboxDeadLetter.id,
+            OutboxDeadLetter.queue,
+            OutboxDeadLetter.data,
+            OutboxDeadLetter.ordering_key,
+        )
+        if ids is not None:
+            stmt = stmt.where(OutboxDeadLetter.id == any_(_ints("ids", ids)))
+        # RETURNING has no order, while new ids have to keep entries of a key
+        # in their original order
+        dead_letters = sorted(
+            self._session.execute(stmt).all(), key=lambda dead_letter: dead_letter.id
+        )
+
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                "queue": dead_letter.queue,
+                "data": dead_letter.data,
+                "retries_left": Outbox.RETRIES,
+                "when_created": now,
+                "next_attempt_at": now,
+                "ordering_key": dead_letter.ordering_key,
+                "partition": partition_for(dead_letter.ordering_key),
+            }
+            for dead_letter in dead_letters
+        ]
+        if rows:
+            self._session.execute(insert(OutboxEntry), rows)
+        return len(rows)
+
+    def purge(self, older_than: timedelta) -> int:
+        """Deletes dead letters that failed more than older_than ago."""
+        result = self._session.execute(
+            delete(OutboxDeadLetter).where(
+                OutboxDeadLetter.when_failed < datetime.now(timezone.utc) - older_than
             )
         )
+        return result.rowcount
+
+
+class OutboxListener:
+    """Waits for notifications sent when entries are inserted into the outbox.
+
+    Uses a dedicated PostgreSQL connection that LISTENs on NOTIFY_CHANNEL. When
+    it is lost, it is opened again on later waits, at most once per delay that
+    doubles from MIN_RECONNECT_DELAY up to MAX_RECONNECT_DELAY.
+    """
+
+    NOTIFY_CHANNEL = "outbox_entries"
+    MIN_RECONNECT_DELAY = 1.0
+    MAX_RECONNECT_DELAY = 30.0
+
+    def __init__(self, engine: Engine) -> None:
+        self._engine = engine
+        self._connection: PoolProxiedConnection | None = None
+        self._driver_connection: Any = None
+        self._reconnect_delay = self.MIN_RECONNECT_DELAY
+        self._reconnect_at = 0.0
+
+    def __enter__(self) -> "OutboxListener":
+        self._connect()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        self._disconnect()
+
+    def wait(self, timeout: float) -> bool:
+        """Returns True if notified within timeout (in seconds).
+
+        Also True right after reconnecting, as notifications sent while not
+        connected are lost - so the caller checks for entries anyway.
+        """
+        if self._driver_connection is None:
+            remaining = self._reconnect_at - time.monotonic()
+            if remaining > 0:
+                time.sleep(min(remaining, timeout))
+                return False
+            return self._connect()
+
+        driver_connection = self._driver_connection
+        try:
+            if not driver_connection.notifies:
+                readable, _, _ = io_select.select([driver_connection], [], [], timeout)
+                if not readable:
+                    return False
+                driver_connection.poll()
+        except (self._engine.dialect.loaded_dbapi.Error, OSError, ValueError):
+            logging.exception("Lost connection listening for outbox entries")
+            self._disconnect(lost=True)
+            return True
+
+        notified = bool(driver_connection.notifies)
+        driver_connection.notifies.clear()
+        return notified
+
+    def _connect(self) -> bool:
+        try:
+            connection = self._engine.raw_connection()
+            # LISTEN is bound to the connection, it must not go back to the pool
+            connection.detach()
+            try:
+                driver_connection = connection.dbapi_connection
+                driver_connection.autocommit = True  # type: ignore[union-attr]
+                cursor = connection.cursor()
+                cursor.execute(f"LISTEN {self.NOTIFY_CHANNEL}")
+                cursor.close()
+            except BaseException:
+                connection.close()
+                raise
+        except (DBAPIError, self._engine.dialect.loaded_dbapi.Error):
+            logging.exception(
+                "Could not listen for outbox entries, retrying in %.0fs",
+                self._reconnect_delay,
+            )
+            self._reconnect_at = time.monotonic() + self._reconnect_delay
+            self._reconnect_delay = min(
+                self._reconnect_delay * 2, self.MAX_RECONNECT_DELAY
+            )
+            return False
+
+        self._connection = connection
+        self._driver_connection = driver_connection
+        self._reconnect_delay = self.MIN_RECONNECT_DELAY
+        return True
+
+    def _disconnect(self, lost: bool = False) -> None:
+        connection, self._connection = self._connection, None
+        self._driver_connection = None
+        if connection is None:
+            return
+
+        try:
+            if lost:
+                # Closed without the usual rollback, which cannot succeed
+                connection.invalidate()
+            else:
+                connection.close()
+        except Exception:
+            logging.exception("Error while closing outbox listener connection")
+
+
+class OutboxWorker:
+    """Membership of a processor in a group sharing the outbox by partitions.
+
+    Each live worker owns an equal, contiguous range of partitions, given by its
+    position among live workers sorted by name - so ranges are rebalanced when
+    a worker joins, leaves or stops sending heartbeats.
+
+    Ownership only spreads the load. It is partition locks taken by
+    OutboxProcessor that keep two workers from publishing from the same
+    partition, so workers disagreeing during a rebalance is harmless.
+    """
+
+    HEARTBEAT_INTERVAL = timedelta(seconds=5)
+    # Has to be longer than OutboxProcessor.MAX_IDLE_WAIT, as idle workers
+    # send heartbeats only between waits
+    TTL = timedelta(seconds=90)
+
+    def __init__(self, session: Session, name: str) -> None:
+        self._session = session
+        self._name = name
+        self._partitions: list[int] = []
+        self._last_heartbeat: datetime | None = None
+
+    def partitions(self) -> list[int]:
+        """Partitions currently owned, refreshed every HEARTBEAT_INTERVAL."""
+        now = datetime.now(timezone.utc)
+        if (
+            self._last_heartbeat is None
+            or now - self._last_heartbeat >= self.HEARTBEAT_INTERVAL
+        ):
+            self._partitions = self._heartbeat(now)
+            self._last_heartbeat = now
+        return self._partitions
+
+    def leave(self) -> None:
+        self._session.rollback()
+        with self._session.begin():
+            self._session.execute(
+                delete(OutboxWorkerEntry).where(OutboxWorkerEntry.name == self._name)
+            )
+        self._last_heartbeat = None
+
+    def _heartbeat(self, now: datetime) -> list[int]:
+        self._session.rollback()
+        with self._session.begin():
+            self._session.execute(
+                pg_insert(OutboxWorkerEntry)
+                .values(name=self._name, heartbeat_at=now)
+                .on_conflict_do_update(
+                    index_elements=[OutboxWorkerEntry.name],
+                    set_={"heartbeat_at": now},
+                )
+            )
+            self._session.execute(
+                delete(OutboxWorkerEntry).where(
+                    OutboxWorkerEntry.heartbeat_at < now - self.TTL
+                )
+            )
+            live = list(
+                self._session.execute(
+                    select(OutboxWorkerEntry.name).order_by(OutboxWorkerEntry.name)
+                ).scalars()
+            )
+
+        return owned_partitions(live.index(self._name), len(live))
+
+
+def owned_partitions(index: int, workers: int) -> list[int]:
+    return [
+        partition
+        for partition in range(PARTITIONS)
+        if partition * workers // PARTITIONS == index
+    ]
 
 
 class OutboxProcessor:
     BATCH_SIZE = 100
+    # Failed entries are retried after 1s, 2s, 4s... (as long as retries last)
+    FIRST_RETRY_DELAY = timedelta(seconds=1)
+    MIN_IDLE_WAIT = 0.1
+    MAX_IDLE_WAIT = 30.0
+    # Upper bound of how long it takes to notice a shutdown request
+    STOP_CHECK_INTERVAL = 1.0
+    MIN_ERROR_DELAY = 1.0
+    MAX_ERROR_DELAY = 30.0
+    # Counting the backlog is not free, so it is not done for every batch
+    BACKLOG_SAMPLE_INTERVAL = 10.0
+    # Larger backlogs are estimated from table statistics instead
+    BACKLOG_COUNT_LIMIT = 10_000
 
-    def __init__(self, session: Session, publisher: Publisher) -> None:
+    def __init__(
+        self, session: Session, publisher: Publisher, metrics: Metrics
+    ) -> None:
         self._session = session
         self._publisher = publisher
+        self._metrics = metrics
+        self._backlog_sampled_at: float | None = None
+
+    def run_once(self, partitions: list[int] | None = None) -> int:
+        """Publishes a single batch, returns number of published entries.
 
-    def run_once(self) -> None:
+        Only partitions that are not being processed by anyone else at the
+        moment are taken (all of them, unless given). Their entries are
+        published in order of insertion, retried ones when their time comes.
+        When an entry with an ordering key fails, the following entries with
+        the same key are published again after it, so consumers may see
+        duplicates, but never the newer message as the last one.
+        """
         self._session.rollback()
+        self._sample_backlog()
+        started = time.perf_counter()
         with self._session.begin():
-            stmt = (
-                select(OutboxEntry)
-                .with_for_update(skip_locked=True)
+            locked = self._lock_partitions(
+                list(range(PARTITIONS)) if partitions is None else partitions
+            )
+            if not locked:
+                return 0
+
+            entries = self._session.execute(self._select_ready(locked)).all()
+            if not entries:
+                return 0
+
+            try:
+                failures = self._publisher.publish_batch(
+                    [Envelope(entry.queue, entry.data) for entry in entries]
+                )
+            except Exception as exc:
+                logging.exception(
+                    "Error while publishing OutboxEntries %s",
+                    [entry.id for entry in entries],
+                )
+                failures = [
+                    PublishFailure(index, repr(exc)) for index in range(len(entries))
+                ]
+
+            errors = {entries[failure.index].id: failure.reason for failure in failures}
+            failed_entries = [entries[failure.index] for failure in failures]
+            for entry in failed_entries:
+                logging.error(
+                    "OutboxEntry #%d was not published: %s", entry.id, errors[entry.id]
+                )
+            failed_ids = {entry.id for entry in failed_entries}
+            failed_keys = {
+                entry.ordering_key
+                for entry in failed_entries
+                if entry.ordering_key is not None
+            }
+            published = [
+                entry
+                for entry in entries
+                if entry.id not in failed_ids and entry.ordering_key not in failed_keys
+            ]
+            published_ids = [entry.id for entry in published]
+
+            if published_ids:
+                self._session.execute(
+                    delete(OutboxEntry).where(
+                        OutboxEntry.id == any_(_ints("ids", published_ids))
+                    )
+                )
+            dead = [entry for entry in failed_entries if entry.retries_left == 0]
+            for error in set(errors.values()):
+                self._retry_later(
+                    [
+                        entry.id
+                        for entry in failed_entries
+                        if entry.retries_left > 0 and errors[entry.id] == error
+                    ],
+                    error,
+                )
+                self._move_to_dead_letters(
+                    [entry.id for entry in dead if errors[entry.id] == error], error
+                )
+
+            self._session.commit()
+
+        self._record(published, failed_entries, dead, time.perf_counter() - started)
+        return len(published)
+
+    def _select_ready(self, partitions: list[int]) -> Select[Any]:
+        # Entries waiting for a retry hold back later ones with the same key,
+        # also once their time comes, until those before them are published
+        earlier = aliased(OutboxEntry)
+        waiting_earlier = exists().where(
+            earlier.ordering_key == OutboxEntry.ordering_key,
+            earlier.id < OutboxEntry.id,
+            earlier.next_attempt_at > OutboxEntry.next_attempt_at,
+        )
+        # In order of the ready index, so entries waiting for a retry are not
+        # even read. Of entries with the same key, earlier ones come first.
+        return (
+            select(
+                OutboxEntry.id,
+                OutboxEntry.queue,
+                OutboxEntry.data,
+                OutboxEntry.ordering_key,
+                OutboxEntry.retries_left,
+                OutboxEntry.when_created,
+            )
+            .filter(
+                OutboxEntry.partition == any_(_ints("partitions", partitions)),
+                OutboxEntry.retries_left >= 0,
+                OutboxEntry.next_attempt_at <= func.now(),
+                ~waiting_earlier,
+            )
+            .order_by(OutboxEntry.next_attempt_at, OutboxEntry.id)
+            .limit(self.BATCH_SIZE)
+        )
+
+    def _record(
+        self,
+        published: list[Row[Any]],
+        failed: list[Row[Any]],
+        dead: list[Row[Any]],
+        duration: float,
+    ) -> None:
+        self._metrics.observe("outbox_batch_duration_seconds", duration)
+        now = datetime.now(timezone.utc)
+        for entry in published:
+            self._metrics.increment("outbox_published_total", queue=entry.queue)
+            # Time it took since the entry was put till it was published
+            self._metrics.observe(
+                "outbox_publish_latency_seconds",
+                (now - entry.when_created).total_seconds(),
+                queue=entry.queue,
+            )
+        for entry in failed:
+            self._metrics.increment("outbox_failures_total", queue=entry.queue)
+        for entry in dead:
+            self._metrics.increment("outbox_dead_letters_total", queue=entry.queue)
+
+    def _sample_backlog(self) -> None:
+        now = time.monotonic()
+        if (
+            self._backlog_sampled_at is not None
+            and now - self._backlog_sampled_at < self.BACKLOG_SAMPLE_INTERVAL
+        ):
+            return
+
+        self._backlog_sampled_at = now
+        with self._session.begin():
+            pending = select(OutboxEntry.id).filter(OutboxEntry.retries_left >= 0)
+            backlog = self._session.execute(
+                select(func.count()).select_from(
+                    pending.limit(self.BACKLOG_COUNT_LIMIT).subquery()
+                )
+            ).scalar_one()
+            if backlog == self.BACKLOG_COUNT_LIMIT:
+                # Estimate as of the last (auto)analyze
+                estimate = self._session.execute(
+                    text(
+                        "SELECT reltuples FROM pg_class "
+                        "WHERE oid = 'outbox_entries'::regclass"
+                    )
+                ).scalar_one()
+                backlog = max(backlog, int(estimate))
+            # Entries get ids in order of putting
+            oldest = self._session.execute(
+                select(OutboxEntry.when_created)
                 .filter(OutboxEntry.retries_left >= 0)
-                .order_by(OutboxEntry.when_created)
-                .limit(self.BATCH_SIZE)
+                .order_by(OutboxEntry.id)
+                .limit(1)
+            ).scalar_one_or_none()
+        age = (datetime.now(timezone.utc) - oldest).total_seconds() if oldest else 0.0
+        self._metrics.set("outbox_backlog_entries", backlog)
+        self._metrics.set("outbox_oldest_entry_age_seconds", age)
+
+    def _retry_later(self, ids: list[int], error: str) -> None:
+        if not ids:
+            return
+
+        attempts = Outbox.RETRIES - OutboxEntry.retries_left
+        self._session.execute(
+            update(OutboxEntry)
+            .where(OutboxEntry.id == any_(_ints("ids", ids)))
+            .values(
+                retries_left=OutboxEntry.retries_left - 1,
+                next_attempt_at=func.now()
+                + literal(self.FIRST_RETRY_DELAY) * func.power(2, attempts),
+                last_error=error,
+            )
+        )
+
+    def _move_to_dead_letters(self, ids: list[int], error: str) -> None:
+        if not ids:
+            return
+
+        moved = (
+            delete(OutboxEntry)
+            .where(OutboxEntry.id == any_(_ints("ids", ids)))
+            .returning(
+                OutboxEntry.id,
+                OutboxEntry.queue,
+                OutboxEntry.data,
+                OutboxEntry.ordering_key,
+                OutboxEntry.when_created,
+            )
+            .cte("moved")
+        )
+        self._session.execute(
+            insert(OutboxDeadLetter).from_select(
+                [
+                    "id",
+                    "queue",
+                    "data",
+                    "ordering_key",
+                    "when_created",
+                    "when_failed",
+                    "last_error",
+                ],
+                select(
+                    moved.c.id,
+                    moved.c.queue,
+                    moved.c.data,
+                    moved.c.ordering_key,
+                    moved.c.when_created,
+                    func.now(),
+                    literal(error),
+                ),
             )
-            entries = self._session.execute(stmt).scalars().all()
-            for entry in entries:
+        )
+
+    def run_continuously(
+        self,
+        listener: OutboxListener,
+        stop_event: threading.Event,
+        worker: OutboxWorker | None = None,
+    ) -> None:
+        """Keeps publishing until stop_event is set.
+
+        Drains full batches back-to-back, otherwise sleeps until notified about
+        a new entry. Since notifications may be missed (e.g. when sent while
+        the listener reconnects), it also polls - less and less often while
+        idle.
+
+        Database errors are logged and retried after a delay doubling from
+        MIN_ERROR_DELAY up to MAX_ERROR_DELAY, so it outlives database restarts.
+
+        With worker given, only partitions owned by it are processed.
+        """
+        idle_wait = self.MIN_IDLE_WAIT
+        error_delay = self.MIN_ERROR_DELAY
+        try:
+            while not stop_event.is_set():
                 try:
-                    self._publisher.publish(entry.queue, message=entry.data)
-                except Exception:
-                    entry.retries_left -= 1
+                    partitions = worker.partitions() if worker is not None else None
+                    published = self.run_once(partitions)
+                except DBAPIError:
                     logging.exception(
-                        "Error while publishing OutboxEntry #%d", entry.id
+                        "Error while processing outbox, retrying in %.0fs", error_delay
                     )
+                    stop_event.wait(error_delay)
+                    error_delay = min(error_delay * 2, self.MAX_ERROR_DELAY)
+                    continue
+
+                error_delay = self.MIN_ERROR_DELAY
+                if published >= self.BATCH_SIZE:
+                    continue
+
+                if published:
+                    idle_wait = self.MIN_IDLE_WAIT
+
+                if self._wait_for_entries(listener, idle_wait, stop_event):
+                    idle_wait = self.MIN_IDLE_WAIT
                 else:
-                    self._session.delete(entry)
+                    idle_wait = min(idle_wait * 2, self.MAX_IDLE_WAIT)
+        finally:
+            if worker is not None:
+                try:
+                    worker.leave()
+                except DBAPIError:
+                    # Others take over its partitions once its heartbeat expires
+                    logging.exception("Error while leaving outbox workers")
+
+    def _lock_partitions(self, partitions: list[int]) -> list[int]:
+        # Transaction-level advisory locks, released on commit/rollback
+        stmt = text(
+            "SELECT partition FROM unnest(:partitions) AS partition "
+            "WHERE pg_try_advisory_xact_lock(:namespace, partition)"
+        ).bindparams(
+            _ints("partitions", partitions), namespace=_PARTITION_LOCK_NAMESPACE
+        )
+        return list(self._session.execute(stmt).scalars())
+
+    def _wait_for_entries(
+        self, listener: OutboxListener, timeout: float, stop_event: threading.Event
+    ) -> bool:
+        deadline = time.monotonic() + timeout
+        while not stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+
+            if listener.wait(min(remaining, self.STOP_CHECK_INTERVAL)):
+                return True
+        return False
+
+
+def _ints(name: str, values: list[int]) -> Any:
+    # Bound as a single array parameter, so the statement is the same for any
+    # number of values
+    return bindparam(name, values, type_=ARRAY(Integer))
 
-            self._session.commit()
+
+# First key of two-key advisory locks, to not collide with other lock users
+_PARTITION_LOCK_NAMESPACE = zlib.crc32(b"outbox_entries") % 2**31
 
 
 class OutboxEntry(Base):
@@ -65,3 +681,131 @@ class OutboxEntry(Base):
     data: Mapped[dict[str, Any]] = mapped_column(JSONB)
     retries_left: Mapped[int]
     when_created: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    partition: Mapped[int]
+    ordering_key: Mapped[str | None] = mapped_column(default=None)
+    last_error: Mapped[str | None] = mapped_column(default=None)
+
+    __table_args__ = (
+        # Entries out of retries are moved away, but the predicate keeps the
+        # index small if that ever lags behind
+        Index(
+            "ix_outbox_entries_ready",
+            "next_attempt_at",
+            "id",
+            "partition",
+            postgresql_where=text("retries_left >= 0"),
+        ),
+        Index(
+            "ix_outbox_entries_ordering_key",
+            "ordering_key",
+            "next_attempt_at",
+            "id",
+            postgresql_where=text("ordering_key IS NOT NULL"),
+        ),
+    )
+
+
+class OutboxDeadLetter(Base):
+    __tablename__ = "outbox_dead_letters"
+
+    # Same as of the original entry
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    queue: Mapped[str]
+    data: Mapped[dict[str, Any]] = mapped_column(JSONB)
+    ordering_key: Mapped[str | None]
+    when_created: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    when_failed: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    last_error: Mapped[str]
+
+
+class OutboxWorkerEntry(Base):
+    __tablename__ = "outbox_workers"
+
+    name: Mapped[str] = mapped_column(primary_key=True)
+    heartbeat_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+
+_NOTIFY_TRIGGER = f"""
+    CREATE OR REPLACE FUNCTION notify_outbox_entries() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{OutboxListener.NOTIFY_CHANNEL}', '');
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE TRIGGER outbox_entries_notify
+    AFTER INSERT ON outbox_entries
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_outbox_entries();
+"""
+
+event.listen(
+    OutboxEntry.__table__,
+    "after_create",
+    DDL(_NOTIFY_TRIGGER).execute_if(  # type: ignore[no-untyped-call]
+        dialect="postgresql"
+    ),
+)
+
+
+def migrate_outbox_tables(connection: Connection) -> int:
+    """Brings outbox tables created before dead letters and partitions up to date.
+
+    Adds the new columns, indexes, tables and the notification trigger.
+    Existing entries keep their order and get random partitions, like entries
+    without an ordering key. Those already out of retries are moved to dead
+    letters. Safe to run multiple times. Returns the number of entries moved.
+    """
+    connection.execute(
+        text(
+            "ALTER TABLE outbox_entries "
+            "ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP WITH TIME ZONE, "
+            "ADD COLUMN IF NOT EXISTS partition INTEGER, "
+            "ADD COLUMN IF NOT EXISTS ordering_key VARCHAR, "
+            "ADD COLUMN IF NOT EXISTS last_error VARCHAR"
+        )
+    )
+    connection.execute(
+        text(
+            "UPDATE outbox_entries SET next_attempt_at = when_created "
+            "WHERE next_attempt_at IS NULL"
+        )
+    )
+    connection.execute(
+        text(
+            "UPDATE outbox_entries SET partition = floor(random() * :partitions) "
+            "WHERE partition IS NULL"
+        ),
+        {"partitions": PARTITIONS},
+    )
+    connection.execute(
+        text(
+            "ALTER TABLE outbox_entries "
+            "ALTER COLUMN next_attempt_at SET NOT NULL, "
+            "ALTER COLUMN partition SET NOT NULL"
+        )
+    )
+    tables = Base.metadata.tables
+    for index in tables[OutboxEntry.__tablename__].indexes:
+        index.create(connection, checkfirst=True)
+    Base.metadata.create_all(
+        connection,
+        tables=[
+            tables[OutboxDeadLetter.__tablename__],
+            tables[OutboxWorkerEntry.__tablename__],
+        ],
+    )
+    connection.execute(text(_NOTIFY_TRIGGER))
+
+    moved = connection.execute(
+        text(
+            "WITH moved AS ("
+            "DELETE FROM outbox_entries WHERE retries_left < 0 "
+            "RETURNING id, queue, data, ordering_key, when_created, last_error) "
+            "INSERT INTO outbox_dead_letters "
+            "(id, queue, data, ordering_key, when_created, when_failed, last_error) "
+            "SELECT id, queue, data, ordering_key, when_created, now(), "
+            "coalesce(last_error, 'Ran out of retries') FROM moved"
+        )
+    )
+    return moved.rowcount
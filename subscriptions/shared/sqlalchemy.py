@@ -1,7 +1,9 @@
-from typing import Type, TypeAlias, cast
+from typing import Any, Callable, ClassVar, Type, TypeAlias, TypeVar, cast
 
 from pydantic import TypeAdapter
-from sqlalchemy import Dialect, types, JSON as ColumnJSON
+from sqlalchemy import ColumnElement, Dialect, Text, types, JSON as ColumnJSON
+from sqlalchemy import cast as sql_cast, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase, MappedAsDataclass
 
 
@@ -15,6 +17,10 @@ JSON: TypeAlias = dict[str, "JSON"] | list["JSON"] | str | int | float | bool |
 class AsJSON[T](types.TypeDecorator[T]):
     """Will serialize to JSON and back everything that TypeAdapter handles.
 
+    Values go straight between JSON text and Python objects with pydantic's
+    `dump_json`/`validate_json`, without intermediate dicts - the column is
+    read as text, so the driver does not parse it on its own.
+
     Usage: field: Mapped[Dataclass] = mapped_column(AsJSON[Dataclass])
     """
 
@@ -22,27 +28,65 @@ class AsJSON[T](types.TypeDecorator[T]):
     cache_ok = True
 
     _type_adapter: TypeAdapter[T]
+    _specialized: ClassVar[dict[tuple[type, Any], type]] = {}
 
     def __class_getitem__(cls, type_: Type[T]) -> "AsJSON[T]":
-        type_adapter = TypeAdapter(type_)
-        specialized_class = type(
-            f"JSONSerializable[{type_.__name__}]",
-            (cls,),
-            {"_type_adapter": type_adapter},
-        )
+        if isinstance(type_, TypeVar):
+            # Generic subclass definition, e.g. AsJSONB[T](AsJSON[T])
+            return cast("AsJSON[T]", super().__class_getitem__(type_))
+
+        try:
+            specialized_class = cls._specialized[cls, type_]
+        except KeyError:
+            specialized_class = type(
+                f"JSONSerializable[{type_.__name__}]",
+                (cls,),
+                {"_type_adapter": TypeAdapter(type_)},
+            )
+            cls._specialized[cls, type_] = specialized_class
         return cast("AsJSON[T]", specialized_class)
 
-    def process_bind_param(self, value: T | None, dialect: Dialect) -> JSON | None:
+    def process_bind_param(self, value: T | None, dialect: Dialect) -> str | None:
         if self._type_adapter is None:
             raise RuntimeError(f"Type adapter not set, use {type(self).__name__}[Type]")
 
         if value is None:
             return value
 
-        return cast(JSON, self._type_adapter.dump_python(value, mode="json"))
+        return self._type_adapter.dump_json(value).decode()
 
-    def process_result_value(self, value: JSON | None, dialect: Dialect) -> T | None:
-        if value is None:
-            return value
+    def process_result_value(self, value: str | None, dialect: Dialect) -> T | None:
+        # JSON null was written for None by earlier versions
+        if value is None or value == "null":
+            return None
+
+        return self._type_adapter.validate_json(value)
+
+    def bind_processor(self, dialect: Dialect) -> Callable[[T | None], str | None]:
+        # Value is already a JSON document, impl must not encode it once again
+        def process(value: T | None) -> str | None:
+            return self.process_bind_param(value, dialect)
+
+        return process
+
+    def result_processor(
+        self, dialect: Dialect, coltype: object
+    ) -> Callable[[str | None], T | None]:
+        # Column is read as text (see column_expression), impl must not decode it
+        def process(value: str | None) -> T | None:
+            return self.process_result_value(value, dialect)
 
-        return self._type_adapter.validate_python(value)
+        return process
+
+    def column_expression(self, colexpr: ColumnElement[Any]) -> ColumnElement[T]:
+        return type_coerce(sql_cast(colexpr, Text), self)
+
+
+class AsJSONB[T](AsJSON[T]):
+    """AsJSON stored in PostgreSQL JSONB column, that can be indexed and queried.
+
+    Usage: field: Mapped[Dataclass] = mapped_column(AsJSONB[Dataclass])
+    """
+
+    impl = JSONB
+    cache_ok = True
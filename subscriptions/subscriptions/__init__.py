@@ -4,10 +4,22 @@ from subscriptions.subscriptions._app._role_objects import (
     SubscriptionsAdmin,
 )
 from subscriptions.subscriptions._workflows import _activities as activities
+from subscriptions.subscriptions._app._facade import SubscriptionsFacade
+from subscriptions.subscriptions._app._renewal_progress import RenewalProgress
+from subscriptions.subscriptions._app._charging import ConcurrentCharger
+from subscriptions.subscriptions._app._fair_share import FairShare
+from subscriptions.subscriptions._domain._renewal_calculation import LoadLeveling
+from subscriptions.subscriptions._domain._subscription_id import SubscriptionId
 
 __all__ = [
     "subscriptions_router",
     "SubscriptionsAdmin",
     "SubscriptionsViewer",
     "activities",
+    "SubscriptionsFacade",
+    "RenewalProgress",
+    "ConcurrentCharger",
+    "FairShare",
+    "LoadLeveling",
+    "SubscriptionId",
 ]
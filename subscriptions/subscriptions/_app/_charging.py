@@ -0,0 +1,151 @@
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from collections.abc import Callable, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import AbstractContextManager
+from dataclasses import dataclass
+
+from subscriptions.payments import PaymentsFacade
+from subscriptions.shared.account_id import AccountId
+from subscriptions.shared.money import Money
+from subscriptions.shared.tenant_id import TenantId
+
+
+@dataclass(frozen=True)
+class Charge:
+    tenant_id: TenantId
+    account_id: AccountId
+    amount: Money
+
+
+class ChargeStats:
+    """Throughput and latency of charges, in constant memory.
+
+    Percentiles are exact for up to SAMPLE_SIZE charges, estimated from a
+    uniform sample of them above that.
+    """
+
+    SAMPLE_SIZE = 10_000
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.count = 0
+        # Wall time spent charging, concurrent charges overlap in it
+        self.seconds = 0.0
+        self._sample: list[float] = []
+
+    @property
+    def per_second(self) -> float:
+        return self.count / self.seconds if self.seconds else 0.0
+
+    def percentile(self, percent: float) -> float:
+        with self._lock:
+            ordered = sorted(self._sample)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self.count += 1
+            if len(self._sample) < self.SAMPLE_SIZE:
+                self._sample.append(latency)
+            else:
+                # Reservoir sampling - each charge stays with equal probability
+                index = random.randrange(self.count)
+                if index < self.SAMPLE_SIZE:
+                    self._sample[index] = latency
+
+
+class Charger:
+    """Charges one at a time, with the given facade."""
+
+    def __init__(self, payments_facade: PaymentsFacade) -> None:
+        self._payments_facade = payments_facade
+        self.stats = ChargeStats()
+
+    def charge_all(self, charges: Sequence[Charge]) -> list[bool | Exception]:
+        """Results in order of charges - whether charged, or error raised."""
+        started = time.perf_counter()
+        results = [self._charge(self._payments_facade, charge) for charge in charges]
+        self.stats.seconds += time.perf_counter() - started
+        return results
+
+    def _charge(
+        self, payments_facade: PaymentsFacade, charge: Charge
+    ) -> bool | Exception:
+        started = time.perf_counter()
+        try:
+            return payments_facade.charge(charge.account_id, charge.amount)
+        except Exception as e:
+            return e
+        finally:
+            self.stats.record(time.perf_counter() - started)
+
+
+class ConcurrentCharger(Charger):
+    """Charges up to max_concurrency at once, at most max_per_tenant per tenant.
+
+    Charges wait mostly for the payment provider, so they are run by a pool of
+    threads. Each charge gets a facade from payments_facades in its thread, as
+    sessions must not be shared between threads. Charges over the limit of
+    their tenant wait in the calling thread, so they do not occupy workers
+    that other tenants' charges could use - tenants take turns for workers.
+    """
+
+    def __init__(
+        self,
+        payments_facades: Callable[[], AbstractContextManager[PaymentsFacade]],
+        max_concurrency: int = 8,
+        max_per_tenant: int = 2,
+    ) -> None:
+        self._payments_facades = payments_facades
+        self._max_concurrency = max_concurrency
+        self._max_per_tenant = max_per_tenant
+        self.stats = ChargeStats()
+
+    def charge_all(self, charges: Sequence[Charge]) -> list[bool | Exception]:
+        started = time.perf_counter()
+        results: list[bool | Exception] = [False] * len(charges)
+        waiting: dict[TenantId, deque[int]] = defaultdict(deque)
+        for index, charge in enumerate(charges):
+            waiting[charge.tenant_id].append(index)
+        running: dict[TenantId, int] = defaultdict(int)
+        in_flight: dict[Future[bool | Exception], int] = {}
+
+        with ThreadPoolExecutor(self._max_concurrency) as executor:
+            while waiting or in_flight:
+                submitted = True
+                while submitted and len(in_flight) < self._max_concurrency:
+                    submitted = False
+                    for tenant_id in list(waiting):
+                        if len(in_flight) >= self._max_concurrency:
+                            break
+                        if running[tenant_id] >= self._max_per_tenant:
+                            continue
+
+                        index = waiting[tenant_id].popleft()
+                        if not waiting[tenant_id]:
+                            del waiting[tenant_id]
+                        running[tenant_id] += 1
+                        future = executor.submit(self._charge_in_thread, charges[index])
+                        in_flight[future] = index
+                        submitted = True
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = in_flight.pop(future)
+                    running[charges[index].tenant_id] -= 1
+                    results[index] = future.result()
+
+        self.stats.seconds += time.perf_counter() - started
+        return results
+
+    def _charge_in_thread(self, charge: Charge) -> bool | Exception:
+        try:
+            with self._payments_facades() as payments_facade:
+                return self._charge(payments_facade, charge)
+        except Exception as e:
+            return e
@@ -1,33 +1,57 @@
+import logging
+import os
+import socket
+from collections import defaultdict
+from collections.abc import Callable, Sequence
+from dataclasses import replace
+from datetime import datetime, timedelta
+
 from sqlalchemy.orm import Session
 
 from subscriptions.auth import requires_role, Subject
-from subscriptions.payments import PaymentsFacade
-from subscriptions.plans import PlansFacade, PlanId, RequestedAddOn
+from subscriptions.main import LevelingWindow
+from subscriptions.payments import MissingPaymentMethod, PaymentsFacade
+from subscriptions.plans import CostRequest, PlansFacade, PlanId, RequestedAddOn
 from subscriptions.shared.account_id import AccountId
 from subscriptions.shared.tenant_id import TenantId
 from subscriptions.shared.term import Term
+from subscriptions.subscriptions._app._charging import Charge, Charger
+from subscriptions.subscriptions._app._fair_share import FairShare
+from subscriptions.subscriptions._app._renewal_progress import RenewalProgress
 from subscriptions.subscriptions._app._repository import SubscriptionsRepository
 from subscriptions.subscriptions._app._role_objects import (
     SubscriptionsViewer,
     SubscriptionsAdmin,
 )
 from subscriptions.subscriptions._app._subscription_dto import SubscriptionDto
+from subscriptions.subscriptions._domain._renewal_calculation import (
+    LoadLeveling,
+    hourly_histogram,
+)
+from subscriptions.subscriptions._domain._subscription import Subscription
 from subscriptions.subscriptions._domain._subscription_factory import build_new
 from subscriptions.subscriptions._domain._subscription_id import SubscriptionId
 
 
 class SubscriptionsFacade:
+    RENEWAL_CHUNK_SIZE = 500
+    RENEWAL_LEASE = timedelta(minutes=15)
+    # Charges made on one extension of the lease - minutes at seconds a charge
+    RENEWAL_LEASE_BATCH = 50
+
     def __init__(
         self,
         session: Session,
         repository: SubscriptionsRepository,
         payments_facade: PaymentsFacade,
         plans_facade: PlansFacade,
+        leveling_window: LevelingWindow,
     ) -> None:
         self._session = session
         self._repository = repository
         self._payments_facade = payments_facade
         self._plans_facade = plans_facade
+        self._leveling = LoadLeveling(leveling_window)
 
     @requires_role(SubscriptionsViewer)
     def subscriptions(
@@ -54,6 +78,9 @@ class SubscriptionsFacade:
 
         subscription = build_new(account_id, subject.tenant_id, plan_id, term, add_ons)
         self._repository.add(subscription)
+        # Renewals are leveled by id, which the database gives
+        self._session.flush()
+        subscription.level_renewal(self._leveling)
         self._session.commit()
         return SubscriptionDto.model_validate(subscription)
 
@@ -84,25 +111,30 @@ class SubscriptionsFacade:
         if subscription.plan_id == new_plan_id:
             raise Exception("Cannot change to the same plan!")
 
-        old_plan_cost = self._plans_facade.calculate_cost(
-            subject.tenant_id,
-            PlanId(subscription.plan_id),
-            subscription.term,
-            subscription.requested_add_ons,
-        )
-        new_plan_cost = self._plans_facade.calculate_cost(
+        old_plan_cost, new_plan_cost = self._plans_facade.calculate_costs(
             subject.tenant_id,
-            new_plan_id,
-            subscription.term,
-            subscription.requested_add_ons,
+            [
+                CostRequest(
+                    PlanId(subscription.plan_id),
+                    subscription.term,
+                    subscription.requested_add_ons,
+                ),
+                CostRequest(
+                    new_plan_id, subscription.term, subscription.requested_add_ons
+                ),
+            ],
         )
+        if isinstance(old_plan_cost, Exception):
+            raise old_plan_cost
+        if isinstance(new_plan_cost, Exception):
+            raise new_plan_cost
         if new_plan_cost > old_plan_cost:
             # upgrade
             charged = self._payments_facade.charge(account_id, new_plan_cost)
             if not charged:
                 raise Exception("Failed to charge!")
 
-            subscription.upgrade(new_plan_id)
+            subscription.upgrade(new_plan_id, self._leveling)
         else:
             # downgrade
             subscription.downgrade(new_plan_id)
@@ -110,23 +142,211 @@ class SubscriptionsFacade:
         self._session.commit()
         return SubscriptionDto.model_validate(subscription)
 
-    def renew_subscriptions(self) -> None:
-        subscriptions = self._repository.get_all_pending_renewal()
+    def renew_subscriptions(
+        self,
+        chunk_size: int = RENEWAL_CHUNK_SIZE,
+        on_progress: Callable[[RenewalProgress], None] | None = None,
+        worker_name: str = "",
+        charger: Charger | None = None,
+        fair_share: FairShare | None = None,
+    ) -> RenewalProgress:
+        """Renews due subscriptions, committing each chunk before the next one.
+
+        So a crash loses at most one chunk of state changes after successful
+        charges, and memory does not grow with the number of due subscriptions.
+
+        Chunks are claimed for RENEWAL_LEASE, so many workers can renew at once
+        without charging a subscription twice. Leases are extended before every
+        RENEWAL_LEASE_BATCH charges, skipping subscriptions that another worker
+        claimed in the meantime, so slow charges do not let a chunk be renewed
+        twice. Subscriptions that could not be priced stay claimed until
+        the lease expires, so are not retried in a loop. Those whose charge
+        raised, so may have been charged, need reconciliation before they are
+        renewed again; without a payment method, renewal fails.
+
+        Each chunk is split between tenants by fair_share, equally unless
+        given, so a tenant with many due subscriptions does not delay others.
+        Due subscriptions are counted once, then only again when all of
+        those are claimed, so counting does not grow with every chunk.
+
+        Charges are made one by one, unless a ConcurrentCharger is given.
+        """
+        worker_name = worker_name or f"{socket.gethostname()}-{os.getpid()}"
+        charger = charger or Charger(self._payments_facade)
+        fair_share = fair_share or FairShare()
+        progress = RenewalProgress()
+        depths: dict[TenantId, int] = {}
+        while True:
+            if not depths:
+                depths = self._repository.count_pending_renewal()
+            progress = replace(progress, queue_depths=dict(depths))
+            claimed: list[SubscriptionId] = []
+            for tenant_id, quota in fair_share.quotas(depths, chunk_size).items():
+                tenant_claimed = self._repository.claim_pending_renewal(
+                    worker_name, quota, self.RENEWAL_LEASE, tenant_id
+                )
+                claimed += tenant_claimed
+                if len(tenant_claimed) < quota:
+                    # Others claimed the rest in the meantime
+                    del depths[tenant_id]
+                else:
+                    depths[tenant_id] -= quota
+            depths = {tenant_id: depth for tenant_id, depth in depths.items() if depth}
+            # Other workers must see the claims before anything is charged
+            self._session.commit()
+            if not claimed:
+                return progress
+
+            chunk = self._repository.get_many(claimed)
+            progress = self._renew(chunk, charger, progress, worker_name)
+            self._session.commit()
+            for subscription in chunk:
+                self._session.expunge(subscription)
+
+            progress = replace(
+                progress,
+                chunks=progress.chunks + 1,
+                charges_per_second=charger.stats.per_second,
+                p50_charge_seconds=charger.stats.percentile(50),
+                p99_charge_seconds=charger.stats.percentile(99),
+            )
+            if on_progress is not None:
+                on_progress(progress)
+
+    def subscriptions_to_reconcile(self, limit: int = 100) -> list[SubscriptionDto]:
+        """Subscriptions whose renewal charge raised, longest waiting first."""
+        subscriptions = self._repository.get_needing_reconciliation(limit)
+        return [SubscriptionDto.model_validate(sub) for sub in subscriptions]
+
+    def reconcile(
+        self, subscription_id: SubscriptionId, charged: bool
+    ) -> SubscriptionDto:
+        """Resolves a renewal whose charge raised, once payments show the result.
+
+        Charged, the subscription is renewed; not, it is due again.
+        """
+        subscription = self._repository.get_by_id(subscription_id)
+        subscription.reconciled(charged, self._leveling)
+        self._session.commit()
+        return SubscriptionDto.model_validate(subscription)
+
+    def renewal_histogram(
+        self, start: datetime, end: datetime, leveling: LoadLeveling | None = None
+    ) -> dict[datetime, int]:
+        """Renewals due in each hour from start until end, as now scheduled.
+
+        With leveling given, as they would be scheduled with it instead.
+        """
+        if leveling is None:
+            histogram = hourly_histogram([], start, end)
+            counts = self._repository.count_renewals_by_hour(start, end)
+            for hour, count in counts.items():
+                if hour in histogram:
+                    histogram[hour] = count
+            return histogram
+
+        schedule = self._repository.get_renewal_schedule(start, end)
+        return hourly_histogram(
+            (
+                leveling.level(renewal_at, subscription_id)
+                for subscription_id, renewal_at in schedule
+            ),
+            start,
+            end,
+        )
+
+    def _renew(
+        self,
+        subscriptions: Sequence[Subscription],
+        charger: Charger,
+        progress: RenewalProgress,
+        worker_name: str,
+    ) -> RenewalProgress:
+        renewed, failed, skipped = progress.renewed, progress.failed, progress.skipped
+        uncertain = progress.uncertain
+        by_tenant: dict[TenantId, list[Subscription]] = defaultdict(list)
         for subscription in subscriptions:
-            renewal = subscription.get_renewal()
+            by_tenant[TenantId(subscription.tenant_id)].append(subscription)
 
-            cost = self._plans_facade.calculate_cost(
-                TenantId(subscription.tenant_id),
-                renewal.plan_id,
-                renewal.term,
-                renewal.requested_add_ons,
+        priced: list[Subscription] = []
+        charges: list[Charge] = []
+        for tenant_id, tenant_subscriptions in by_tenant.items():
+            renewals = [sub.get_renewal() for sub in tenant_subscriptions]
+            costs = self._plans_facade.calculate_costs(
+                tenant_id,
+                [
+                    CostRequest(
+                        renewal.plan_id, renewal.term, renewal.requested_add_ons
+                    )
+                    for renewal in renewals
+                ],
             )
-            charged = self._payments_facade.charge(
-                AccountId(subscription.account_id), cost
+            for subscription, cost in zip(tenant_subscriptions, costs):
+                if isinstance(cost, Exception):
+                    # Left pending, so it is renewed once its plan is fixed
+                    logging.error(
+                        "Could not price renewal of subscription %d: %r",
+                        subscription.id,
+                        cost,
+                    )
+                    skipped += 1
+                    continue
+
+                priced.append(subscription)
+                charges.append(
+                    Charge(tenant_id, AccountId(subscription.account_id), cost)
+                )
+
+        for start in range(0, len(priced), self.RENEWAL_LEASE_BATCH):
+            batch = priced[start : start + self.RENEWAL_LEASE_BATCH]
+            held = set(
+                self._repository.extend_claims(
+                    worker_name,
+                    [SubscriptionId(sub.id) for sub in batch],
+                    self.RENEWAL_LEASE,
+                )
             )
-            if charged:
-                subscription.renewal_successful()
-            else:
-                subscription.renewal_failed()
+            # Other workers must see the extended leases before anything is
+            # charged, this also saves renewals of the previous batch
+            self._session.commit()
+            batch_charges = []
+            for subscription, charge in zip(
+                batch, charges[start : start + self.RENEWAL_LEASE_BATCH]
+            ):
+                if subscription.id in held:
+                    batch_charges.append((subscription, charge))
+                else:
+                    logging.warning(
+                        "Lease of subscription %d was lost, left to its new worker",
+                        subscription.id,
+                    )
 
-        self._session.commit()
+            results = charger.charge_all([charge for _, charge in batch_charges])
+            for (subscription, _), charged in zip(batch_charges, results):
+                if isinstance(charged, MissingPaymentMethod):
+                    subscription.renewal_failed()
+                    failed += 1
+                elif isinstance(charged, Exception):
+                    # Not known whether money was taken, so it must not be
+                    # charged again until someone checks
+                    logging.error(
+                        "Could not charge renewal of subscription %d: %r",
+                        subscription.id,
+                        charged,
+                    )
+                    subscription.renewal_uncertain()
+                    uncertain += 1
+                elif charged:
+                    subscription.renewal_successful(self._leveling)
+                    renewed += 1
+                else:
+                    subscription.renewal_failed()
+                    failed += 1
+
+        return replace(
+            progress,
+            renewed=renewed,
+            failed=failed,
+            skipped=skipped,
+            uncertain=uncertain,
+        )
@@ -0,0 +1,66 @@
+from collections.abc import Mapping
+
+from subscriptions.shared.tenant_id import TenantId
+
+
+class FairShare:
+    """Splits each renewal chunk between tenants with due subscriptions.
+
+    Tenants get slots in proportion to their weight (default_weight unless
+    given), at most their cap per chunk, and no more than they have due. Slots
+    a tenant cannot use go to the others. So a tenant with a huge backlog
+    does not hold back renewals of the rest, which finish in the first chunks.
+
+    Each chunk starts with the tenant after the last one served in the
+    previous chunk, so with more tenants than slots all of them take turns.
+    """
+
+    def __init__(
+        self,
+        weights: Mapping[TenantId, int] | None = None,
+        caps: Mapping[TenantId, int] | None = None,
+        default_weight: int = 1,
+    ) -> None:
+        if min([default_weight, *(weights or {}).values()]) < 1:
+            raise ValueError("Weights must be positive")
+        self._weights = dict(weights or {})
+        self._caps = dict(caps or {})
+        self._default_weight = default_weight
+        # Tenants from this one on go first in the next chunk
+        self._next_first: TenantId | None = None
+
+    def quotas(self, depths: Mapping[TenantId, int], slots: int) -> dict[TenantId, int]:
+        """How many due subscriptions of each tenant to claim, in slots total."""
+        tenants = sorted(depths)
+        if self._next_first is not None:
+            first = sum(tenant_id < self._next_first for tenant_id in tenants)
+            tenants = tenants[first:] + tenants[:first]
+
+        wanted = {}
+        for tenant_id in tenants:
+            depth = depths[tenant_id]
+            cap = self._caps.get(tenant_id)
+            wanted[tenant_id] = depth if cap is None else min(depth, cap)
+        wanted = {tenant_id: count for tenant_id, count in wanted.items() if count > 0}
+
+        quotas = dict.fromkeys(wanted, 0)
+        while slots > 0 and wanted:
+            total_weight = sum(self._weight(tenant_id) for tenant_id in wanted)
+            round_slots = slots
+            for tenant_id in list(wanted):
+                # Everyone gets at least one slot per round, so rounds end
+                share = round_slots * self._weight(tenant_id) // total_weight
+                given = min(wanted[tenant_id], max(share, 1), slots)
+                quotas[tenant_id] += given
+                wanted[tenant_id] -= given
+                slots -= given
+                self._next_first = TenantId(tenant_id + 1)
+                if not wanted[tenant_id]:
+                    del wanted[tenant_id]
+                if not slots:
+                    break
+
+        return {tenant_id: quota for tenant_id, quota in quotas.items() if quota}
+
+    def _weight(self, tenant_id: TenantId) -> int:
+        return self._weights.get(tenant_id, self._default_weight)
@@ -1,10 +1,12 @@
 from sqlalchemy.orm import Session
 
+from subscriptions.main import LevelingWindow
 from subscriptions.payments import PaymentsFacade
 from subscriptions.plans import PlansFacade
 from subscriptions.shared.account_id import AccountId
 from subscriptions.shared.tenant_id import TenantId
 from subscriptions.subscriptions._app._repository import SubscriptionsRepository
+from subscriptions.subscriptions._domain._renewal_calculation import LoadLeveling
 from subscriptions.subscriptions._domain._subscription_id import SubscriptionId
 
 
@@ -15,11 +17,13 @@ class RenewalService:
         payments_facade: PaymentsFacade,
         repository: SubscriptionsRepository,
         session: Session,
+        leveling_window: LevelingWindow,
     ) -> None:
         self._plans_facade = plans_facade
         self._payments_facade = payments_facade
         self._repository = repository
         self._session = session
+        self._leveling = LoadLeveling(leveling_window)
 
     def calculate_cost_and_charge(self, subscription_id: SubscriptionId) -> bool:
         subscription = self._repository.get_by_id(subscription_id)
@@ -38,7 +42,7 @@ class RenewalService:
 
     def renew_successful(self, subscription_id: SubscriptionId) -> None:
         subscription = self._repository.get_by_id(subscription_id)
-        subscription.renewal_successful()
+        subscription.renewal_successful(self._leveling)
         self._session.commit()
 
     def renew_failed(self, subscription_id: SubscriptionId) -> None:
@@ -0,0 +1,26 @@
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+
+from subscriptions.shared.tenant_id import TenantId
+
+
+@dataclass(frozen=True)
+class RenewalProgress:
+    """Totals of a renewal run so far."""
+
+    renewed: int = 0
+    failed: int = 0
+    # Could not be priced, left due
+    skipped: int = 0
+    # Charge raised, left for reconciliation
+    uncertain: int = 0
+    chunks: int = 0
+    charges_per_second: float = 0.0
+    p50_charge_seconds: float = 0.0
+    p99_charge_seconds: float = 0.0
+    # Due subscriptions of each tenant, before the last chunk was claimed
+    queue_depths: Mapping[TenantId, int] = field(default_factory=dict)
+
+    @property
+    def processed(self) -> int:
+        return self.renewed + self.failed + self.skipped + self.uncertain
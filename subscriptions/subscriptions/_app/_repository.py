@@ -1,7 +1,8 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from collections.abc import Iterator
 from typing import Sequence
 
-from sqlalchemy import select
+from sqlalchemy import ColumnElement, func, or_, select, update
 from sqlalchemy.orm import Session
 
 from subscriptions.shared.account_id import AccountId
@@ -11,6 +12,8 @@ from subscriptions.subscriptions._domain._subscription_id import SubscriptionId
 
 
 class SubscriptionsRepository:
+    SCHEDULE_BATCH_SIZE = 10_000
+
     def __init__(self, session: Session) -> None:
         self._session = session
 
@@ -23,13 +26,129 @@ class SubscriptionsRepository:
         )
         return self._session.execute(stmt).scalars().all()
 
-    def get_all_pending_renewal(self) -> Sequence[Subscription]:
+    def count_pending_renewal(self) -> dict[TenantId, int]:
+        """Number of due subscriptions of each tenant, which can be claimed."""
+        stmt = (
+            select(Subscription.tenant_id, func.count())
+            .filter(*self._claimable(datetime.now(timezone.utc)))
+            .group_by(Subscription.tenant_id)
+        )
+        return {
+            TenantId(tenant_id): count
+            for tenant_id, count in self._session.execute(stmt).tuples()
+        }
+
+    def claim_pending_renewal(
+        self,
+        worker_name: str,
+        limit: int,
+        lease: timedelta,
+        tenant_id: TenantId | None = None,
+    ) -> Sequence[SubscriptionId]:
+        """Claims up to limit due subscriptions (of the tenant), longest due first.
+
+        Due subscriptions claimed by other workers are skipped until their
+        lease expires, as are rows locked by workers claiming at the same
+        time - so many workers split due subscriptions without waiting for
+        each other. Leases of workers that died expire and are claimed again.
+        """
         now = datetime.now(timezone.utc)
-        stmt = select(Subscription).filter(
+        claimable = (
+            select(Subscription.id)
+            .filter(*self._claimable(now))
+            .order_by(Subscription.next_renewal_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        if tenant_id is not None:
+            claimable = claimable.filter(Subscription.tenant_id == tenant_id)
+        stmt = (
+            update(Subscription)
+            .where(Subscription.id.in_(claimable.scalar_subquery()))
+            .values(claimed_by=worker_name, claim_expires_at=now + lease)
+            .returning(Subscription.id)
+        )
+        return [SubscriptionId(id_) for id_ in self._session.scalars(stmt)]
+
+    def extend_claims(
+        self,
+        worker_name: str,
+        subscription_ids: Sequence[SubscriptionId],
+        lease: timedelta,
+    ) -> Sequence[SubscriptionId]:
+        """Extends leases of the subscriptions that the worker still holds.
+
+        Returns their ids. Those claimed by another worker since the lease
+        expired are left out, as only that worker may renew them now.
+        """
+        now = datetime.now(timezone.utc)
+        stmt = (
+            update(Subscription)
+            .where(
+                Subscription.id.in_(subscription_ids),
+                Subscription.claimed_by == worker_name,
+            )
+            .values(claim_expires_at=now + lease)
+            .returning(Subscription.id)
+        )
+        return [SubscriptionId(id_) for id_ in self._session.scalars(stmt)]
+
+    def get_needing_reconciliation(self, limit: int) -> Sequence[Subscription]:
+        """Subscriptions whose renewal charge raised, longest waiting first."""
+        stmt = (
+            select(Subscription)
+            .filter(Subscription.status == "needs_reconciliation")
+            .order_by(Subscription.next_renewal_at, Subscription.id)
+            .limit(limit)
+        )
+        return self._session.execute(stmt).scalars().all()
+
+    @staticmethod
+    def _claimable(now: datetime) -> list[ColumnElement[bool]]:
+        return [
             Subscription.next_renewal_at <= now,
             Subscription.status == "active",
+            or_(
+                Subscription.claim_expires_at.is_(None),
+                Subscription.claim_expires_at <= now,
+            ),
+        ]
+
+    def count_renewals_by_hour(
+        self, start: datetime, end: datetime
+    ) -> dict[datetime, int]:
+        """Number of next renewals of active subscriptions in each hour (UTC)."""
+        hour = func.date_trunc("hour", Subscription.next_renewal_at, "UTC")
+        stmt = (
+            select(hour, func.count())
+            .filter(*self._renewing_between(start, end))
+            .group_by(hour)
         )
-        return self._session.execute(stmt).scalars().all()
+        return {hour: count for hour, count in self._session.execute(stmt).tuples()}
+
+    def get_renewal_schedule(
+        self, start: datetime, end: datetime
+    ) -> Iterator[tuple[SubscriptionId, datetime]]:
+        """Ids and next renewals of active subscriptions, from start until end.
+
+        Read in batches of SCHEDULE_BATCH_SIZE, rather than all at once.
+        """
+        stmt = (
+            select(Subscription.id, Subscription.next_renewal_at)
+            .filter(*self._renewing_between(start, end))
+            .execution_options(yield_per=self.SCHEDULE_BATCH_SIZE)
+        )
+        for id_, renewal_at in self._session.execute(stmt).tuples():
+            if renewal_at is not None:
+                yield SubscriptionId(id_), renewal_at
+
+    @staticmethod
+    def _renewing_between(start: datetime, end: datetime) -> list[ColumnElement[bool]]:
+        return [
+            Subscription.status == "active",
+            Subscription.next_renewal_at >= start,
+            Subscription.next_renewal_at < end,
+        ]
 
     def add(self, subscription: Subscription) -> None:
         self._session.add(subscription)
@@ -47,6 +166,16 @@ class SubscriptionsRepository:
         )
         return self._session.execute(stmt).scalars().one()
 
+    def get_many(
+        self, subscription_ids: Sequence[SubscriptionId]
+    ) -> Sequence[Subscription]:
+        stmt = (
+            select(Subscription)
+            .filter(Subscription.id.in_(subscription_ids))
+            .order_by(Subscription.id)
+        )
+        return self._session.execute(stmt).scalars().all()
+
     def get_by_id(self, subscription_id: SubscriptionId) -> Subscription:
         stmt = select(Subscription).filter(Subscription.id == subscription_id)
         return self._session.execute(stmt).scalars().one()
@@ -1,12 +1,52 @@
-from datetime import datetime
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 from typing import assert_never
 
 from dateutil.relativedelta import relativedelta
 
 from subscriptions.shared.term import Term
 
+# 2**64 / golden ratio - consecutive keys land far apart, evenly over time
+_FIBONACCI_MULTIPLIER = 11400714819323198485
 
-def calculate_next_renewal(now: datetime, term: Term) -> datetime:
+
+@dataclass(frozen=True)
+class LoadLeveling:
+    """Spreads renewals due on a day over its first window hours (UTC).
+
+    Subscriptions made at once, e.g. imported, would otherwise all be renewed
+    in the same second. Every subscription gets its own time of day, derived
+    from its id, so it renews at the same time every term. The date stays.
+    Zero window, the default, leaves renewals at the time they were made.
+    """
+
+    window: timedelta = timedelta(0)
+
+    def __post_init__(self) -> None:
+        if not timedelta(0) <= self.window <= timedelta(days=1):
+            raise ValueError("Window must be between zero and a day")
+
+    def level(self, renewal_at: datetime, key: int) -> datetime:
+        if not self.window:
+            return renewal_at
+
+        window_seconds = int(self.window.total_seconds())
+        spread = (key * _FIBONACCI_MULTIPLIER) % 2**64
+        offset = timedelta(seconds=spread * window_seconds >> 64)
+        day = renewal_at.replace(hour=0, minute=0, second=0, microsecond=0)
+        return day + offset
+
+
+def calculate_next_renewal(
+    now: datetime, term: Term, billing_anchor: datetime | None = None
+) -> datetime:
+    """A term from now, or the first billing date after today.
+
+    Billing dates are whole terms from billing_anchor, so they do not drift
+    with the time renewals are made at, nor stay clamped to the end of a short
+    month - anchored on 31st, they are on 28th of February, then 31st of March.
+    """
     if term == Term.MONTHLY:
         delta = relativedelta(months=1)
     elif term == Term.YEARLY:
@@ -14,4 +54,30 @@ def calculate_next_renewal(now: datetime, term: Term) -> datetime:
     else:
         assert_never(term)
 
-    return now + delta
+    if billing_anchor is None:
+        return now + delta
+
+    # Never past the answer, and at most a term before it
+    months = (now.year - billing_anchor.year) * 12 + now.month - billing_anchor.month
+    terms = max(1, months // (delta.years * 12 + delta.months))
+    while (billing_anchor + delta * terms).date() <= now.date():
+        terms += 1
+    return billing_anchor + delta * terms
+
+
+def hourly_histogram(
+    renewals: Iterable[datetime], start: datetime, end: datetime
+) -> dict[datetime, int]:
+    """Number of renewals in each hour from start until end, including empty."""
+    start = start.replace(minute=0, second=0, microsecond=0)
+    histogram = {}
+    hour = start
+    while hour < end:
+        histogram[hour] = 0
+        hour += timedelta(hours=1)
+
+    for renewal_at in renewals:
+        hour = renewal_at.replace(minute=0, second=0, microsecond=0)
+        if hour in histogram:
+            histogram[hour] += 1
+    return histogram
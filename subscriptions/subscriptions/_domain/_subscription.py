@@ -1,13 +1,14 @@
 from dataclasses import dataclass
 from datetime import datetime, timezone
 
-from sqlalchemy import DateTime
+from sqlalchemy import DateTime, Index, text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from subscriptions.plans import RequestedAddOn, PlanId
 from subscriptions.shared.sqlalchemy import Base, AsJSON
 from subscriptions.shared.term import Term
 from subscriptions.subscriptions._domain._renewal_calculation import (
+    LoadLeveling,
     calculate_next_renewal,
 )
 
@@ -26,6 +27,16 @@ class Renewal:
 
 class Subscription(Base):
     __tablename__ = "subscriptions"
+    __table_args__ = (
+        # Finding due subscriptions, most of which are not active any more,
+        # of each tenant in turn
+        Index(
+            "ix_subscriptions_due",
+            "tenant_id",
+            "next_renewal_at",
+            postgresql_where=text("status = 'active'"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     account_id: Mapped[int]
@@ -42,6 +53,11 @@ class Subscription(Base):
     requested_add_ons: Mapped[list[RequestedAddOn]] = mapped_column(
         AsJSON[list[RequestedAddOn]], default_factory=list
     )
+    # Lease of a renewal worker, others skip the subscription until it expires
+    claimed_by: Mapped[str | None] = mapped_column(default=None)
+    claim_expires_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), default=None
+    )
 
     def cancel(self) -> None:
         if self.status == "canceled":
@@ -64,20 +80,59 @@ class Subscription(Base):
 
     def renewal_failed(self) -> None:
         self.status = "inactive"
+        self._release_claim()
+
+    def renewal_uncertain(self) -> None:
+        """Charge raised, so it is not known whether money was taken.
+
+        Not renewed again until reconciled with payments and made active.
+        """
+        self.status = "needs_reconciliation"
+        self._release_claim()
+
+    def reconciled(
+        self, charged: bool, leveling: LoadLeveling = LoadLeveling()
+    ) -> None:
+        """Resolves an uncertain renewal, as payments show whether it was charged.
 
-    def renewal_successful(self) -> None:
+        If not, the subscription is due again, so the next renewal charges it.
+        """
+        if self.status != "needs_reconciliation":
+            raise Exception("Subscription does not need reconciliation!")
+
+        self.status = "active"
+        if charged:
+            self.renewal_successful(leveling)
+
+    def renewal_successful(self, leveling: LoadLeveling = LoadLeveling()) -> None:
+        self._release_claim()
         now = datetime.now(timezone.utc)
-        self.next_renewal_at = calculate_next_renewal(now, self.term)
+        self.next_renewal_at = calculate_next_renewal(
+            now, self.term, self.subscribed_at
+        )
+        self.level_renewal(leveling)
         if self.pending_change is not None:
             self.plan_id = self.pending_change.new_plan_id
             self.pending_change = None
 
-    def upgrade(self, new_plan_id: PlanId) -> None:
+    def _release_claim(self) -> None:
+        self.claimed_by = None
+        self.claim_expires_at = None
+
+    def level_renewal(self, leveling: LoadLeveling) -> None:
+        """Moves next renewal to the time of its day leveling gives this one."""
+        if self.next_renewal_at is not None:
+            self.next_renewal_at = leveling.level(self.next_renewal_at, self.id)
+
+    def upgrade(
+        self, new_plan_id: PlanId, leveling: LoadLeveling = LoadLeveling()
+    ) -> None:
         self.plan_id = int(new_plan_id)
         now = datetime.now(timezone.utc)
         self.subscribed_at = now
         next_renewal_at = calculate_next_renewal(now, self.term)
         self.next_renewal_at = next_renewal_at
+        self.level_renewal(leveling)
 
     def downgrade(self, new_plan_id: PlanId) -> None:
         self.pending_change = PendingChange(new_plan_id=new_plan_id)
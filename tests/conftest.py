@@ -10,6 +10,7 @@ from sqlalchemy import Engine, create_engine, text
 from subscriptions.shared.mqlib import PoolFactory
 from subscriptions.shared.sqlalchemy import Base
 from subscriptions.main import container as main_container, SessionFactory
+from subscriptions.plans._app._catalog import PlanCatalog
 from subscriptions.api.app import app
 from subscriptions.shared.mqlib.testing import purge as purge_queue
 
@@ -28,6 +29,8 @@ def setup_db(request: SubRequest) -> Iterator[None]:
 
     test_engine = create_engine(new_url, echo=True)
     SessionFactory.configure(bind=test_engine)
+    # Plans of other tests' databases have the same tenant ids
+    main_container[PlanCatalog].invalidate()
     Base.metadata.create_all(test_engine)
     yield
     test_engine.dispose()
@@ -0,0 +1,164 @@
+import threading
+import time
+from collections.abc import Sequence
+
+import pytest
+from lagom import Container
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from subscriptions.plans._app._catalog import PlanCatalog
+from subscriptions.plans._domain._plan import Plan
+from subscriptions.plans._domain._plan_id import PlanId
+from subscriptions.shared.money import Money
+from subscriptions.shared.tenant_id import TenantId
+
+TENANT = TenantId(1)
+OTHER_TENANT = TenantId(2)
+
+
+class CountingLoader:
+    def __init__(self, plan_id: int = 1) -> None:
+        self.calls = 0
+        self._plan_id = plan_id
+
+    def __call__(self) -> Sequence[Plan]:
+        self.calls += 1
+        plan = Plan(
+            tenant_id=1,
+            name="Dummy",
+            price=Money(5, "USD"),
+            description="Irrelevant",
+            add_ons=[],
+        )
+        plan.id = self._plan_id
+        return [plan]
+
+
+@pytest.fixture()
+def catalog() -> PlanCatalog:
+    # Not PostgreSQL, so nothing is listened for
+    return PlanCatalog(create_engine("sqlite://"))
+
+
+def test_loads_plans_of_tenant_once(catalog: PlanCatalog) -> None:
+    load = CountingLoader(plan_id=7)
+
+    first = catalog.plans(TENANT, load)
+    second = catalog.plans(TENANT, load)
+
+    assert load.calls == 1
+    assert list(first) == [PlanId(7)]
+    assert second is first
+
+
+def test_loads_again_after_invalidation(catalog: PlanCatalog) -> None:
+    load = CountingLoader()
+    catalog.plans(TENANT, load)
+    catalog.plans(OTHER_TENANT, load)
+
+    catalog.invalidate(TENANT)
+    catalog.plans(TENANT, load)
+    catalog.plans(OTHER_TENANT, load)
+
+    assert load.calls == 3
+
+
+def test_loads_again_after_ttl(catalog: PlanCatalog) -> None:
+    catalog.TTL = 0.0
+    load = CountingLoader()
+
+    catalog.plans(TENANT, load)
+    catalog.plans(TENANT, load)
+
+    assert load.calls == 2
+
+
+def test_evicts_least_recently_used_tenant(catalog: PlanCatalog) -> None:
+    catalog.MAX_TENANTS = 2
+    load = CountingLoader()
+    catalog.plans(TenantId(1), load)
+    catalog.plans(TenantId(2), load)
+    catalog.plans(TenantId(1), load)
+
+    catalog.plans(TenantId(3), load)
+    catalog.plans(TenantId(1), load)
+    assert load.calls == 3
+
+    catalog.plans(TenantId(2), load)
+    assert load.calls == 4
+
+
+def test_concurrent_misses_wait_for_single_load(catalog: PlanCatalog) -> None:
+    loader = CountingLoader()
+
+    def slow_load() -> Sequence[Plan]:
+        time.sleep(0.1)
+        return loader()
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(catalog.plans(TENANT, slow_load))
+        )
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loader.calls == 1
+    assert all(result == results[0] for result in results)
+
+
+def test_load_invalidated_while_loading_is_not_cached(catalog: PlanCatalog) -> None:
+    loader = CountingLoader()
+
+    def load_and_invalidate() -> Sequence[Plan]:
+        catalog.invalidate(TENANT)
+        return loader()
+
+    catalog.plans(TENANT, load_and_invalidate)
+    catalog.plans(TENANT, loader)
+
+    assert loader.calls == 2
+
+
+def test_failed_load_is_not_cached(catalog: PlanCatalog) -> None:
+    def failing_load() -> Sequence[Plan]:
+        raise ConnectionError
+
+    with pytest.raises(ConnectionError):
+        catalog.plans(TENANT, failing_load)
+
+    load = CountingLoader()
+    catalog.plans(TENANT, load)
+    assert load.calls == 1
+
+
+def test_drops_plans_announced_as_changed_by_any_process(
+    container: Container,
+) -> None:
+    session = container.resolve(Session)
+    catalog = PlanCatalog(session.get_bind())  # type: ignore[arg-type]
+    load = CountingLoader()
+    catalog.plans(TENANT, load)
+    listening = text(
+        "SELECT count(*) FROM pg_stat_activity WHERE query = 'LISTEN plans_changed'"
+    )
+    deadline = time.monotonic() + 5
+    while not session.execute(listening).scalar_one():
+        assert time.monotonic() < deadline, "Not listening for plan changes"
+        time.sleep(0.05)
+    catalog.plans(TENANT, load)
+    calls = load.calls
+
+    catalog.announce_change(session, TENANT)
+    session.commit()
+
+    deadline = time.monotonic() + 5
+    while load.calls == calls and time.monotonic() < deadline:
+        catalog.plans(TENANT, load)
+        time.sleep(0.05)
+    assert load.calls == calls + 1
@@ -0,0 +1,98 @@
+from collections.abc import Sequence
+from unittest.mock import Mock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm import Session
+
+from subscriptions.plans import CostRequest, PlanId, PlansFacade, RequestedAddOn
+from subscriptions.plans._app._catalog import PlanCatalog
+from subscriptions.plans._app._repository import PlansRepository
+from subscriptions.plans._domain._add_ons._not_found import RequestedAddOnNotFound
+from subscriptions.plans._domain._add_ons._unit_price_add_on import UnitPriceAddOn
+from subscriptions.plans._domain._plan import Plan
+from subscriptions.shared.money import Money
+from subscriptions.shared.tenant_id import TenantId
+from subscriptions.shared.term import Term
+
+TENANT = TenantId(1)
+
+
+@pytest.fixture()
+def loads() -> list[int]:
+    return []
+
+
+@pytest.fixture()
+def prices() -> dict[int, int]:
+    return {1: 5, 2: 10}
+
+
+@pytest.fixture()
+def facade(loads: list[int], prices: dict[int, int]) -> PlansFacade:
+    def load(tenant_id: TenantId) -> Sequence[Plan]:
+        loads.append(1)
+        plans = []
+        for plan_id, price in prices.items():
+            plan = Plan(
+                tenant_id=tenant_id,
+                name=f"plan_{plan_id}",
+                price=Money(price, "USD"),
+                description="Irrelevant",
+                add_ons=[UnitPriceAddOn(name="seat", unit_price=Money(1, "USD"))],
+            )
+            plan.id = plan_id
+            plans.append(plan)
+        return plans
+
+    repository = Mock(spec_set=PlansRepository)
+    repository.get_all.side_effect = load
+    catalog = PlanCatalog(create_engine("sqlite://"))
+    return PlansFacade(Session(), repository, catalog)
+
+
+def test_prices_batch_in_order_of_requests(
+    facade: PlansFacade, loads: list[int]
+) -> None:
+    costs = facade.calculate_costs(
+        TENANT,
+        [
+            CostRequest(PlanId(2), Term.MONTHLY, []),
+            CostRequest(PlanId(1), Term.YEARLY, [RequestedAddOn("seat", 2)]),
+            CostRequest(PlanId(2), Term.MONTHLY, []),
+        ],
+    )
+
+    assert costs == [Money(10, "USD"), Money(84, "USD"), Money(10, "USD")]
+    assert loads == [1]
+
+
+def test_reports_errors_of_failing_requests_only(facade: PlansFacade) -> None:
+    costs = facade.calculate_costs(
+        TENANT,
+        [
+            CostRequest(PlanId(404), Term.MONTHLY, []),
+            CostRequest(PlanId(1), Term.MONTHLY, [RequestedAddOn("missing", 1)]),
+            CostRequest(PlanId(1), Term.MONTHLY, []),
+        ],
+    )
+
+    assert isinstance(costs[0], NoResultFound)
+    assert isinstance(costs[1], RequestedAddOnNotFound)
+    assert costs[2] == Money(5, "USD")
+
+
+def test_loads_plans_again_once_when_plan_is_missing(
+    facade: PlansFacade, loads: list[int], prices: dict[int, int]
+) -> None:
+    facade.calculate_cost(TENANT, PlanId(1), Term.MONTHLY, [])
+    # Added by another process, its notification has not come yet
+    prices[3] = 20
+
+    cost = facade.calculate_cost(TENANT, PlanId(3), Term.MONTHLY, [])
+    with pytest.raises(NoResultFound):
+        facade.calculate_cost(TENANT, PlanId(404), Term.MONTHLY, [])
+
+    assert cost == Money(20, "USD")
+    assert loads == [1, 1, 1]
@@ -1,12 +1,16 @@
 import pytest
 
 from subscriptions.plans import RequestedAddOn
+from subscriptions.plans._domain._add_ons._duplicate_names import DuplicateAddOnNames
 from subscriptions.plans._domain._add_ons._flat_price_add_on import FlatPriceAddOn
 from subscriptions.plans._domain._add_ons._invalid_tier_requested import (
     InvalidTierRequested,
 )
 from subscriptions.plans._domain._add_ons._not_found import RequestedAddOnNotFound
-from subscriptions.plans._domain._add_ons._tiered_add_on import TieredAddOn
+from subscriptions.plans._domain._add_ons._tiered_add_on import (
+    TieredAddOn,
+    TierPricing,
+)
 from subscriptions.plans._domain._add_ons._unit_price_add_on import UnitPriceAddOn
 from subscriptions.plans._domain._plan import Plan
 from subscriptions.shared.money import Money
@@ -56,8 +60,125 @@ def test_requesting_non_existing_add_on_raises_exception(
         )
 
 
+def test_requesting_many_non_existing_add_ons_names_all_of_them(
+    plan_with_add_ons: Plan,
+) -> None:
+    with pytest.raises(RequestedAddOnNotFound, match="missing_1, missing_2"):
+        plan_with_add_ons.calculate_cost(
+            term=Term.MONTHLY,
+            add_ons=[
+                RequestedAddOn(name="missing_1", quantity=1),
+                RequestedAddOn(name="unit_price", quantity=1),
+                RequestedAddOn(name="missing_2", quantity=1),
+            ],
+        )
+
+
+def test_adding_many_add_ons_sums_their_prices(plan_with_add_ons: Plan) -> None:
+    result = plan_with_add_ons.calculate_cost(
+        term=Term.YEARLY,
+        add_ons=[
+            RequestedAddOn(name="unit_price", quantity=2),
+            RequestedAddOn(name="tiered", quantity=3),
+        ],
+    )
+
+    assert result == Money(108, "USD")
+
+
+def test_prices_add_ons_added_after_creation(plan_with_add_ons: Plan) -> None:
+    requested = [RequestedAddOn(name="extra", quantity=1)]
+    with pytest.raises(RequestedAddOnNotFound):
+        plan_with_add_ons.calculate_cost(term=Term.MONTHLY, add_ons=requested)
+
+    plan_with_add_ons.add_ons.append(
+        FlatPriceAddOn(name="extra", flat_price=Money(2, "USD"))
+    )
+    assert plan_with_add_ons.calculate_cost(
+        term=Term.MONTHLY, add_ons=requested
+    ) == Money(7, "USD")
+
+    plan_with_add_ons.add_ons = [
+        FlatPriceAddOn(name="extra", flat_price=Money(3, "USD"))
+    ]
+    assert plan_with_add_ons.calculate_cost(
+        term=Term.MONTHLY, add_ons=requested
+    ) == Money(8, "USD")
+
+    plan_with_add_ons.add_ons[0] = FlatPriceAddOn(
+        name="extra", flat_price=Money(4, "USD")
+    )
+    assert plan_with_add_ons.calculate_cost(
+        term=Term.MONTHLY, add_ons=requested
+    ) == Money(9, "USD")
+
+
+def test_plan_with_repeated_add_on_names_cannot_be_created() -> None:
+    with pytest.raises(DuplicateAddOnNames, match="unit_price"):
+        Plan(
+            tenant_id=1,
+            name="Dummy",
+            price=Money(5, "USD"),
+            description="Irrelevant",
+            add_ons=[
+                UnitPriceAddOn(name="unit_price", unit_price=Money(1, "USD")),
+                FlatPriceAddOn(name="unit_price", flat_price=Money(13, "USD")),
+            ],
+        )
+
+
 def test_requesting_not_existing_tier(plan_with_add_ons: Plan) -> None:
     with pytest.raises(InvalidTierRequested):
         plan_with_add_ons.calculate_cost(
             term=Term.MONTHLY, add_ons=[RequestedAddOn(name="tiered", quantity=100)]
         )
+
+
+@pytest.mark.parametrize(
+    "pricing,quantity,expected",
+    [
+        (TierPricing.VOLUME, 1, 10),
+        (TierPricing.VOLUME, 10, 100),
+        (TierPricing.VOLUME, 15, 120),
+        (TierPricing.VOLUME, 1000, 5000),
+        (TierPricing.GRADUATED, 1, 10),
+        (TierPricing.GRADUATED, 10, 100),
+        (TierPricing.GRADUATED, 15, 140),
+        (TierPricing.GRADUATED, 1000, 100 + 90 * 8 + 900 * 5),
+    ],
+)
+def test_range_tiers_price_quantities_between_tier_starts(
+    pricing: TierPricing, quantity: int, expected: int
+) -> None:
+    add_on = TieredAddOn(
+        name="seats",
+        tiers={1: Money(10, "USD"), 11: Money(8, "USD"), 101: Money(5, "USD")},
+        pricing=pricing,
+    )
+
+    assert add_on.calculate_price(quantity) == Money(expected, "USD")
+
+
+@pytest.mark.parametrize("pricing", [TierPricing.VOLUME, TierPricing.GRADUATED])
+def test_range_tiers_reject_quantity_below_one(pricing: TierPricing) -> None:
+    add_on = TieredAddOn(name="seats", tiers={1: Money(10, "USD")}, pricing=pricing)
+
+    with pytest.raises(InvalidTierRequested):
+        add_on.calculate_price(0)
+
+
+def test_range_tiers_must_start_at_one() -> None:
+    with pytest.raises(ValueError):
+        TieredAddOn(
+            name="seats", tiers={5: Money(10, "USD")}, pricing=TierPricing.VOLUME
+        )
+
+
+@pytest.mark.parametrize("pricing", [TierPricing.VOLUME, TierPricing.GRADUATED])
+def test_range_tiers_must_be_in_one_currency(pricing: TierPricing) -> None:
+    with pytest.raises(ValueError):
+        TieredAddOn(
+            name="seats",
+            tiers={1: Money(10, "USD"), 11: Money(800, "JPY")},
+            pricing=pricing,
+        )
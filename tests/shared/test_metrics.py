@@ -0,0 +1,42 @@
+from subscriptions.shared.metrics import InProcessMetrics
+
+
+def test_exposes_counters_and_gauges_with_labels() -> None:
+    metrics = InProcessMetrics()
+
+    metrics.increment("published_total", queue="payments")
+    metrics.increment("published_total", 2, queue="payments")
+    metrics.set("backlog_entries", 5)
+
+    assert metrics.expose() == (
+        "# TYPE published_total counter\n"
+        'published_total{queue="payments"} 3\n'
+        "# TYPE backlog_entries gauge\n"
+        "backlog_entries 5\n"
+    )
+
+
+def test_exposes_cumulative_histogram_buckets() -> None:
+    metrics = InProcessMetrics()
+    metrics.BUCKETS = (0.1, 1.0)
+
+    metrics.observe("latency_seconds", 0.05)
+    metrics.observe("latency_seconds", 0.5)
+    metrics.observe("latency_seconds", 5)
+
+    assert metrics.expose() == (
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{le="0.1"} 1\n'
+        'latency_seconds_bucket{le="1.0"} 2\n'
+        'latency_seconds_bucket{le="+Inf"} 3\n'
+        "latency_seconds_sum 5.55\n"
+        "latency_seconds_count 3\n"
+    )
+
+
+def test_escapes_label_values() -> None:
+    metrics = InProcessMetrics()
+
+    metrics.increment("errors_total", error='say "hi"\n')
+
+    assert 'errors_total{error="say \\"hi\\"\\n"} 1' in metrics.expose()
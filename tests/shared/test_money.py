@@ -1,8 +1,32 @@
 from decimal import Decimal
+from typing import Annotated, Any
 
 import pytest
+from lagom import Container
+from pydantic import TypeAdapter
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    Table,
+    func,
+    insert,
+    select,
+    text,
+)
+from sqlalchemy.orm import Session
+
+from subscriptions.payments._domain._payment import Payment
+from subscriptions.plans._domain._plan import Plan
+from subscriptions.shared.money import (
+    Money,
+    MoneyAnnotation,
+    MoneyType,
+    MoneyVector,
+    migrate_json_money_column,
+)
 
-from subscriptions.shared.money import Money
+AnnotatedMoney = Annotated[Money, MoneyAnnotation]
 
 
 @pytest.mark.parametrize(
@@ -46,3 +70,214 @@ def test_money_with_negative_or_too_many_decimal_points_in_amount_raises_value_e
 ) -> None:
     with pytest.raises(ValueError):
         Money(amount, currency)
+
+
+@pytest.mark.parametrize(
+    "money, minor_units",
+    [
+        [Money(Decimal("10.99"), "USD"), 1099],
+        [Money(10, "JPY"), 10],
+        [Money(10**-24, "ETH"), 1],
+    ],
+)
+def test_money_converts_to_and_from_minor_units(money: Money, minor_units: int) -> None:
+    assert money.to_minor_units() == minor_units
+    assert Money.from_minor_units(minor_units, money.currency) == money
+
+
+def test_negative_minor_units_raise_value_error() -> None:
+    with pytest.raises(ValueError):
+        Money.from_minor_units(-1, "USD")
+
+
+def test_adding_and_multiplying_keeps_currency_precision() -> None:
+    result = (Money(Decimal("9.99"), "USD") + Money(Decimal("0.01"), "USD")) * 3
+
+    assert result == Money(30, "USD")
+    assert str(result.amount) == "30.00"
+
+
+def test_money_in_different_currencies_is_not_equal() -> None:
+    assert Money(1, "USD") != Money(1, "JPY")
+
+
+def test_money_vector_adds_multiplies_and_sums_element_wise() -> None:
+    prices = MoneyVector.from_money([Money(1, "USD"), Money(Decimal("2.50"), "USD")])
+    fees = MoneyVector.from_money([Money(Decimal("0.10"), "USD")] * 2)
+
+    result = (prices + fees) * 2
+
+    assert result.to_money() == [
+        Money(Decimal("2.20"), "USD"),
+        Money(Decimal("5.20"), "USD"),
+    ]
+    assert result.sum() == Money(Decimal("7.40"), "USD")
+
+
+def test_money_vector_compares_element_wise() -> None:
+    prices = MoneyVector([100, 250, 300], "USD")
+
+    assert (prices <= Money(Decimal("2.50"), "USD")) == [True, True, False]
+
+
+def test_money_vector_sums_by_key() -> None:
+    payments = MoneyVector([100, 200, 300], "USD")
+
+    totals = payments.grouped_sum(["tenant_1", "tenant_2", "tenant_1"])
+
+    assert totals == {"tenant_1": Money(4, "USD"), "tenant_2": Money(2, "USD")}
+
+
+def test_money_vector_keeps_eth_amounts_exceeding_int64() -> None:
+    amounts = [Money(Decimal("1000000.000000000000000000000001"), "ETH")] * 3
+
+    vector = MoneyVector.from_money(amounts)
+
+    assert (vector * 10).sum() == Money(
+        Decimal("30000000.00000000000000000000003"), "ETH"
+    )
+
+
+def test_money_vector_rejects_mixed_currencies() -> None:
+    with pytest.raises(ValueError):
+        MoneyVector.from_money([Money(1, "USD"), Money(1, "JPY")])
+
+
+@pytest.mark.parametrize(
+    "other", [MoneyVector([100], "JPY"), Money(100, "JPY")], ids=["vector", "money"]
+)
+def test_money_vector_does_not_combine_money_in_different_currencies(
+    other: MoneyVector | Money,
+) -> None:
+    prices = MoneyVector([100], "USD")
+
+    with pytest.raises(ValueError):
+        prices + other
+    with pytest.raises(ValueError):
+        prices <= other
+
+
+@pytest.mark.parametrize(
+    "raw, expected",
+    [
+        [{"amount": "10.99", "currency": "USD"}, Money(Decimal("10.99"), "USD")],
+        [{"amount": 10, "currency": "JPY"}, Money(10, "JPY")],
+        [{"amount": 15.99, "currency": "USD"}, Money(Decimal("15.99"), "USD")],
+        [
+            {"amount": "1000.000000000000000000000001", "currency": "ETH"},
+            Money(Decimal("1000.000000000000000000000001"), "ETH"),
+        ],
+    ],
+)
+def test_money_annotation_validates_amount_exactly(
+    raw: dict[str, Any], expected: Money
+) -> None:
+    assert TypeAdapter(AnnotatedMoney).validate_python(raw) == expected
+
+
+@pytest.mark.parametrize(
+    "money, expected",
+    [
+        [Money(Decimal("10.9"), "USD"), b'{"amount":"10.90","currency":"USD"}'],
+        [Money(10, "JPY"), b'{"amount":"10","currency":"JPY"}'],
+        [Money(10**-24, "ETH"), b'{"amount":"0.' + b"0" * 23 + b'1","currency":"ETH"}'],
+    ],
+)
+def test_money_annotation_dumps_amount_as_decimal_string(
+    money: Money, expected: bytes
+) -> None:
+    assert TypeAdapter(AnnotatedMoney).dump_json(money) == expected
+
+
+# As tables were before Money got native columns, kept out of Base.metadata
+legacy_orders = Table(
+    "legacy_orders",
+    MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("amount", MoneyType),
+)
+
+
+@pytest.mark.parametrize(
+    "amount",
+    [
+        Money(Decimal("12.34"), "USD"),
+        Money(1000, "JPY"),
+        # More minor units than fit in BIGINT
+        Money(Decimal("123456789.000000000000000000000001"), "ETH"),
+    ],
+)
+def test_money_columns_keep_amount_exactly(container: Container, amount: Money) -> None:
+    session = container[Session]
+    session.add(
+        Plan(tenant_id=1, name="Plan", price=amount, description="", add_ons=[])
+    )
+    session.add(
+        Payment(
+            tenant_id=1,
+            account_id=1,
+            amount=amount,
+            status="success",
+            stripe_payment_id="pi_1",
+        )
+    )
+    session.commit()
+    session.expunge_all()
+
+    assert session.execute(select(Plan)).scalar_one().price == amount
+    assert session.execute(select(Payment)).scalar_one().amount == amount
+    assert session.execute(
+        text("SELECT price_minor_units, price_currency FROM plans")
+    ).one() == (amount.to_minor_units(), amount.currency)
+
+
+def test_minor_units_are_summed_in_database(container: Container) -> None:
+    session = container[Session]
+    session.add_all(
+        Payment(
+            tenant_id=1,
+            account_id=1,
+            amount=amount,
+            status="success",
+            stripe_payment_id="pi_1",
+        )
+        for amount in [Money(1, "USD"), Money(Decimal("0.99"), "USD"), Money(5, "JPY")]
+    )
+    session.commit()
+
+    columns = Payment.__table__.c
+    totals = session.execute(
+        select(columns.amount_currency, func.sum(columns.amount_minor_units))
+        .group_by(columns.amount_currency)
+        .order_by(columns.amount_currency)
+    ).all()
+
+    assert [tuple(row) for row in totals] == [("JPY", 5), ("USD", 199)]
+
+
+def test_migrates_json_money_column_to_native_columns(container: Container) -> None:
+    connection = container[Session].connection()
+    legacy_orders.create(connection)
+    connection.execute(
+        insert(legacy_orders),
+        [{"amount": Money(Decimal("12.34"), "USD")}, {"amount": Money(1000, "JPY")}],
+    )
+
+    migrated = migrate_json_money_column(connection, "legacy_orders", "amount")
+    migrated_again = migrate_json_money_column(connection, "legacy_orders", "amount")
+
+    assert (migrated, migrated_again) == (2, 0)
+    rows = connection.execute(
+        text(
+            "SELECT amount_minor_units, amount_currency FROM legacy_orders ORDER BY id"
+        )
+    ).all()
+    assert [tuple(row) for row in rows] == [(1234, "USD"), (1000, "JPY")]
+
+
+def test_migration_ignores_tables_of_other_schemas(container: Container) -> None:
+    connection = container[Session].connection()
+    connection.execute(text("CREATE SCHEMA other"))
+    connection.execute(text("CREATE TABLE other.legacy_orders (amount JSON)"))
+
+    assert migrate_json_money_column(connection, "legacy_orders", "amount") == 0
@@ -0,0 +1,419 @@
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+from unittest.mock import patch
+
+from kombu import Queue  # type: ignore[import-untyped]
+from kombu import serialization as kombu_serialization
+from kombu.exceptions import EncodeError, SerializerNotInstalled  # type: ignore[import-untyped]
+
+import pytest
+
+from subscriptions.shared.mqlib import (
+    Serialization,
+    decode,
+    register_serializer,
+    AsyncPublisher,
+    BrokerUrl,
+    Consumer,
+    Envelope,
+    Handler,
+    PoolFactory,
+    Publisher,
+    PublishError,
+    PublishFailure,
+)
+from subscriptions.shared.mqlib._consumer import _Acks
+from subscriptions.shared.mqlib._mqlib import _ChannelState, _Confirms, _channel_state
+from subscriptions.shared.mqlib._serialization import ACCEPTED_CONTENT_TYPES
+from subscriptions.shared.mqlib.testing import next_message, purge
+from subscriptions.main import container as main_container
+
+
+@pytest.fixture()
+def pool_factory() -> PoolFactory:
+    return PoolFactory(BrokerUrl("memory://"))
+
+
+@pytest.fixture()
+def publisher(pool_factory: PoolFactory) -> Publisher:
+    return Publisher(pool_factory)
+
+
+def test_publishes_batch_to_many_queues_in_order(
+    publisher: Publisher, pool_factory: PoolFactory
+) -> None:
+    failed = publisher.publish_batch(
+        [
+            Envelope("batch-first", {"number": 1}),
+            Envelope("batch-second", {"number": 2}),
+            Envelope("batch-first", {"number": 3}),
+        ]
+    )
+
+    assert failed == []
+    assert next_message(pool_factory, Queue("batch-first")) == {"number": 1}
+    assert next_message(pool_factory, Queue("batch-first")) == {"number": 3}
+    assert next_message(pool_factory, Queue("batch-second")) == {"number": 2}
+
+
+def test_publishing_empty_batch_does_nothing(publisher: Publisher) -> None:
+    assert publisher.publish_batch([]) == []
+
+
+def test_declares_queue_once_per_channel(
+    publisher: Publisher, pool_factory: PoolFactory
+) -> None:
+    with patch.object(
+        Queue, "declare", autospec=True, side_effect=Queue.declare
+    ) as declare_mock:
+        publisher.publish("declared-once", {"number": 1})
+        publisher.publish("declared-once", {"number": 2})
+
+        with pool_factory.get().acquire(block=True) as conn:
+            conn.collect()  # Drops channels, like a reconnect does
+        publisher.publish("declared-once", {"number": 3})
+
+    assert declare_mock.call_count == 2
+
+
+def test_publishes_many_messages_to_one_queue(
+    publisher: Publisher, pool_factory: PoolFactory
+) -> None:
+    failures = publisher.publish_many(
+        "many", [{"number": 1}, {"number": 2}], headers={"source": "tests"}
+    )
+
+    assert failures == []
+    assert next_message(pool_factory, Queue("many")) == {"number": 1}
+    assert next_message(pool_factory, Queue("many")) == {"number": 2}
+
+
+class ConfirmingChannel:
+    """Broker side of publisher confirms, acking/nacking on drain_events."""
+
+    def __init__(self, confirms: list[tuple[str, int, bool]]) -> None:
+        self.events: dict[str, set[Callable[[int, bool], None]]] = defaultdict(set)
+        self._confirms = confirms
+
+    def confirm_select(self) -> None:
+        pass
+
+    def basic_publish(self) -> None:
+        pass
+
+    def drain_events(self, timeout: float) -> None:
+        if not self._confirms:
+            raise TimeoutError
+        event, delivery_tag, multiple = self._confirms.pop(0)
+        for callback in self.events[event]:
+            callback(delivery_tag, multiple)
+
+
+def test_reports_nacked_and_unconfirmed_messages() -> None:
+    channel = ConfirmingChannel(
+        [("basic_ack", 2, True), ("basic_nack", 3, False), ("basic_ack", 5, False)]
+    )
+
+    with _Confirms(channel, _ChannelState()) as confirms:
+        for _ in range(5):
+            channel.basic_publish()
+            confirms.sent()
+        failures = confirms.wait(channel, timeout=1)
+
+    assert failures == [
+        PublishFailure(2, "Nacked by broker"),
+        PublishFailure(3, "Not confirmed within 1s"),
+    ]
+
+
+def test_messages_published_by_others_on_channel_do_not_shift_confirms() -> None:
+    channel = ConfirmingChannel(
+        [("basic_ack", 1, False), ("basic_ack", 5, True), ("basic_nack", 6, False)]
+    )
+    state = _ChannelState()
+
+    with _Confirms(channel, state) as confirms:
+        channel.basic_publish()
+        confirms.sent()
+        failures = confirms.wait(channel, timeout=1)
+    assert failures == []
+
+    # Not through Publisher, e.g. with the default channel of a connection
+    channel.basic_publish()
+    channel.basic_publish()
+    with _Confirms(channel, state) as confirms:
+        channel.basic_publish()
+        confirms.sent()
+        channel.basic_publish()  # Someone else's
+        channel.basic_publish()
+        confirms.sent()
+        failures = confirms.wait(channel, timeout=1)
+
+    assert failures == [PublishFailure(1, "Nacked by broker")]
+
+
+class OneProducerPoolFactory:
+    """Hands out the same producer, publishing on a ConfirmingChannel."""
+
+    def __init__(self, channel: ConfirmingChannel) -> None:
+        self.channel = channel
+        self.connection = channel
+
+    def get_producers(self) -> "OneProducerPoolFactory":
+        return self
+
+    @contextmanager
+    def acquire(self, block: bool) -> Iterator["OneProducerPoolFactory"]:
+        yield self
+
+    def publish(self, body: bytes, **kwargs: Any) -> None:
+        self.channel.basic_publish()
+
+
+def test_confirms_are_matched_after_batch_failed_on_the_channel() -> None:
+    channel = ConfirmingChannel([("basic_ack", 2, False)])
+    _channel_state(channel).declared_queues.add("failing")
+    publisher = Publisher(OneProducerPoolFactory(channel))  # type: ignore[arg-type]
+    publisher.CONFIRM_TIMEOUT = 1.0
+
+    with pytest.raises(EncodeError):
+        publisher.publish_many("failing", [{"number": 1}, {"number": object()}])
+    failures = publisher.publish_many("failing", [{"number": 2}])
+
+    assert failures == []
+
+
+@pytest.fixture()
+def rabbitmq_pool_factory() -> PoolFactory:
+    return main_container.resolve(PoolFactory)
+
+
+def test_confirms_batches_on_real_confirm_channel(
+    rabbitmq_pool_factory: PoolFactory,
+) -> None:
+    publisher = Publisher(rabbitmq_pool_factory)
+    publisher.CONFIRM_TIMEOUT = 5.0
+    queue = Queue("mqlib-confirms")
+    with rabbitmq_pool_factory.get().acquire(block=True) as conn:
+        queue(conn).declare()
+    purge(rabbitmq_pool_factory, queue)
+
+    first = publisher.publish_many(queue, [{"number": 1}, {"number": 2}])
+    with rabbitmq_pool_factory.get_producers().acquire(block=True) as producer:
+        # Published on the same channel without Publisher knowing
+        producer.publish({"number": 3}, routing_key=queue.name, serializer="json")
+    started = time.monotonic()
+    second = publisher.publish_many(queue, [{"number": 4}, {"number": 5}])
+
+    assert (first, second) == ([], [])
+    assert time.monotonic() - started < publisher.CONFIRM_TIMEOUT
+    numbers = [next_message(rabbitmq_pool_factory, queue)["number"] for _ in range(5)]
+    assert numbers == [1, 2, 3, 4, 5]
+
+
+def run_in_thread(consumer: Consumer, stop_event: threading.Event) -> threading.Thread:
+    thread = threading.Thread(target=consumer.run, args=(stop_event,))
+    thread.start()
+    return thread
+
+
+def test_consumes_messages_with_handlers_registered_per_queue(
+    publisher: Publisher, pool_factory: PoolFactory
+) -> None:
+    received: list[tuple[str, int]] = []
+    stop_event = threading.Event()
+
+    def handler_for(queue_name: str) -> Handler:
+        def handle(body: dict[str, Any]) -> None:
+            received.append((queue_name, body["number"]))
+            if len(received) == 20:
+                stop_event.set()
+
+        return handle
+
+    consumer = Consumer(pool_factory, prefetch_count=4, workers=3)
+    consumer.register("consumed-first", handler_for("consumed-first"))
+    consumer.register("consumed-second", handler_for("consumed-second"))
+    publisher.publish_many("consumed-first", [{"number": n} for n in range(10)])
+    publisher.publish_many("consumed-second", [{"number": n} for n in range(10)])
+
+    run_in_thread(consumer, stop_event).join(timeout=10)
+
+    assert sorted(received) == sorted(
+        [("consumed-first", n) for n in range(10)]
+        + [("consumed-second", n) for n in range(10)]
+    )
+
+
+def test_redelivers_failed_messages_up_to_the_limit(
+    publisher: Publisher, pool_factory: PoolFactory
+) -> None:
+    attempts: list[dict[str, Any]] = []
+    stop_event = threading.Event()
+
+    def handle(body: dict[str, Any]) -> None:
+        attempts.append(body)
+        if len(attempts) == 3:
+            stop_event.set()
+        raise ValueError("Cannot handle")
+
+    consumer = Consumer(pool_factory, max_redeliveries=2)
+    consumer.register("redelivered", handle)
+    publisher.publish("redelivered", {"number": 1})
+
+    run_in_thread(consumer, stop_event).join(timeout=10)
+
+    assert attempts == [{"number": 1}] * 3
+    with pool_factory.get().acquire(block=True) as conn:
+        assert Queue("redelivered")(conn).get() is None
+
+
+class RecordingChannel:
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, int, bool]] = []
+
+    def basic_ack(self, delivery_tag: int, multiple: bool = False) -> None:
+        self.calls.append(("ack", delivery_tag, multiple))
+
+    def basic_reject(self, delivery_tag: int, requeue: bool) -> None:
+        self.calls.append(("reject", delivery_tag, requeue))
+
+
+def test_acks_in_batches_up_to_first_message_still_being_handled() -> None:
+    channel = RecordingChannel()
+    acks = _Acks(channel, batch_size=3)
+    for delivery_tag in range(1, 6):
+        acks.received(delivery_tag)
+
+    acks.ack(2)
+    acks.reject(1, requeue=False)
+    acks.ack(4)
+    acks.ack(3)  # 2-4 are acked, 5 is still being handled
+    acks.ack(5)
+    acks.flush()
+
+    assert channel.calls == [
+        ("reject", 1, False),
+        ("ack", 4, True),
+        ("ack", 5, True),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_async_publisher_batches_concurrent_publishes(
+    pool_factory: PoolFactory,
+) -> None:
+    publisher = AsyncPublisher(pool_factory)
+
+    with patch.object(
+        Publisher, "publish_batch", autospec=True, side_effect=Publisher.publish_batch
+    ) as publish_batch_mock:
+        await asyncio.gather(
+            *[publisher.publish("async-publisher", {"number": n}) for n in range(10)]
+        )
+
+    assert publish_batch_mock.call_count < 10
+    received = [next_message(pool_factory, Queue("async-publisher")) for _ in range(10)]
+    assert sorted(message["number"] for message in received) == list(range(10))
+
+
+@pytest.mark.asyncio
+async def test_async_publisher_reports_failures(pool_factory: PoolFactory) -> None:
+    publisher = AsyncPublisher(pool_factory)
+
+    def nack_even_numbers(
+        _publisher: Publisher, envelopes: list[Envelope], exchange: str
+    ) -> list[PublishFailure]:
+        return [
+            PublishFailure(index, "Nacked by broker")
+            for index, envelope in enumerate(envelopes)
+            if envelope.message["number"] % 2 == 0
+        ]
+
+    with patch.object(
+        Publisher, "publish_batch", autospec=True, side_effect=nack_even_numbers
+    ):
+        failures = await publisher.publish_many(
+            "async-publisher-failures", [{"number": 1}, {"number": 2}]
+        )
+        with pytest.raises(PublishError):
+            await publisher.publish("async-publisher-failures", {"number": 4})
+
+    assert failures == [PublishFailure(1, "Nacked by broker")]
+
+
+def test_compresses_only_bodies_above_threshold() -> None:
+    serialization = Serialization(compression="zlib", compress_above=100)
+
+    small = serialization.encode({"number": 1})
+    large = serialization.encode({"numbers": list(range(100))})
+
+    assert small.compression is None
+    assert large.compression is not None
+    assert decode(small) == {"number": 1}
+    assert decode(large) == {"numbers": list(range(100))}
+
+
+def test_consumers_decode_compressed_messages(pool_factory: PoolFactory) -> None:
+    publisher = Publisher(
+        pool_factory, Serialization(compression="zlib", compress_above=0)
+    )
+
+    publisher.publish("compressed", {"number": 1}, headers={"trace": "abc"})
+
+    assert next_message(pool_factory, Queue("compressed")) == {"number": 1}
+
+
+def test_republished_message_drops_stale_compression_header(
+    publisher: Publisher, pool_factory: PoolFactory
+) -> None:
+    publisher.publish(
+        "republished", {"number": 1}, headers={"compression": "application/x-gzip"}
+    )
+
+    assert next_message(pool_factory, Queue("republished")) == {"number": 1}
+
+
+@pytest.fixture()
+def reversed_json() -> Iterator[str]:
+    register_serializer(
+        "reversed-json",
+        lambda data: json.dumps(data).encode()[::-1],
+        lambda body: json.loads(bytes(body)[::-1]),
+        "application/x-reversed-json",
+    )
+    yield "reversed-json"
+    # Registry of kombu is global, so is set of accepted content types
+    kombu_serialization.unregister("reversed-json")
+    ACCEPTED_CONTENT_TYPES.discard("application/x-reversed-json")
+
+
+def test_registered_serializer_is_used_and_accepted(
+    pool_factory: PoolFactory, reversed_json: str
+) -> None:
+    serialization = Serialization(reversed_json)
+    received: list[dict[str, Any]] = []
+    consumer = Consumer(pool_factory)
+    stop_event = threading.Event()
+
+    def handler(body: dict[str, Any]) -> None:
+        received.append(body)
+        stop_event.set()
+
+    consumer.register("reversed", handler)
+    Publisher(pool_factory, serialization).publish("reversed", {"number": 1})
+    run_in_thread(consumer, stop_event).join(timeout=10)
+    stop_event.set()
+
+    assert serialization.encode({}).content_type == "application/x-reversed-json"
+    assert received == [{"number": 1}]
+
+
+def test_unknown_serializer_fails_on_creation() -> None:
+    with pytest.raises(SerializerNotInstalled):
+        Serialization("no-such-serializer")
@@ -1,12 +1,32 @@
-from unittest.mock import patch
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from unittest.mock import Mock, call, patch
 
 from lagom import Container
 
 import pytest
+from sqlalchemy import Engine, func, insert, select, text, update
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 
-from subscriptions.shared.mqlib import Publisher
-from subscriptions.shared.outbox import Outbox, OutboxProcessor
+from subscriptions.shared.metrics import InProcessMetrics
+from subscriptions.shared.mqlib import Envelope, Publisher, PublishFailure
+from subscriptions.shared.outbox import (
+    PARTITIONS,
+    Outbox,
+    OutboxDeadLetter,
+    OutboxDeadLetters,
+    OutboxEntry,
+    OutboxListener,
+    OutboxProcessor,
+    OutboxWorker,
+    migrate_outbox_tables,
+    owned_partitions,
+)
+
+NACKED_0 = PublishFailure(0, "Nacked by broker")
+NACKED_1 = PublishFailure(1, "Nacked by broker")
 
 
 @pytest.fixture()
@@ -19,6 +39,11 @@ def outbox(container: Container) -> Outbox:
     return container.resolve(Outbox)
 
 
+@pytest.fixture()
+def publisher(container: Container) -> Publisher:
+    return container.resolve(Publisher)
+
+
 @pytest.fixture()
 def outbox_processor(container: Container) -> OutboxProcessor:
     return container.resolve(OutboxProcessor)
@@ -30,9 +55,385 @@ def test_processes_messages(
     outbox.put(queue_name="test", message={"hello": "world"})
     session.commit()
 
-    with patch.object(Publisher, "publish") as publish_mock:
+    with patch.object(Publisher, "publish_batch", return_value=[]) as publish_mock:
+        outbox_processor.run_once()
+
+    publish_mock.assert_called_once_with([Envelope("test", {"hello": "world"})])
+
+
+def test_processes_messages_put_in_bulk(
+    outbox: Outbox, session: Session, outbox_processor: OutboxProcessor
+) -> None:
+    outbox.put_many(queue_name="test", messages=[{"number": 1}, {"number": 2}])
+    session.commit()
+
+    with patch.object(Publisher, "publish_batch", return_value=[]) as publish_mock:
+        published = outbox_processor.run_once()
+
+    assert published == 2
+    publish_mock.assert_called_once_with(
+        [Envelope("test", {"number": 1}), Envelope("test", {"number": 2})]
+    )
+
+
+def test_keeps_messages_that_were_not_confirmed(
+    outbox: Outbox, session: Session, outbox_processor: OutboxProcessor
+) -> None:
+    outbox.put_many(queue_name="test", messages=[{"number": 1}, {"number": 2}])
+    session.commit()
+
+    with patch.object(Publisher, "publish_batch", return_value=[NACKED_1]):
+        published = outbox_processor.run_once()
+
+    assert published == 1
+    entries = session.execute(select(OutboxEntry)).scalars().all()
+    assert [(entry.data, entry.retries_left) for entry in entries] == [
+        ({"number": 2}, Outbox.RETRIES - 1)
+    ]
+
+
+def test_records_metrics_of_published_entries(
+    outbox: Outbox, session: Session, publisher: Publisher
+) -> None:
+    metrics = InProcessMetrics()
+    outbox_processor = OutboxProcessor(session, publisher, metrics)
+    outbox.put(queue_name="test", message={"hello": "world"})
+    session.commit()
+
+    with patch.object(Publisher, "publish_batch", return_value=[]):
+        outbox_processor.run_once()
+
+    exposed = metrics.expose()
+    assert "outbox_backlog_entries 1\n" in exposed
+    assert 'outbox_published_total{queue="test"} 1\n' in exposed
+    assert 'outbox_publish_latency_seconds_count{queue="test"} 1\n' in exposed
+    assert "outbox_batch_duration_seconds_count 1\n" in exposed
+
+
+def test_estimates_backlog_larger_than_count_limit(
+    outbox: Outbox, session: Session, publisher: Publisher
+) -> None:
+    metrics = InProcessMetrics()
+    outbox_processor = OutboxProcessor(session, publisher, metrics)
+    outbox_processor.BACKLOG_COUNT_LIMIT = 2
+    outbox.put_many("test", [{"number": number} for number in range(5)])
+    session.commit()
+    session.execute(text("ANALYZE outbox_entries"))
+    session.commit()
+
+    with patch.object(Publisher, "publish_batch", return_value=[]):
+        outbox_processor.run_once()
+
+    assert "outbox_backlog_entries 5\n" in metrics.expose()
+
+
+def test_retries_failed_entries_after_a_delay(
+    outbox: Outbox, session: Session, outbox_processor: OutboxProcessor
+) -> None:
+    outbox.put(queue_name="test", message={"hello": "world"})
+    session.commit()
+
+    with patch.object(
+        Publisher, "publish_batch", return_value=[NACKED_0]
+    ) as publish_mock:
         outbox_processor.run_once()
+        outbox_processor.run_once()
+
+    publish_mock.assert_called_once()
+
+
+def test_moves_entries_out_of_retries_to_dead_letters(
+    outbox: Outbox, session: Session, outbox_processor: OutboxProcessor
+) -> None:
+    outbox.put(queue_name="test", message={"hello": "world"})
+    session.execute(update(OutboxEntry).values(retries_left=0))
+    session.commit()
+
+    with patch.object(Publisher, "publish_batch", return_value=[NACKED_0]):
+        outbox_processor.run_once()
+
+    assert session.execute(select(OutboxEntry)).first() is None
+    dead_letter = session.execute(select(OutboxDeadLetter)).scalar_one()
+    assert dead_letter.data == {"hello": "world"}
+    assert dead_letter.last_error == "Nacked by broker"
 
+
+def test_replays_dead_letters(
+    container: Container,
+    outbox: Outbox,
+    session: Session,
+    outbox_processor: OutboxProcessor,
+) -> None:
+    outbox.put(queue_name="test", message={"hello": "world"})
+    session.execute(update(OutboxEntry).values(retries_left=0))
+    session.commit()
+    with patch.object(Publisher, "publish_batch", return_value=[NACKED_0]):
+        outbox_processor.run_once()
+
+    replayed = container.resolve(OutboxDeadLetters).replay()
+    session.commit()
+
+    assert replayed == 1
+    with patch.object(Publisher, "publish_batch", return_value=[]) as publish_mock:
+        outbox_processor.run_once()
+    publish_mock.assert_called_once_with([Envelope("test", {"hello": "world"})])
+
+
+def test_replays_dead_letters_of_a_key_in_their_order(
+    container: Container, session: Session, outbox_processor: OutboxProcessor
+) -> None:
+    # Stored in reverse, as rows may come back from the table in any order
+    session.execute(
+        insert(OutboxDeadLetter),
+        [
+            {
+                "id": number,
+                "queue": "test",
+                "data": {"number": number},
+                "ordering_key": "account-1",
+                "when_created": datetime.now(timezone.utc),
+                "when_failed": datetime.now(timezone.utc),
+                "last_error": "Nacked by broker",
+            }
+            for number in [3, 2, 1]
+        ],
+    )
+    session.commit()
+
+    container.resolve(OutboxDeadLetters).replay()
+    session.commit()
+
+    with patch.object(Publisher, "publish_batch", return_value=[]) as publish_mock:
+        outbox_processor.run_once()
     publish_mock.assert_called_once_with(
-        "test", message={"hello": "world"}
+        [Envelope("test", {"number": number}) for number in [1, 2, 3]]
     )
+
+
+def test_republishes_entries_following_failed_one_with_same_ordering_key(
+    outbox: Outbox, session: Session, outbox_processor: OutboxProcessor
+) -> None:
+    outbox.put("test", {"number": 1}, ordering_key="account-1")
+    outbox.put("test", {"number": 2}, ordering_key="account-2")
+    outbox.put("test", {"number": 3}, ordering_key="account-1")
+    session.commit()
+
+    with patch.object(Publisher, "publish_batch", return_value=[NACKED_0]):
+        published = outbox_processor.run_once()
+
+    assert published == 1
+    entries = session.execute(select(OutboxEntry).order_by(OutboxEntry.id)).scalars()
+    assert [(entry.data, entry.retries_left) for entry in entries] == [
+        ({"number": 1}, Outbox.RETRIES - 1),
+        ({"number": 3}, Outbox.RETRIES),
+    ]
+
+
+def test_publishes_entries_held_back_by_retried_one_after_it(
+    outbox: Outbox, session: Session, outbox_processor: OutboxProcessor
+) -> None:
+    outbox.put("test", {"number": 1}, ordering_key="account-1")
+    session.commit()
+    with patch.object(Publisher, "publish_batch", return_value=[NACKED_0]):
+        outbox_processor.run_once()
+    outbox.put("test", {"number": 2}, ordering_key="account-1")
+    session.commit()
+
+    with patch.object(Publisher, "publish_batch", return_value=[]) as publish_mock:
+        # Not before the first one, even though put to be sent earlier
+        assert outbox_processor.run_once() == 0
+        session.execute(
+            update(OutboxEntry)
+            .filter(OutboxEntry.retries_left < Outbox.RETRIES)
+            .values(next_attempt_at=func.now())
+        )
+        session.commit()
+        assert outbox_processor.run_once() == 1
+        assert outbox_processor.run_once() == 1
+
+    assert publish_mock.call_args_list == [
+        call([Envelope("test", {"number": 1})]),
+        call([Envelope("test", {"number": 2})]),
+    ]
+
+
+def test_selects_batch_without_reading_entries_waiting_for_retry(
+    session: Session, outbox_processor: OutboxProcessor
+) -> None:
+    session.execute(
+        text(
+            "INSERT INTO outbox_entries "
+            "(queue, data, retries_left, when_created, next_attempt_at, partition,"
+            " ordering_key) "
+            "SELECT 'test', '{}', :retries_left, now(), now() + :delay, n % 256,"
+            " 'account-' || n % 1000 "
+            "FROM generate_series(1, :count) AS n"
+        ),
+        [
+            {"retries_left": 1, "delay": timedelta(hours=1), "count": 20_000},
+            {"retries_left": Outbox.RETRIES, "delay": timedelta(0), "count": 10},
+        ],
+    )
+    session.execute(text("ANALYZE outbox_entries"))
+    session.commit()
+
+    stmt = outbox_processor._select_ready(list(range(PARTITIONS))).compile(
+        session.get_bind()
+    )
+    plan = (
+        session.connection()
+        .exec_driver_sql(f"EXPLAIN (ANALYZE, FORMAT JSON) {stmt}", stmt.params)
+        .scalar_one()
+    )
+
+    def read_rows(node: dict[str, Any]) -> int:
+        rows: int = node["Actual Rows"] * node["Actual Loops"]
+        rows += node.get("Rows Removed by Filter", 0)
+        rows += node.get("Rows Removed by Index Recheck", 0)
+        return rows + sum(read_rows(child) for child in node.get("Plans", []))
+
+    assert read_rows(plan[0]["Plan"]) < 100
+
+
+def test_processes_only_given_partitions(
+    outbox: Outbox, session: Session, outbox_processor: OutboxProcessor
+) -> None:
+    outbox.put("test", {"number": 1}, ordering_key="account-1")
+    session.commit()
+    partition = session.execute(select(OutboxEntry.partition)).scalar_one()
+
+    with patch.object(Publisher, "publish_batch", return_value=[]) as publish_mock:
+        outbox_processor.run_once([(partition + 1) % PARTITIONS])
+        publish_mock.assert_not_called()
+
+        outbox_processor.run_once([partition])
+        publish_mock.assert_called_once()
+
+
+def test_divides_partitions_between_live_workers(session: Session) -> None:
+    first = OutboxWorker(session, "worker-a")
+    assert first.partitions() == list(range(PARTITIONS))
+
+    second = OutboxWorker(session, "worker-b")
+    assert second.partitions() == owned_partitions(1, 2)
+    assert OutboxWorker(session, "worker-a").partitions() == owned_partitions(0, 2)
+
+    second.leave()
+    assert OutboxWorker(session, "worker-a").partitions() == list(range(PARTITIONS))
+
+
+def test_owned_partitions_cover_all_partitions_once() -> None:
+    owned = [owned_partitions(index, 3) for index in range(3)]
+
+    assert sorted(sum(owned, [])) == list(range(PARTITIONS))
+
+
+def test_processes_messages_continuously_until_stopped(
+    outbox: Outbox, session: Session, outbox_processor: OutboxProcessor
+) -> None:
+    outbox.put(queue_name="test", message={"hello": "world"})
+    session.commit()
+    stop_event = threading.Event()
+    listener = Mock(spec_set=OutboxListener)
+    listener.wait.side_effect = lambda timeout: stop_event.set()
+
+    with patch.object(Publisher, "publish_batch", return_value=[]) as publish_mock:
+        outbox_processor.run_continuously(listener, stop_event)
+
+    publish_mock.assert_called_once_with([Envelope("test", {"hello": "world"})])
+
+
+def test_keeps_processing_after_database_error(
+    outbox: Outbox, session: Session, outbox_processor: OutboxProcessor
+) -> None:
+    outbox.put(queue_name="test", message={"hello": "world"})
+    session.commit()
+    outbox_processor.MIN_ERROR_DELAY = 0.0
+    stop_event = threading.Event()
+    listener = Mock(spec_set=OutboxListener)
+    listener.wait.side_effect = lambda timeout: stop_event.set()
+    run_once = outbox_processor.run_once
+    errors = [
+        OperationalError("SELECT", {}, Exception("server closed the connection"))
+    ] * 2
+
+    def run_once_after_errors(partitions: list[int] | None) -> int:
+        if errors:
+            raise errors.pop()
+        return run_once(partitions)
+
+    with (
+        patch.object(Publisher, "publish_batch", return_value=[]) as publish_mock,
+        patch.object(outbox_processor, "run_once", side_effect=run_once_after_errors),
+    ):
+        outbox_processor.run_continuously(listener, stop_event)
+
+    assert not errors
+
+    publish_mock.assert_called_once_with([Envelope("test", {"hello": "world"})])
+
+
+def test_listener_reconnects_after_losing_connection(
+    container: Container, outbox: Outbox, session: Session
+) -> None:
+    engine = session.get_bind()
+    assert isinstance(engine, Engine)
+    listener = OutboxListener(engine)
+    listener.MIN_RECONNECT_DELAY = 0.0
+
+    with listener:
+        session.execute(
+            text(
+                "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                "WHERE query LIKE 'LISTEN %' AND pid <> pg_backend_pid()"
+            )
+        )
+        session.commit()
+
+        # Loss is noticed on one of the next waits, which reports possibly
+        # missed notifications, as does reconnecting on the following one
+        assert any(listener.wait(timeout=0.5) for _ in range(3))
+        assert listener.wait(timeout=0.5) is True
+        assert listener.wait(timeout=0.1) is False
+        outbox.put(queue_name="test", message={"hello": "world"})
+        session.commit()
+        assert listener.wait(timeout=1.0) is True
+
+
+def test_migrates_outbox_tables_created_before_dead_letters(
+    session: Session, outbox_processor: OutboxProcessor
+) -> None:
+    connection = session.connection()
+    connection.execute(
+        text("DROP TABLE outbox_entries, outbox_dead_letters, outbox_workers")
+    )
+    connection.execute(
+        text(
+            "CREATE TABLE outbox_entries (id SERIAL PRIMARY KEY, "
+            "queue VARCHAR NOT NULL, data JSONB NOT NULL, "
+            "retries_left INTEGER NOT NULL, "
+            "when_created TIMESTAMP WITH TIME ZONE NOT NULL)"
+        )
+    )
+    connection.execute(
+        text(
+            "INSERT INTO outbox_entries (queue, data, retries_left, when_created) "
+            "VALUES ('test', '{\"number\": 1}', 3, now()), "
+            "('test', '{\"number\": 2}', -1, now())"
+        )
+    )
+
+    moved = migrate_outbox_tables(connection)
+    moved_again = migrate_outbox_tables(connection)
+    session.commit()
+
+    assert (moved, moved_again) == (1, 0)
+    dead_letter = session.execute(select(OutboxDeadLetter)).scalar_one()
+    assert dead_letter.data == {"number": 2}
+    triggers = session.execute(
+        text("SELECT count(*) FROM pg_trigger WHERE tgname = 'outbox_entries_notify'")
+    ).scalar_one()
+    assert triggers == 1
+    with patch.object(Publisher, "publish_batch", return_value=[]) as publish_mock:
+        outbox_processor.run_once()
+    publish_mock.assert_called_once_with([Envelope("test", {"number": 1})])
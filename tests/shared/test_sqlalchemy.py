@@ -0,0 +1,34 @@
+from dataclasses import dataclass
+
+from sqlalchemy import create_engine
+
+from subscriptions.shared.sqlalchemy import AsJSON, AsJSONB
+
+
+@dataclass(frozen=True)
+class Dummy:
+    name: str
+    quantity: int
+
+
+def test_specialized_classes_are_reused() -> None:
+    assert AsJSON[list[Dummy]] is AsJSON[list[Dummy]]
+    assert AsJSONB[list[Dummy]] is not AsJSON[list[Dummy]]
+
+
+def test_value_goes_to_json_text_and_back() -> None:
+    dialect = create_engine("postgresql+psycopg2://").dialect
+    column_type = AsJSON[list[Dummy]]()
+    value = [Dummy(name="a", quantity=1)]
+
+    as_text = column_type.bind_processor(dialect)(value)
+
+    assert as_text == '[{"name":"a","quantity":1}]'
+    assert column_type.result_processor(dialect, None)(as_text) == value
+
+
+def test_json_null_is_read_as_none() -> None:
+    dialect = create_engine("postgresql+psycopg2://").dialect
+    column_type = AsJSON[Dummy]()
+
+    assert column_type.result_processor(dialect, None)("null") is None
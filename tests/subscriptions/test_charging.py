@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from unittest.mock import Mock
+
+import pytest
+
+from subscriptions.payments import PaymentsFacade
+from subscriptions.shared.account_id import AccountId
+from subscriptions.shared.money import Money
+from subscriptions.shared.tenant_id import TenantId
+from subscriptions.subscriptions._app._charging import (
+    Charge,
+    ChargeStats,
+    Charger,
+    ConcurrentCharger,
+)
+
+
+def charge(tenant_id: int, account_id: int) -> Charge:
+    return Charge(TenantId(tenant_id), AccountId(account_id), Money(10, "USD"))
+
+
+class SlowPaymentsFacade:
+    """Tracks how many charges run at once, in total and per tenant."""
+
+    def __init__(self, charges: list[Charge]) -> None:
+        self._tenants = {c.account_id: c.tenant_id for c in charges}
+        self._lock = threading.Lock()
+        self._running: dict[TenantId, int] = defaultdict(int)
+        self.max_running = 0
+        self.max_running_per_tenant = 0
+
+    def charge(self, account_id: AccountId, amount: Money) -> bool:
+        tenant_id = self._tenants[account_id]
+        with self._lock:
+            self._running[tenant_id] += 1
+            self.max_running = max(self.max_running, sum(self._running.values()))
+            self.max_running_per_tenant = max(
+                self.max_running_per_tenant, self._running[tenant_id]
+            )
+        time.sleep(0.01)
+        with self._lock:
+            self._running[tenant_id] -= 1
+        if account_id % 5 == 0:
+            raise ConnectionError
+        return account_id % 2 == 0
+
+
+def test_charges_one_by_one_returning_results_in_order() -> None:
+    payments_facade = Mock(spec_set=PaymentsFacade)
+    payments_facade.charge.side_effect = [True, ConnectionError(), False]
+    charger = Charger(payments_facade)
+
+    results = charger.charge_all([charge(1, 1), charge(1, 2), charge(2, 3)])
+
+    assert results[0] is True
+    assert isinstance(results[1], ConnectionError)
+    assert results[2] is False
+    assert charger.stats.count == 3
+
+
+@pytest.mark.parametrize("max_concurrency, max_per_tenant", [(4, 2), (8, 1), (3, 5)])
+def test_charges_concurrently_within_limits(
+    max_concurrency: int, max_per_tenant: int
+) -> None:
+    # Most charges are of one tenant, which must not take all workers
+    charges = [charge(1, n) for n in range(1, 21)]
+    charges += [charge(tenant_id, 100 + tenant_id) for tenant_id in range(2, 6)]
+    payments_facade = SlowPaymentsFacade(charges)
+
+    @contextmanager
+    def payments_facades() -> Iterator[PaymentsFacade]:
+        yield payments_facade  # type: ignore[misc]
+
+    charger = ConcurrentCharger(payments_facades, max_concurrency, max_per_tenant)
+    results = charger.charge_all(charges)
+
+    for c, result in zip(charges, results):
+        if c.account_id % 5 == 0:
+            assert isinstance(result, ConnectionError)
+        else:
+            assert result is (c.account_id % 2 == 0)
+    assert payments_facade.max_running <= max_concurrency
+    assert payments_facade.max_running_per_tenant <= max_per_tenant
+    assert charger.stats.count == len(charges)
+
+
+def test_error_getting_facade_is_returned_as_result() -> None:
+    @contextmanager
+    def payments_facades() -> Iterator[PaymentsFacade]:
+        raise ConnectionError
+        yield
+
+    charger = ConcurrentCharger(payments_facades)
+
+    results = charger.charge_all([charge(1, 1), charge(2, 2)])
+
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+
+def test_stats_percentiles() -> None:
+    stats = ChargeStats()
+    for latency in range(1, 101):
+        stats.record(latency / 1000)
+    stats.seconds = 2.0
+
+    assert stats.per_second == 50.0
+    assert stats.percentile(50) == 0.051
+    assert stats.percentile(99) == 0.1
+
+
+def test_stats_sample_is_bounded() -> None:
+    stats = ChargeStats()
+    stats.SAMPLE_SIZE = 10
+    for latency in range(100):
+        stats.record(latency)
+
+    assert stats.count == 100
+    assert len(stats._sample) == 10
@@ -1,21 +1,31 @@
-from datetime import datetime, timezone
-from unittest.mock import Mock, seal
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock, patch, seal
 
 import pytest
 import time_machine
 from dateutil.relativedelta import relativedelta
 from lagom import Container
+from sqlalchemy import update
+from sqlalchemy.orm import Session
 
 from subscriptions.auth import Subject
-from subscriptions.payments import PaymentsFacade
+from subscriptions.payments import MissingPaymentMethod, PaymentsFacade
 from subscriptions.plans import PlansFacade, PlanId
 from subscriptions.shared.account_id import AccountId
 from subscriptions.shared.money import Money
 from subscriptions.shared.tenant_id import TenantId
 from subscriptions.shared.term import Term
-from subscriptions.subscriptions import SubscriptionsAdmin, SubscriptionsViewer
+from subscriptions.subscriptions import (
+    LoadLeveling,
+    RenewalProgress,
+    SubscriptionsAdmin,
+    SubscriptionsViewer,
+)
 from subscriptions.subscriptions._app._facade import SubscriptionsFacade
+from subscriptions.subscriptions._app._repository import SubscriptionsRepository
 from subscriptions.subscriptions._app._subscription_dto import SubscriptionDto
+from subscriptions.subscriptions._domain._subscription import Subscription
+from subscriptions.subscriptions._domain._subscription_id import SubscriptionId
 
 
 @pytest.fixture()
@@ -40,6 +50,36 @@ def facade(
     return cloned_container.resolve(SubscriptionsFacade)
 
 
+@pytest.fixture()
+def prices(plans_facade: Mock, payments_facade: Mock) -> None:
+    """Every plan costs the same, and every charge is made."""
+    plans_facade.calculate_cost.return_value = Money(1, "USD")
+    plans_facade.calculate_costs.side_effect = lambda tenant_id, requests: (
+        [Money(1, "USD")] * len(requests)
+    )
+    seal(plans_facade)
+    payments_facade.charge.return_value = True
+
+
+def subscribe_month_ago(
+    facade: SubscriptionsFacade, count: int = 1, tenant_id: TenantId = TenantId(1)
+) -> list[SubscriptionDto]:
+    """Subscriptions of an account of the tenant, due for renewal now."""
+    subject = Subject(tenant_id, [SubscriptionsAdmin(), SubscriptionsViewer()])
+    month_ago = datetime.now(timezone.utc) - relativedelta(months=1)
+    with time_machine.travel(month_ago):
+        return [
+            facade.subscribe(
+                subject=subject,
+                account_id=AccountId(tenant_id),
+                plan_id=PlanId(1),
+                term=Term.MONTHLY,
+                add_ons=[],
+            )
+            for _ in range(count)
+        ]
+
+
 @pytest.mark.parametrize("cost", [Money(1, "USD"), Money(10, "USD")])
 def test_triggers_payment_for_a_new_subscription_based_on_plans_response(
     cost: Money, facade: SubscriptionsFacade, plans_facade: Mock, payments_facade: Mock
@@ -62,38 +102,18 @@ def test_triggers_payment_for_a_new_subscription_based_on_plans_response(
 
 
 def test_sets_inactive_status_for_subscription_which_payment_failed(
-    facade: SubscriptionsFacade, plans_facade: Mock, payments_facade: Mock
+    facade: SubscriptionsFacade, prices: None, payments_facade: Mock
 ) -> None:
-    plans_facade.calculate_cost.return_value = Money(1, "USD")
-    seal(plans_facade)
-
-    payments_facade.charge = Mock(return_value=True)
-
-    tenant_id = TenantId(1)
     account_id = AccountId(1)
-    subject = Subject(tenant_id, [SubscriptionsAdmin(), SubscriptionsViewer()])
-    subscriptions: list[SubscriptionDto] = []
-    new_subscription = facade.subscribe(
+    subject = Subject(TenantId(1), [SubscriptionsAdmin(), SubscriptionsViewer()])
+    facade.subscribe(
         subject=subject,
         account_id=account_id,
         plan_id=PlanId(1),
         term=Term.MONTHLY,
         add_ons=[],
     )
-    subscriptions.append(new_subscription)
-
-    month_ago = datetime.now(timezone.utc) - relativedelta(months=1)
-    with time_machine.travel(month_ago):
-        for _ in range(2):
-            subscriptions.append(
-                facade.subscribe(
-                    subject=subject,
-                    account_id=account_id,
-                    plan_id=PlanId(1),
-                    term=Term.MONTHLY,
-                    add_ons=[],
-                )
-            )
+    subscribe_month_ago(facade, count=2)
 
     payments_facade.charge.side_effect = [True, False]
     facade.renew_subscriptions()
@@ -103,3 +123,167 @@ def test_sets_inactive_status_for_subscription_which_payment_failed(
     inactive_count = [dto.status for dto in dtos].count("inactive")
     assert active_count == 2
     assert inactive_count == 1
+
+
+def test_renews_due_subscriptions_in_chunks_reporting_progress(
+    facade: SubscriptionsFacade, prices: None, payments_facade: Mock
+) -> None:
+    subscribe_month_ago(facade, count=3)
+
+    payments_facade.charge.side_effect = [True, False, True]
+    reported: list[RenewalProgress] = []
+    total = facade.renew_subscriptions(chunk_size=2, on_progress=reported.append)
+
+    assert [progress.processed for progress in reported] == [2, 3]
+    assert (total.renewed, total.failed, total.skipped, total.chunks) == (2, 1, 0, 2)
+    assert total.p99_charge_seconds >= total.p50_charge_seconds > 0
+
+
+def test_charges_that_raised_are_not_renewed_again_until_reconciled(
+    facade: SubscriptionsFacade, prices: None, payments_facade: Mock
+) -> None:
+    subscribe_month_ago(facade, count=3)
+
+    payments_facade.charge.side_effect = [
+        ConnectionError(),
+        MissingPaymentMethod(),
+        True,
+    ]
+    total = facade.renew_subscriptions()
+    after_lease = datetime.now(timezone.utc) + 2 * SubscriptionsFacade.RENEWAL_LEASE
+    with time_machine.travel(after_lease):
+        again = facade.renew_subscriptions()
+
+    assert (total.renewed, total.failed, total.uncertain) == (1, 1, 1)
+    assert again.processed == 0
+    subject = Subject(TenantId(1), [SubscriptionsViewer()])
+    statuses = [dto.status for dto in facade.subscriptions(subject, AccountId(1))]
+    assert sorted(statuses) == ["active", "inactive", "needs_reconciliation"]
+
+
+def test_shares_renewal_chunks_between_tenants(
+    facade: SubscriptionsFacade, prices: None
+) -> None:
+    subscribe_month_ago(facade, count=3, tenant_id=TenantId(1))
+    subscribe_month_ago(facade, count=1, tenant_id=TenantId(2))
+
+    reported: list[RenewalProgress] = []
+    facade.renew_subscriptions(chunk_size=2, on_progress=reported.append)
+
+    assert [dict(progress.queue_depths) for progress in reported] == [
+        {TenantId(1): 3, TenantId(2): 1},
+        {TenantId(1): 2},
+    ]
+
+
+def test_counts_due_subscriptions_once_they_are_all_claimed(
+    facade: SubscriptionsFacade, prices: None
+) -> None:
+    subscribe_month_ago(facade, count=5)
+
+    with patch.object(
+        SubscriptionsRepository,
+        "count_pending_renewal",
+        autospec=True,
+        side_effect=SubscriptionsRepository.count_pending_renewal,
+    ) as count_mock:
+        total = facade.renew_subscriptions(chunk_size=1)
+
+    assert (total.renewed, total.chunks) == (5, 5)
+    # Before the first chunk, and to see nothing got due in the meantime
+    assert count_mock.call_count == 2
+
+
+def test_renewal_histogram_as_scheduled_and_as_leveled(
+    facade: SubscriptionsFacade, prices: None
+) -> None:
+    subject = Subject(TenantId(1), [SubscriptionsAdmin(), SubscriptionsViewer()])
+    for hour in [5, 5, 7]:
+        with time_machine.travel(datetime(2024, 2, 29, hour, tzinfo=timezone.utc)):
+            facade.subscribe(
+                subject=subject,
+                account_id=AccountId(1),
+                plan_id=PlanId(1),
+                term=Term.MONTHLY,
+                add_ons=[],
+            )
+    start = datetime(2024, 3, 29, tzinfo=timezone.utc)
+    end = start + timedelta(hours=8)
+
+    scheduled = facade.renewal_histogram(start, end)
+    leveled = facade.renewal_histogram(start, end, LoadLeveling(timedelta(hours=1)))
+
+    assert list(scheduled) == [start + timedelta(hours=hour) for hour in range(8)]
+    assert list(scheduled.values()) == [0, 0, 0, 0, 0, 2, 0, 1]
+    assert list(leveled.values()) == [3, 0, 0, 0, 0, 0, 0, 0]
+
+
+def test_claimed_subscriptions_are_skipped_until_lease_expires(
+    container: Container, facade: SubscriptionsFacade, prices: None
+) -> None:
+    [subscription] = subscribe_month_ago(facade)
+    repository = container.resolve(SubscriptionsRepository)
+
+    claimed = repository.claim_pending_renewal("a", 10, timedelta(minutes=1))
+    claimed_by_other = repository.claim_pending_renewal("b", 10, timedelta(minutes=1))
+    with time_machine.travel(datetime.now(timezone.utc) + timedelta(minutes=2)):
+        reclaimed = repository.claim_pending_renewal("b", 10, timedelta(minutes=1))
+
+    assert claimed == [subscription.id]
+    assert claimed_by_other == []
+    assert reclaimed == [subscription.id]
+
+
+def test_charges_only_subscriptions_whose_lease_is_still_held(
+    container: Container,
+    facade: SubscriptionsFacade,
+    prices: None,
+    payments_facade: Mock,
+) -> None:
+    first, *others = subscribe_month_ago(facade, count=3)
+    session = container[Session]
+
+    def taken_over_by_other_worker(account_id: AccountId, amount: Money) -> bool:
+        # Lease of the rest expired while charging, and another worker took it
+        session.execute(
+            update(Subscription)
+            .where(Subscription.id != first.id)
+            .values(claimed_by="other")
+        )
+        session.commit()
+        return True
+
+    payments_facade.charge.reset_mock()
+    payments_facade.charge.side_effect = taken_over_by_other_worker
+    facade.RENEWAL_LEASE_BATCH = 1
+    total = facade.renew_subscriptions(worker_name="me")
+
+    assert payments_facade.charge.call_count == 1
+    assert total.renewed == 1
+    repository = container.resolve(SubscriptionsRepository)
+    others_claimed_by = {
+        repository.get_by_id(SubscriptionId(sub.id)).claimed_by for sub in others
+    }
+    assert others_claimed_by == {"other"}
+
+
+def test_reconciled_renewals_are_renewed_or_due_again(
+    facade: SubscriptionsFacade, prices: None, payments_facade: Mock
+) -> None:
+    charged, not_charged = subscribe_month_ago(facade, count=2)
+    payments_facade.charge.side_effect = ConnectionError()
+    facade.renew_subscriptions()
+
+    to_reconcile = facade.subscriptions_to_reconcile()
+    facade.reconcile(SubscriptionId(charged.id), charged=True)
+    facade.reconcile(SubscriptionId(not_charged.id), charged=False)
+    payments_facade.charge.side_effect = None
+    payments_facade.charge.reset_mock()
+    again = facade.renew_subscriptions()
+
+    assert [sub.id for sub in to_reconcile] == [charged.id, not_charged.id]
+    assert facade.subscriptions_to_reconcile() == []
+    assert again.renewed == 1
+    payments_facade.charge.assert_called_once()
+    with pytest.raises(Exception):
+        facade.reconcile(SubscriptionId(charged.id), charged=True)
@@ -0,0 +1,82 @@
+from collections import Counter
+
+import pytest
+
+from subscriptions.shared.tenant_id import TenantId
+from subscriptions.subscriptions import FairShare
+
+BIG = TenantId(1)
+SMALL = TenantId(2)
+OTHER_SMALL = TenantId(3)
+
+
+def test_splits_slots_equally_by_default() -> None:
+    quotas = FairShare().quotas({BIG: 500_000, SMALL: 300, OTHER_SMALL: 300}, 300)
+
+    assert quotas == {BIG: 100, SMALL: 100, OTHER_SMALL: 100}
+
+
+def test_slots_unused_by_a_tenant_go_to_others() -> None:
+    quotas = FairShare().quotas({BIG: 500_000, SMALL: 10, OTHER_SMALL: 20}, 500)
+
+    assert quotas == {BIG: 470, SMALL: 10, OTHER_SMALL: 20}
+
+
+def test_splits_slots_by_weight() -> None:
+    fair_share = FairShare(weights={BIG: 3})
+
+    quotas = fair_share.quotas({BIG: 500_000, SMALL: 500_000}, 400)
+
+    assert quotas == {BIG: 300, SMALL: 100}
+
+
+def test_caps_tenant_per_chunk() -> None:
+    fair_share = FairShare(weights={BIG: 3}, caps={BIG: 50})
+
+    quotas = fair_share.quotas({BIG: 500_000, SMALL: 500_000}, 400)
+
+    assert quotas == {BIG: 50, SMALL: 350}
+
+
+def test_gives_every_tenant_a_slot_when_there_are_fewer_slots_than_tenants() -> None:
+    depths = {TenantId(tenant_id): 1_000 for tenant_id in range(1, 11)}
+
+    quotas = FairShare().quotas(depths, 4)
+
+    assert sum(quotas.values()) == 4
+    assert all(quota == 1 for quota in quotas.values())
+
+
+def test_tenants_take_turns_when_there_are_fewer_slots_than_tenants() -> None:
+    depths = {TenantId(tenant_id): 1_000 for tenant_id in range(1, 11)}
+    fair_share = FairShare()
+
+    served: Counter[TenantId] = Counter()
+    for _ in range(5):
+        served.update(fair_share.quotas(depths, 4))
+
+    assert served == dict.fromkeys(depths, 2)
+
+
+def test_leaves_out_tenants_with_nothing_due() -> None:
+    quotas = FairShare(caps={SMALL: 0}).quotas({BIG: 0, SMALL: 5}, 10)
+
+    assert quotas == {}
+
+
+def test_small_tenants_finish_in_first_chunks_of_big_backlog() -> None:
+    depths = {BIG: 500_000} | {TenantId(n): 150 for n in range(2, 12)}
+    fair_share = FairShare()
+
+    chunks = 0
+    while any(depth for tenant_id, depth in depths.items() if tenant_id != BIG):
+        for tenant_id, quota in fair_share.quotas(depths, 500).items():
+            depths[tenant_id] -= quota
+        chunks += 1
+
+    assert chunks == 4
+
+
+def test_rejects_weights_below_one() -> None:
+    with pytest.raises(ValueError):
+        FairShare(weights={BIG: 0})
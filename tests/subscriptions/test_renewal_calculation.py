@@ -0,0 +1,97 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from subscriptions.shared.term import Term
+from subscriptions.subscriptions._domain._renewal_calculation import (
+    LoadLeveling,
+    calculate_next_renewal,
+    hourly_histogram,
+)
+
+
+def utc(year: int, month: int, day: int, hour: int = 0, minute: int = 0) -> datetime:
+    return datetime(year, month, day, hour, minute, tzinfo=timezone.utc)
+
+
+def test_renews_a_term_from_now_without_anchor() -> None:
+    assert calculate_next_renewal(utc(2024, 1, 31, 12), Term.MONTHLY) == utc(
+        2024, 2, 29, 12
+    )
+
+
+@pytest.mark.parametrize(
+    "now, expected",
+    [
+        (utc(2024, 2, 1, 3), utc(2024, 2, 29, 15)),
+        (utc(2024, 2, 29, 18), utc(2024, 3, 31, 15)),
+        (utc(2024, 3, 31, 1), utc(2024, 4, 30, 15)),
+        # Renewed days late, next one is still on the billing date
+        (utc(2024, 5, 3, 9), utc(2024, 5, 31, 15)),
+        (utc(2029, 1, 31, 15), utc(2029, 2, 28, 15)),
+    ],
+)
+def test_monthly_renewals_stay_on_billing_date(
+    now: datetime, expected: datetime
+) -> None:
+    anchor = utc(2024, 1, 31, 15)
+
+    assert calculate_next_renewal(now, Term.MONTHLY, anchor) == expected
+
+
+def test_yearly_renewals_stay_on_billing_date() -> None:
+    anchor = utc(2020, 2, 29, 15)
+
+    assert calculate_next_renewal(utc(2021, 2, 28, 1), Term.YEARLY, anchor) == utc(
+        2022, 2, 28, 15
+    )
+    assert calculate_next_renewal(utc(2023, 7, 1), Term.YEARLY, anchor) == utc(
+        2024, 2, 29, 15
+    )
+
+
+def test_leveling_keeps_date_within_window() -> None:
+    leveling = LoadLeveling(timedelta(hours=6))
+    renewal_at = utc(2024, 3, 31, 15, 42)
+
+    leveled = [leveling.level(renewal_at, key) for key in range(1_000)]
+
+    assert all(renewal_at.date() == at.date() for at in leveled)
+    assert all(at.hour < 6 for at in leveled)
+    assert leveling.level(renewal_at, 7) == leveling.level(utc(2024, 4, 30), 7).replace(
+        month=3, day=31
+    )
+
+
+def test_leveling_spreads_consecutive_ids_evenly_over_hours() -> None:
+    leveling = LoadLeveling(timedelta(hours=24))
+    renewal_at = utc(2024, 3, 31, 15)
+
+    per_hour = Counter(leveling.level(renewal_at, key).hour for key in range(2_400))
+
+    assert len(per_hour) == 24
+    assert max(per_hour.values()) - min(per_hour.values()) <= 5
+
+
+def test_zero_window_leaves_renewal_as_it_is() -> None:
+    renewal_at = utc(2024, 3, 31, 15, 42)
+
+    assert LoadLeveling().level(renewal_at, 7) == renewal_at
+
+
+def test_rejects_window_longer_than_a_day() -> None:
+    with pytest.raises(ValueError):
+        LoadLeveling(timedelta(hours=25))
+
+
+def test_hourly_histogram_includes_empty_hours() -> None:
+    renewals = [utc(2024, 3, 31, 0, 5), utc(2024, 3, 31, 0, 59), utc(2024, 3, 31, 2)]
+
+    histogram = hourly_histogram(renewals, utc(2024, 3, 31), utc(2024, 3, 31, 3))
+
+    assert histogram == {
+        utc(2024, 3, 31, 0): 2,
+        utc(2024, 3, 31, 1): 0,
+        utc(2024, 3, 31, 2): 1,
+    }
@@ -1,9 +1,10 @@
-from datetime import timezone, datetime
+from datetime import timedelta, timezone, datetime
 
 import pytest
 from dateutil.relativedelta import relativedelta
 
 from subscriptions.shared.term import Term
+from subscriptions.subscriptions._domain._renewal_calculation import LoadLeveling
 from subscriptions.subscriptions._domain._subscription import Subscription
 
 
@@ -40,3 +41,15 @@ def test_cancelling_canceled_subscription_changes_nothing(
 
     assert subscription.status == "canceled"
     assert subscription.canceled_at == canceled_at
+
+
+def test_leveled_renewal_keeps_billing_date(subscription: Subscription) -> None:
+    subscription.id = 42
+    leveling = LoadLeveling(timedelta(hours=6))
+
+    subscription.renewal_successful(leveling)
+
+    billing_date = subscription.subscribed_at + relativedelta(months=1)
+    assert subscription.next_renewal_at is not None
+    assert subscription.next_renewal_at.date() == billing_date.date()
+    assert subscription.next_renewal_at.hour < 6
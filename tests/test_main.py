@@ -0,0 +1,10 @@
+import pytest
+
+from subscriptions.main import container
+from subscriptions.payments import PaymentsFacade
+from subscriptions.shared.outbox import OutboxProcessor
+
+
+@pytest.mark.parametrize("dependency", [PaymentsFacade, OutboxProcessor])
+def test_resolves_services_publishing_messages(dependency: type) -> None:
+    assert isinstance(container.resolve(dependency), dependency)